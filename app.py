@@ -1,17 +1,31 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, Response, stream_with_context
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
-import groq
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
 from pdf_generator import generate_trip_pdf
-from prompt import get_trip_plan_prompt
 import tempfile
-import uuid
-from content_formatter import TripContentFormatter
+from content_formatter import TripContentFormatter, FORMATTER_VERSION
+from trip_document import parse_trip_document
+from trip_generator import (get_trip_plan_result, parse_trip_request, stream_trip_events, get_destination_info,
+                            get_activity_recommendations, get_budget_optimization, plan_flight,
+                            get_generation_stats, CURRENCY_SYMBOLS)
+from models import trip_model
+from trip_modifier import resolve_scope, infer_scope, modify_trip_plan
+from llm_client import CircuitOpenError, llm_client
+from deadline import Deadline, DeadlineExceededError
+from rate_limiter import rate_limiter, admit_generation
+from job_queue import job_queue
+from prewarm import prewarm_scheduler
+from speculative import speculative_generator
+from idempotency import idempotency_store, get_idempotency_key
+from config import Config
+from plan_cache import plan_cache, destination_cache, insights_cache
+from model_router import model_router
+from utils import format_sse
 import requests
 
 # Load environment variables
@@ -25,6 +39,25 @@ app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
 csrf = CSRFProtect(app)
 content_formatter = TripContentFormatter()
 
+# Pre-generate plans for popular destinations during off-peak hours
+if Config.PREWARM_ENABLED:
+    prewarm_scheduler.start()
+
+def too_many_requests(decision):
+    """429 response for a generation rejected by admission control"""
+    response = jsonify({
+        'error': 'Too many trip plan requests right now, please try again shortly',
+        'retry_after': decision['retry_after']
+    })
+    response.headers['Retry-After'] = str(decision['retry_after'])
+    return response, 429
+
+def idempotency_conflict(record):
+    """Response for a repeated submit that has no finished result to replay"""
+    if record['status'] == 'mismatch':
+        return jsonify({'error': 'This Idempotency-Key was already used for a different trip request'}), 422
+    return jsonify({'error': 'This trip is still being generated, please wait'}), 409, {'Retry-After': '5'}
+
 # Make csrf_token available to all templates
 @app.context_processor
 def inject_csrf_token():
@@ -40,9 +73,6 @@ db = firestore.client()
 FIREBASE_WEB_API_KEY = os.getenv('FIREBASE_WEB_API_KEY')
 FIREBASE_AUTH_URL = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={FIREBASE_WEB_API_KEY}"
 
-# Initialize Groq client
-groq_client = groq.Groq(api_key=os.getenv('GROQ_API_KEY'))
-
 def calculate_min_budget(start_location, destination, num_days):
     """Calculate minimum budget based on location and duration"""
     base_costs = {
@@ -105,21 +135,6 @@ def calculate_min_budget(start_location, destination, num_days):
     min_budget = daily_min * num_days + transport_cost
     return min_budget
 
-def get_trip_plan(start_location, destination, num_days, start_date, end_date, budget=None):
-    """Generate a trip plan using Llama model through Groq API"""
-    prompt = get_trip_plan_prompt(start_location, destination, num_days, start_date, end_date, budget)
-    
-    try:
-        chat_completion = groq_client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.3-70b-versatile",
-            temperature=0.7,
-            max_tokens=4000
-        )
-        return chat_completion.choices[0].message.content
-    except Exception as e:
-        return f"Error generating trip plan: {str(e)}"
-
 @app.route('/')
 def index():
     """Home page"""
@@ -294,97 +309,256 @@ def trip_planner():
 
 @app.route('/generate_trip', methods=['POST'])
 def generate_trip():
-    """Generate trip plan"""
+    """Queue a trip plan generation and return its job at once"""
     if 'user_id' not in session:
         return jsonify({'error': 'Please log in first'}), 401
     
+    # Handle both JSON and form data
+    data = request.json if request.is_json else request.form.to_dict()
+    
     try:
-        # Handle both JSON and form data
-        if request.is_json:
-            data = request.json
-        else:
-            data = request.form.to_dict()
-            
-        start_location = data.get('start_location')
-        destination = data.get('destination')
-        start_date = datetime.strptime(data.get('start_date'), '%Y-%m-%d').date()
-        end_date = datetime.strptime(data.get('end_date'), '%Y-%m-%d').date()
-        
-        # Fix: Handle empty budget_amount safely
-        budget_amount_str = data.get('budget_amount', '0')
-        if budget_amount_str == '' or budget_amount_str is None:
-            budget_amount = 0.0
-        else:
-            try:
-                budget_amount = float(budget_amount_str)
-            except (ValueError, TypeError):
-                budget_amount = 0.0
-        
-        currency = data.get('currency', 'INR')
-        
-        num_days = (end_date - start_date).days + 1
-        
-        # Currency symbols
-        currency_symbols = {
-            "USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥",
-            "AUD": "A$", "CAD": "C$", "INR": "₹", "CNY": "¥"
-        }
-        
-        budget = {
-            "amount": budget_amount,
-            "currency": currency,
-            "symbol": currency_symbols.get(currency, "$")
-        }
+        trip_request = parse_trip_request(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = session['user_id']
+    job_payload = {
+        'start_location': trip_request['start_location'],
+        'destination': trip_request['destination'],
+        'num_days': trip_request['num_days'],
+        'start_date': trip_request['start_date'].isoformat(),
+        'end_date': trip_request['end_date'].isoformat(),
+        'budget': trip_request['budget'],
+        # API clients poll status_url, so their jobs are abandoned when the polling stops;
+        # form submits wait for the dashboard instead
+        'watched': request.is_json
+    }
+    
+    # A repeated submit (double click, network retry) gets the first submit's job
+    idempotency_key = get_idempotency_key(request, data)
+    if idempotency_key:
+        record = idempotency_store.claim(user_id, idempotency_key, job_payload, wait=Config.IDEMPOTENCY_WAIT_SECONDS)
+        if record is not None and record['status'] != 'completed':
+            return idempotency_conflict(record)
+        if record is not None:
+            return job_accepted(record['result']['job_id'])
+    
+    try:
+        # Reject early when the user or the whole site is over the Groq quota
+        decision = admit_generation(user_id, trip_request['num_days'])
+        if not decision['allowed']:
+            if idempotency_key:
+                idempotency_store.release(user_id, idempotency_key)
+            return too_many_requests(decision)
         
-        # Generate trip plan
-        trip_plan = get_trip_plan(start_location, destination, num_days, start_date, end_date, budget)
-        formatted_trip_plan = content_formatter.format_for_web(trip_plan)
+        # Queue the generation so the request returns immediately
+        job_id = job_queue.enqueue(user_id, job_payload)
+        if idempotency_key:
+            idempotency_store.complete(user_id, idempotency_key, {'job_id': job_id})
+    except Exception as e:
+        # A submit that didn't queue a job frees its key, so a retry runs again
+        if idempotency_key:
+            idempotency_store.release(user_id, idempotency_key)
+        return jsonify({'error': f'Error queueing trip plan: {str(e)}'}), 500
+    
+    return job_accepted(job_id)
 
-        trip_summary = content_formatter.extract_summary(trip_plan)
-        day_wise_content = content_formatter.get_day_wise_content(trip_plan)
-        highlights = content_formatter.get_highlights(trip_plan)
+def job_accepted(job_id):
+    """202 with the job's status URL for API clients; form submits go to the dashboard"""
+    status_url = url_for('get_job', job_id=job_id)
+    if request.is_json:
+        response = jsonify({'success': True, 'job_id': job_id, 'status': 'queued', 'status_url': status_url})
+        response.headers['Location'] = status_url
+        return response, 202
+    
+    flash('Your trip plan is being generated. It will appear in your dashboard shortly.', 'info')
+    return redirect(url_for('dashboard'))
 
-        # Save trip to database
-        trip_id = str(uuid.uuid4())
-        trip_data = {
-            'trip_id': trip_id,
-            'user_id': session['user_id'],
-            'title': f"{start_location} to {destination}",
-            'start_location': start_location,
-            'destination': destination,
-            'start_date': start_date.isoformat(),
-            'end_date': end_date.isoformat(),
-            'duration': num_days,
-            'budget': budget,
-            'trip_plan': trip_plan,
-            'formatted_trip_plan': formatted_trip_plan,
-            'summary': trip_summary,
-            'highlights': highlights,
-            'created_at': datetime.now(),
-            'status': 'completed'
-        }
-        
-        db.collection('trips').document(trip_id).set(trip_data)
-        
-        # Fixed: Pass trip_data as 'trip' to match the template expectation
-        if request.is_json:
-            return jsonify({
-                'success': True,
-                'trip_id': trip_data['trip_id'],
-                'trip_plan': trip_plan
-            })
-        else:
-            # Return HTML template like in app.py
-            return render_template('trip_result.html',
-                                 trip_id=trip_data['trip_id'],
-                                 trip=trip_data,
-                                 formatted_content=formatted_trip_plan,
-                                 day_wise_content=day_wise_content,
-                                 highlights=highlights)
-        
-    except Exception as e:
-        flash(f'Error generating trip plan: {str(e)}', 'error')
-        return jsonify({'error': str(e)}), 500
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Report the status of a trip generation job"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please log in first'}), 401
+    
+    job = job_queue.get(job_id)
+    if not job or job.get('user_id') != session['user_id']:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    # Polling keeps the job alive; it is abandoned once the client stops asking
+    job_queue.touch(job_id)
+    
+    response = {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'created_at': datetime.fromtimestamp(job['created_at']).isoformat(),
+        'updated_at': datetime.fromtimestamp(job['updated_at']).isoformat()
+    }
+    
+    if job['status'] == 'completed':
+        response['result'] = job['result']
+        response['trip_url'] = url_for('view_trip', trip_id=job['result']['trip_id'])
+    elif job['status'] in ('failed', 'cancelled'):
+        response['error'] = job['error']
+    
+    return jsonify(response)
+
+def job_deadline(job):
+    """Deadline for a generation job; jobs a client is polling are abandoned once it stops polling"""
+    is_alive = None
+    if job['payload'].get('watched'):
+        is_alive = lambda: job_queue.client_alive(job['job_id'], Config.CLIENT_LIVENESS_TIMEOUT)
+    return Deadline(Config.JOB_DEADLINE_SECONDS, is_alive)
+
+def run_generation_job(job):
+    """Generate, format and save the trip for a queued generation job"""
+    payload = job['payload']
+    trip_request = {
+        'start_location': payload['start_location'],
+        'destination': payload['destination'],
+        'num_days': payload['num_days'],
+        'start_date': date.fromisoformat(payload['start_date']),
+        'end_date': date.fromisoformat(payload['end_date']),
+        'budget': payload['budget']
+    }
+    
+    deadline = job_deadline(job)
+    deadline.check('generation')
+    
+    # A speculative generation started while the form was filled in needs no new Groq work
+    plan = None
+    if Config.SPECULATIVE_ENABLED:
+        plan = speculative_generator.claim(job['user_id'], trip_request, deadline)
+    if plan is None:
+        plan = get_trip_plan_result(**trip_request, deadline=deadline)
+    
+    trip_plan = plan['trip_plan']
+    if trip_plan.startswith("Error"):
+        raise Exception(trip_plan)
+    
+    # Walks the structured plan when there is one instead of re-parsing the text
+    deadline.check('formatting')
+    rendered = content_formatter.render_trip(trip_plan, plan['structured_plan'])
+    
+    deadline.check('saving the trip')
+    saved_trip = trip_model.create_trip(
+        user_id=job['user_id'],
+        title=f"{payload['start_location']} to {payload['destination']}",
+        trip_plan=trip_plan,
+        structured_plan=plan['structured_plan'],
+        status='completed',
+        timeout=deadline.remaining(),
+        **trip_request,
+        **rendered
+    )
+    
+    return {
+        'trip_id': saved_trip['trip_id'],
+        'summary': rendered['summary'],
+        'highlights': rendered['highlights']
+    }
+
+# Generation workers start with the app, so queued jobs and jobs a crashed
+# worker left running are picked up right after a restart
+job_queue.start(run_generation_job)
+
+@app.route('/generate_trip/stream', methods=['POST'])
+def generate_trip_stream():
+    """Stream trip plan generation to the browser as Server-Sent Events"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please log in first'}), 401
+
+    data = request.json if request.is_json else request.form.to_dict()
+
+    try:
+        trip_request = parse_trip_request(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    user_id = session['user_id']
+    deadline = Deadline(Config.REQUEST_DEADLINE_SECONDS)
+    idempotency_key = get_idempotency_key(request, data)
+
+    # A repeated submit (double click, network retry) waits briefly for the first one and gets its trip
+    if idempotency_key:
+        record = idempotency_store.claim(user_id, idempotency_key, trip_request, wait=Config.IDEMPOTENCY_WAIT_SECONDS)
+        if record is not None and record['status'] != 'completed':
+            return idempotency_conflict(record)
+        if record is not None:
+            trip_id = record['result']['trip_id']
+            done = format_sse('done', {'trip_id': trip_id, 'redirect_url': url_for('view_trip', trip_id=trip_id)})
+            return Response(done, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    try:
+        # A speculative generation started while the form was filled in is replayed instead
+        prefetched = speculative_generator.claim(user_id, trip_request, deadline) if Config.SPECULATIVE_ENABLED else None
+
+        if prefetched is None:
+            decision = admit_generation(user_id, trip_request['num_days'], stream=True)
+            if not decision['allowed']:
+                if idempotency_key:
+                    idempotency_store.release(user_id, idempotency_key)
+                return too_many_requests(decision)
+    except Exception:
+        if idempotency_key:
+            idempotency_store.release(user_id, idempotency_key)
+        raise
+
+    saved = {}
+
+    def generate():
+        # A client that disconnects closes this generator, which closes the Groq stream
+        events = stream_trip_events(content_formatter, prefetched=prefetched, deadline=deadline, **trip_request)
+        try:
+            for event, payload in events:
+                if event != 'complete':
+                    yield format_sse(event, payload)
+                    continue
+
+                # Format the finished plan and save it once the stream completes
+                trip_plan = payload['trip_plan']
+                deadline.check('formatting')
+                rendered = content_formatter.render_trip(trip_plan, payload['structured_plan'])
+                deadline.check('saving the trip')
+                saved_trip = trip_model.create_trip(
+                    user_id=user_id,
+                    title=f"{trip_request['start_location']} to {trip_request['destination']}",
+                    start_location=trip_request['start_location'],
+                    destination=trip_request['destination'],
+                    start_date=trip_request['start_date'],
+                    end_date=trip_request['end_date'],
+                    budget=trip_request['budget'],
+                    trip_plan=trip_plan,
+                    structured_plan=payload['structured_plan'],
+                    status='completed',
+                    timeout=deadline.remaining(),
+                    **rendered
+                )
+                saved['trip_id'] = saved_trip['trip_id']
+                if idempotency_key:
+                    idempotency_store.complete(user_id, idempotency_key, {'trip_id': saved['trip_id']})
+                yield format_sse('done', {
+                    'trip_id': saved['trip_id'],
+                    'redirect_url': url_for('view_trip', trip_id=saved['trip_id'])
+                })
+        except Exception as e:
+            yield format_sse('error', {'error': f'Error generating trip plan: {str(e)}'})
+        finally:
+            events.close()
+
+    def release_unsaved_key():
+        """A stream that didn't save a trip frees its key, so a retry runs again"""
+        if idempotency_key and 'trip_id' not in saved:
+            idempotency_store.release(user_id, idempotency_key)
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Runs when the response is closed, even if the stream was never started
+    response.call_on_close(release_unsaved_key)
+    return response
 
 @app.route('/trip/<trip_id>')
 def view_trip(trip_id):
@@ -408,6 +582,17 @@ def view_trip(trip_id):
         flash('Access denied', 'error')
         return redirect(url_for('dashboard'))
     
+    # Display fields are stored with the trip; only trips saved before that
+    # (or by an older formatter version) are rendered, once
+    rendered = content_formatter.stored_render(trip_data)
+    if rendered is None:
+        rendered = content_formatter.render_trip(trip_data.get('trip_plan', ''), trip_data.get('structured_plan'))
+        try:
+            trip_model.save_rendered(trip_id, rendered)
+        except Exception as e:
+            print(f"❌ {e}")
+    trip_data.update(rendered)
+    
     return render_template('trip_result.html', trip=trip_data)
 
 @app.route('/download_pdf/<trip_id>')
@@ -435,13 +620,138 @@ def download_pdf(trip_id):
         trip_data['start_location'],
         trip_data['destination'],
         start_date,
-        end_date
+        end_date,
+        structured_plan=trip_data.get('structured_plan')
     )
     
     filename = f"trip_plan_{trip_data['start_location']}_to_{trip_data['destination']}_{start_date}.pdf"
     
     return send_file(pdf_path, as_attachment=True, download_name=filename, mimetype='application/pdf')
 
+@app.route('/modify_trip', methods=['POST'])
+def modify_trip():
+    """Apply a change request to a trip, regenerating only the days and sections it is about"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please log in first'}), 401
+    
+    data = request.json if request.is_json else request.form.to_dict()
+    trip_id = data.get('trip_id')
+    trip = trip_model.get_trip_by_id(trip_id) if trip_id else None
+    if not trip or trip.get('user_id') != session['user_id']:
+        return jsonify({'success': False, 'message': 'Trip not found or access denied'}), 404
+    
+    change_request = (data.get('preferences') or '').strip()
+    destination = (data.get('destination') or trip['destination']).strip()
+    start_date = data.get('start_date') or trip['start_date']
+    try:
+        duration = int(data.get('duration') or trip['duration'])
+        budget_amount = float(data.get('budget') or trip['budget'].get('amount') or 0)
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': 'Invalid duration or budget'}), 400
+    
+    deadline = Deadline(Config.REQUEST_DEADLINE_SECONDS)
+    try:
+        if destination != trip['destination'] or start_date != trip['start_date'] or duration != trip['duration']:
+            # A new destination or new dates invalidate every part of the plan
+            trip_request = parse_trip_request({
+                'start_location': trip['start_location'],
+                'destination': destination,
+                'start_date': start_date,
+                'end_date': (datetime.strptime(start_date, '%Y-%m-%d').date() + timedelta(days=duration - 1)).isoformat(),
+                'budget_amount': budget_amount,
+                'currency': trip['budget'].get('currency')
+            })
+            decision = admit_generation(session['user_id'], trip_request['num_days'])
+            if not decision['allowed']:
+                return too_many_requests(decision)
+            
+            plan = get_trip_plan_result(**trip_request, deadline=deadline)
+            if plan['trip_plan'].startswith("Error"):
+                return jsonify({'success': False, 'message': plan['trip_plan']}), 502
+            
+            trip.update({
+                'title': f"{trip['start_location']} to {destination}",
+                'destination': destination,
+                'start_date': trip_request['start_date'].isoformat(),
+                'end_date': trip_request['end_date'].isoformat(),
+                'duration': trip_request['num_days'],
+                'budget': trip_request['budget'],
+                'trip_plan': plan['trip_plan'],
+                'structured_plan': plan['structured_plan'],
+                'day_wise_content': None
+            })
+            days, sections = infer_scope(change_request, trip['duration'])
+            changed = {'changed_days': list(range(1, trip['duration'] + 1)), 'changed_sections': 'all'}
+        else:
+            days, sections = resolve_scope(data.get('days'), data.get('sections'), change_request, trip['duration'])
+            if budget_amount != trip['budget'].get('amount'):
+                trip['budget'] = dict(trip['budget'], amount=budget_amount)
+                if 'budget' not in sections:
+                    sections.append('budget')
+            if not days and not sections:
+                return jsonify({
+                    'success': False,
+                    'message': 'Say which days or sections to change, e.g. "Day 2" or "more vegetarian food"'
+                }), 400
+            changed = {'changed_days': [], 'changed_sections': []}
+        
+        # The edit itself: only the affected days and sections go to the model
+        if days or sections:
+            decision = admit_generation(session['user_id'], len(days), (['itinerary'] if days else []) + sections)
+            if not decision['allowed']:
+                return too_many_requests(decision)
+            
+            result = modify_trip_plan(trip, change_request, days, sections, deadline)
+            trip['trip_plan'] = result['trip_plan']
+            trip['structured_plan'] = result['structured_plan']
+            if changed['changed_sections'] != 'all':
+                changed = {'changed_days': result['changed_days'], 'changed_sections': result['changed_sections']}
+        
+        deadline.check('formatting')
+        if trip.get('structured_plan'):
+            rendered = content_formatter.render_trip(trip['trip_plan'], trip['structured_plan'])
+        else:
+            # Only days whose text changed are formatted again (if their HTML is from this formatter version)
+            document = parse_trip_document(trip['trip_plan'])
+            previous = trip.get('day_wise_content') if trip.get('formatter_version') == FORMATTER_VERSION else None
+            rendered = {
+                'formatted_trip_plan': content_formatter.format_for_web(document),
+                'summary': content_formatter.extract_summary(document),
+                'highlights': content_formatter.get_highlights(document),
+                'day_wise_content': content_formatter.get_day_wise_content(document, previous),
+                'formatter_version': FORMATTER_VERSION
+            }
+        
+        deadline.check('saving the trip')
+        trip_model.update_trip(trip_id, {
+            'title': trip['title'],
+            'destination': trip['destination'],
+            'start_date': trip['start_date'],
+            'end_date': trip['end_date'],
+            'duration': trip['duration'],
+            'budget': trip['budget'],
+            'trip_plan': trip['trip_plan'],
+            'structured_plan': trip.get('structured_plan'),
+            'modification_count': trip.get('modification_count', 0) + 1,
+            **rendered
+        }, timeout=deadline.remaining())
+        
+        return jsonify({
+            'success': True,
+            'trip_id': trip_id,
+            'redirect_url': url_for('view_trip', trip_id=trip_id),
+            **changed
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except CircuitOpenError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503, {'Retry-After': str(int(e.retry_after) + 1)}
+    except DeadlineExceededError as e:
+        return jsonify({'success': False, 'message': str(e)}), 504
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error modifying trip: {str(e)}'}), 500
+
 @app.route('/profile')
 def profile():
     """User profile page"""
@@ -476,7 +786,141 @@ def api_calculate_min_budget():
     
     min_budget = calculate_min_budget(start_location, destination, num_days)
     
-    return jsonify({'min_budget': min_budget})
+    # Origin, destination and dates are in: the submit usually follows, so start generating now
+    speculation = None
+    if Config.SPECULATIVE_ENABLED and 'user_id' in session:
+        try:
+            speculation = speculative_generator.speculate(session['user_id'], parse_trip_request(request.args))
+        except ValueError:
+            speculation = 'incomplete'
+    
+    return jsonify({'min_budget': min_budget, 'speculation': speculation})
+
+@app.route('/api/speculation/cancel', methods=['POST'])
+def api_cancel_speculation():
+    """Cancel the user's speculative generations (sent when they leave the planner)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please log in first'}), 401
+    
+    return jsonify({'cancelled': speculative_generator.cancel(session['user_id'])})
+
+def insight_request_args():
+    """Parse the query arguments shared by the insight endpoints"""
+    destination = (request.args.get('destination') or '').strip()
+    if not destination:
+        raise ValueError('destination is required')
+
+    try:
+        duration = min(max(int(request.args.get('duration', 3)), 1), 30)
+    except (ValueError, TypeError):
+        raise ValueError('duration must be a number of days')
+
+    return destination, duration
+
+def insight_response(destination, text, cache_status):
+    """JSON response for an insight endpoint, with the cache status in X-Cache"""
+    response = jsonify({
+        'destination': destination,
+        'content': text,
+        'formatted_content': content_formatter.format_for_web(text),
+        'cache': cache_status
+    })
+    response.headers['X-Cache'] = cache_status
+    return response
+
+@app.route('/api/destination_info')
+def api_destination_info():
+    """API endpoint for general destination information"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please log in first'}), 401
+
+    try:
+        destination, _ = insight_request_args()
+        text, cache_status = get_destination_info(destination)
+        return insight_response(destination, text, cache_status)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except CircuitOpenError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(int(e.retry_after) + 1)}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/activities')
+def api_activities():
+    """API endpoint for activity recommendations (?interests=food,history&duration=5)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please log in first'}), 401
+
+    try:
+        destination, duration = insight_request_args()
+        interests = [item for value in request.args.getlist('interests') for item in value.split(',')]
+        text, cache_status = get_activity_recommendations(destination, interests, duration)
+        return insight_response(destination, text, cache_status)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except CircuitOpenError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(int(e.retry_after) + 1)}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/budget_optimization')
+def api_budget_optimization():
+    """API endpoint for budget optimization advice (?budget_amount=50000&currency=INR&priorities=food)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please log in first'}), 401
+
+    try:
+        destination, duration = insight_request_args()
+        try:
+            budget_amount = float(request.args.get('budget_amount') or 0)
+        except (ValueError, TypeError):
+            raise ValueError('budget_amount must be a number')
+        if budget_amount <= 0:
+            raise ValueError('budget_amount is required')
+
+        currency = request.args.get('currency') or 'INR'
+        budget = {
+            "amount": budget_amount,
+            "currency": currency,
+            "symbol": CURRENCY_SYMBOLS.get(currency, "$")
+        }
+        priorities = [item for value in request.args.getlist('priorities') for item in value.split(',')]
+
+        text, cache_status = get_budget_optimization(destination, budget, duration, priorities)
+        return insight_response(destination, text, cache_status)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except CircuitOpenError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(int(e.retry_after) + 1)}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Generation capacity metrics: admission control, queue depth, caches, speculation and Groq client"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please log in first'}), 401
+
+    job_stats = job_queue.stats()
+    return jsonify({
+        'rate_limiter': rate_limiter.stats(),
+        'queue_depth': {
+            'queued_jobs': job_stats['queued'],
+            'running_jobs': job_stats['running'],
+            'in_flight_generations': plan_flight.in_flight()
+        },
+        'jobs': job_stats,
+        'plan_cache': plan_cache.stats(),
+        'destination_cache': destination_cache.stats(),
+        'insights_cache': insights_cache.stats(),
+        'single_flight': plan_flight.stats(),
+        'generation': get_generation_stats(),
+        'model_routes': model_router.stats(),
+        'groq_client': llm_client.stats(),
+        'prewarm': prewarm_scheduler.last_stats,
+        'speculative': speculative_generator.stats(),
+        'idempotency': idempotency_store.stats()
+    })
 
 # Error handlers
 @app.errorhandler(400)
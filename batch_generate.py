@@ -0,0 +1,260 @@
+"""
+Generate trip plans in bulk from a CSV or JSONL file of trip specs.
+
+Each spec needs start_location, destination, start_date and either end_date
+or num_days; budget_amount, currency and id are optional. Results are
+appended to a JSONL file (specs that can't be used as 'invalid' records)
+and progress is checkpointed, so an interrupted run picks up where it
+stopped. Start dates may be in the past, so old batches can be resumed:
+
+    python batch_generate.py specs.csv --output plans.jsonl --concurrency 8
+    python batch_generate.py specs.jsonl --output plans.jsonl --load-cache --firestore-user marketing
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from config import Config
+from trip_generator import get_trip_plan, generate_trip_plan, parse_trip_request, plan_request_key
+from rate_limiter import RateLimiter
+from model_router import model_router
+
+BATCH_USER_ID = 'batch'
+
+def read_specs(path):
+    """Read trip specs from a .csv or .jsonl file"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            return [dict(row) for row in csv.DictReader(f)]
+        return [json.loads(line) for line in f if line.strip()]
+
+def spec_to_request(spec):
+    """Turn a spec into get_trip_plan arguments (end_date may be given as num_days; past dates are fine)"""
+    spec = {key: value for key, value in spec.items() if value not in (None, '')}
+    if 'end_date' not in spec and spec.get('num_days') and spec.get('start_date'):
+        start_date = datetime.strptime(spec['start_date'], '%Y-%m-%d').date()
+        spec['end_date'] = (start_date + timedelta(days=int(spec['num_days']) - 1)).isoformat()
+    return parse_trip_request(spec, allow_past=True)
+
+def spec_id(spec, trip_request):
+    """Stable id for a spec: its own id column, or a hash of the request"""
+    if spec.get('id'):
+        return str(spec['id'])
+    key = plan_request_key(**trip_request)
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:16]
+
+def invalid_spec_id(spec):
+    """Stable id for a spec that can't be parsed: its own id column, or a hash of the raw spec"""
+    if spec.get('id'):
+        return str(spec['id'])
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+class Checkpoint:
+    """Append-only log of finished specs ('generated'), rejected specs ('invalid') and specs saved to Firestore ('loaded')"""
+
+    def __init__(self, path):
+        self.path = path
+        self.generated = set()
+        self.invalid = set()
+        self.loaded = set()
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # partial line from an interrupted write
+                    getattr(self, entry['event']).add(entry['id'])
+
+    def mark(self, event, ids):
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for item_id in ids:
+                    f.write(json.dumps({'id': item_id, 'event': event}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            getattr(self, event).update(ids)
+
+class BatchRunner:
+    """Run trip specs through the generator with bounded concurrency and rate limiting"""
+
+    def __init__(self, output_path, checkpoint, concurrency=4, limiter=None, load_cache=False):
+        self.output_path = output_path
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self.load_cache = load_cache
+        self._write_lock = threading.Lock()
+        self.stats = {'total': 0, 'skipped': 0, 'generated': 0, 'failed': 0, 'invalid': 0, 'throttled': 0}
+
+    def run(self, specs):
+        jobs = []
+        for spec in specs:
+            self.stats['total'] += 1
+            try:
+                trip_request = spec_to_request(spec)
+            except ValueError as e:
+                # Recorded once, so a rerun doesn't write the same invalid record again
+                invalid_id = invalid_spec_id(spec)
+                if invalid_id in self.checkpoint.invalid:
+                    self.stats['skipped'] += 1
+                    continue
+                self.stats['invalid'] += 1
+                self._write({'id': spec.get('id'), 'status': 'invalid', 'error': str(e), 'spec': spec})
+                self.checkpoint.mark('invalid', [invalid_id])
+                print(f"❌ Skipping invalid spec {spec}: {e}")
+                continue
+
+            item_id = spec_id(spec, trip_request)
+            if item_id in self.checkpoint.generated:
+                self.stats['skipped'] += 1
+                continue
+            jobs.append((item_id, trip_request))
+
+        print(f"📋 {len(jobs)} plans to generate ({self.stats['skipped']} already done)")
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for _ in executor.map(lambda job: self._generate(*job), jobs):
+                pass
+        return self.stats
+
+    def _generate(self, item_id, trip_request):
+        self._wait_for_capacity(trip_request['num_days'])
+
+        started = time.time()
+        generate = get_trip_plan if self.load_cache else generate_trip_plan
+        try:
+            trip_plan = generate(**trip_request)
+            if trip_plan.startswith("Error"):
+                raise Exception(trip_plan)
+        except Exception as e:
+            self._count('failed')
+            self._write({'id': item_id, 'status': 'failed', 'error': str(e), **self._request_fields(trip_request)})
+            print(f"❌ {item_id} failed: {e}")
+            return
+
+        self._write({
+            'id': item_id,
+            'status': 'completed',
+            **self._request_fields(trip_request),
+            'trip_plan': trip_plan,
+            'generated_at': datetime.now().isoformat(),
+            'elapsed': round(time.time() - started, 2)
+        })
+        self.checkpoint.mark('generated', [item_id])
+        self._count('generated')
+        print(f"✅ {item_id}: {trip_request['destination']} ({trip_request['num_days']} days)")
+
+    def _wait_for_capacity(self, num_days):
+        """Block until the rate limiter admits one more generation"""
+        if not self.limiter:
+            return
+        while True:
+            decision = self.limiter.acquire(BATCH_USER_ID, model_router.estimate_tokens(num_days),
+                                            model_router.estimate_completions(num_days))
+            if decision['allowed']:
+                return
+            self._count('throttled')
+            time.sleep(decision['retry_after'])
+
+    def _count(self, name):
+        with self._write_lock:
+            self.stats[name] += 1
+
+    def _request_fields(self, trip_request):
+        return {
+            'start_location': trip_request['start_location'],
+            'destination': trip_request['destination'],
+            'num_days': trip_request['num_days'],
+            'start_date': trip_request['start_date'].isoformat(),
+            'end_date': trip_request['end_date'].isoformat(),
+            'budget': trip_request['budget']
+        }
+
+    def _write(self, record):
+        with self._write_lock:
+            with open(self.output_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def load_into_firestore(output_path, checkpoint, user_id, batch_size=500):
+    """Save completed results that are not in Firestore yet as trips owned by user_id"""
+    # Imported here so plain generation runs don't need Firebase credentials
+    from models import trip_model
+    from content_formatter import TripContentFormatter
+
+    formatter = TripContentFormatter()
+    pending = {}
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('status') == 'completed' and record['id'] not in checkpoint.loaded:
+                pending[record['id']] = record  # the latest result for an id wins
+
+    records = list(pending.values())
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        trip_model.bulk_create_trips([
+            {
+                'user_id': user_id,
+                'title': f"{record['start_location']} to {record['destination']}",
+                'start_location': record['start_location'],
+                'destination': record['destination'],
+                'start_date': datetime.strptime(record['start_date'], '%Y-%m-%d').date(),
+                'end_date': datetime.strptime(record['end_date'], '%Y-%m-%d').date(),
+                'budget': record['budget'],
+                'trip_plan': record['trip_plan'],
+                'status': 'completed',
+                'batch_id': record['id'],
+                **formatter.render_trip(record['trip_plan'])
+            }
+            for record in batch
+        ], batch_size=batch_size)
+        checkpoint.mark('loaded', [record['id'] for record in batch])
+        print(f"✅ Saved {start + len(batch)}/{len(records)} trips to Firestore")
+
+    return len(records)
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate trip plans in bulk from a CSV or JSONL file')
+    parser.add_argument('input', help='trip specs (.csv or .jsonl)')
+    parser.add_argument('--output', default='batch_plans.jsonl', help='JSONL file results are appended to')
+    parser.add_argument('--checkpoint', help='progress file (default: <output>.checkpoint)')
+    parser.add_argument('--concurrency', type=int, default=4, help='plans generated at the same time')
+    parser.add_argument('--requests-per-minute', type=int, default=20, help='batch share of the Groq quota')
+    parser.add_argument('--tokens-per-minute', type=int, default=100000, help='estimated output tokens per minute')
+    parser.add_argument('--reserve', type=float, default=0.5, help='share of the global quota kept for live users')
+    parser.add_argument('--load-cache', action='store_true', help='read from and store results in the plan cache')
+    parser.add_argument('--firestore-user', help='also save completed plans as trips owned by this user id')
+    args = parser.parse_args()
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.output}.checkpoint")
+
+    # Draws on the web app's global buckets only while --reserve of them is left for live users
+    limiter = RateLimiter(
+        Config.RATE_LIMIT_PATH,
+        global_requests_per_minute=Config.GLOBAL_REQUESTS_PER_MINUTE,
+        global_tokens_per_minute=Config.GLOBAL_TOKENS_PER_MINUTE,
+        user_requests_per_minute=args.requests_per_minute,
+        user_tokens_per_minute=args.tokens_per_minute,
+        global_reserve=args.reserve
+    )
+
+    runner = BatchRunner(args.output, checkpoint, args.concurrency, limiter, args.load_cache)
+    stats = runner.run(read_specs(args.input))
+    print(f"📊 {json.dumps(stats)}")
+
+    if args.firestore_user and os.path.exists(args.output):
+        loaded = load_into_firestore(args.output, checkpoint, args.firestore_user)
+        print(f"📊 {loaded} trips saved to Firestore")
+
+if __name__ == '__main__':
+    main()
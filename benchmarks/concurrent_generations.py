@@ -0,0 +1,71 @@
+"""
+Benchmark: concurrent Groq completions from a single worker process.
+
+Compares the old pattern (a blocking groq.Groq client, one completion at a
+time per worker) with the async path on the shared connection pool, against
+the local stub server so no API key or quota is needed:
+
+    python benchmarks/concurrent_generations.py --requests 50 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_groq_server import start_stub_server
+
+MESSAGES = [{"role": "user", "content": "Plan a 2-day trip to Pondicherry"}]
+
+def run_sync_baseline(base_url, num_requests):
+    """One blocking client, one outstanding completion at a time (the previous behaviour)"""
+    import groq
+
+    client = groq.Groq(api_key='stub', base_url=base_url, max_retries=0)
+    started = time.perf_counter()
+    for _ in range(num_requests):
+        client.chat.completions.create(messages=MESSAGES, model='stub-model', max_tokens=100)
+    return time.perf_counter() - started, 1
+
+def run_async_pool(num_requests):
+    """Every completion in flight at once on the shared event loop and connection pool"""
+    from llm_client import llm_client, run_async
+
+    async def generate_all():
+        await asyncio.gather(*(
+            llm_client.create_async(messages=MESSAGES, model='stub-model', max_tokens=100)
+            for _ in range(num_requests)
+        ))
+
+    started = time.perf_counter()
+    run_async(generate_all())
+    return time.perf_counter() - started, llm_client.stats()['peak_in_flight']
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent Groq generations per worker, before and after')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.5, help='stub server latency per completion (seconds)')
+    args = parser.parse_args()
+
+    server = start_stub_server(latency=args.latency)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    # Must be set before llm_client builds its clients
+    os.environ['GROQ_BASE_URL'] = base_url
+    os.environ.setdefault('GROQ_API_KEY', 'stub')
+
+    results = [
+        ('sync client (before)',) + run_sync_baseline(base_url, args.requests),
+        ('async pool (after)',) + run_async_pool(args.requests)
+    ]
+
+    print(f"{args.requests} completions, {args.latency:.2f}s stub latency each\n")
+    print(f"{'mode':<24}{'elapsed (s)':>12}{'completions/s':>16}{'peak in flight':>16}")
+    for name, elapsed, peak in results:
+        print(f"{name:<24}{elapsed:>12.2f}{args.requests / elapsed:>16.1f}{peak:>16}")
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: turning a finished plan's text into everything the app shows.
+
+Before, every output did its own line-by-line pass over the plan text:
+format_for_web, extract_summary, get_highlights, get_day_wise_content (which
+formatted every day again) and the PDF parser. render_trip now parses the
+plan once into a TripDocument and renders all of them from it. Plans are
+synthetic, so no API key is needed:
+
+    python benchmarks/plan_formatting.py --days 30 --plans 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PLACES = ['Fort Aguada', 'Baga Beach', 'Old Goa', 'Dudhsagar Falls', 'Anjuna Market', 'Chapora Fort',
+          'Panjim Latin Quarter', 'Palolem Beach', 'Spice Plantation', 'Divar Island']
+SLOTS = ['Morning', 'Afternoon', 'Evening']
+
+def synthetic_plan(num_days, seed=0):
+    """A plan text shaped like a real model reply (sections, day headers, bullets, notes, costs)"""
+    rng = random.Random(seed)
+    lines = [
+        f"Here is your {num_days}-day plan for Goa, with a mix of beaches, forts and food that is well paced.",
+        '',
+        '1. **OVERVIEW & HIGHLIGHTS**',
+        'Goa is famous for its beaches and Portuguese heritage. Must visit Old Goa churches.',
+        '- Best time: November to February',
+        '',
+        'TRANSPORTATION:',
+        '- Flight from Mumbai: ₹4,000',
+        '* Scooter rental ₹400/day',
+        '',
+        'DETAILED DAY-BY-DAY ITINERARY:',
+        ''
+    ]
+    for day in range(1, num_days + 1):
+        lines.append(f"Day {day}: {rng.choice(PLACES)} and around")
+        for slot in SLOTS:
+            lines.append(f"{slot}:")
+            for _ in range(rng.randint(2, 4)):
+                hour = rng.randint(7, 21)
+                place = rng.choice(PLACES)
+                lines.append(f"- {hour:02d}:00 Visit {place}, a popular attraction (₹{rng.randint(1, 20) * 100})")
+            if rng.random() < 0.3:
+                lines.append(f"1. Walk to {rng.choice(PLACES)}")
+                lines.append(f"2) Sunset at {rng.choice(PLACES)}")
+        if rng.random() < 0.5:
+            lines.append('Note: carry sunscreen and water')
+        lines.append(f"Estimated cost for the day: ₹{rng.randint(20, 60) * 100}")
+        lines.append('')
+    lines += [
+        'FOOD & DINING:',
+        '- Fish curry rice at a beach shack is recommended',
+        '- Bebinca dessert',
+        '',
+        'BUDGET BREAKDOWN:',
+        f"- Total: ₹{num_days * 4500:,}",
+        '',
+        'TIPS & HIDDEN GEMS:',
+        "- Don't miss the Saturday night market",
+        '- Tip: rent a scooter early in the morning'
+    ]
+    return '\n'.join(lines)
+
+def run_separate(formatter, pdf, plans):
+    """Each output from its own entry point, one parse per output (the previous call pattern)"""
+    started = time.perf_counter()
+    for plan in plans:
+        formatter.format_for_web(plan)
+        formatter.extract_summary(plan)
+        formatter.get_highlights(plan)
+        formatter.get_day_wise_content(plan)
+        pdf.document_sections(plan)
+    return time.perf_counter() - started
+
+def run_single_parse(formatter, pdf, plans):
+    """render_trip plus the PDF sections from one parsed document"""
+    from trip_document import parse_trip_document
+
+    started = time.perf_counter()
+    for plan in plans:
+        document = parse_trip_document(plan)
+        formatter.render_trip(document)
+        pdf.document_sections(document)
+    return time.perf_counter() - started
+
+def run_parse_only(plans):
+    from trip_document import parse_trip_document
+
+    started = time.perf_counter()
+    for plan in plans:
+        parse_trip_document(plan)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description='Plan text formatting, one parse per output vs one parse per plan')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--plans', type=int, default=20)
+    args = parser.parse_args()
+
+    from content_formatter import TripContentFormatter
+    from pdf_generator import TripPDFGenerator
+
+    formatter = TripContentFormatter()
+    pdf = TripPDFGenerator()
+    plans = [synthetic_plan(args.days, seed) for seed in range(args.plans)]
+    print(f"{args.plans} synthetic {args.days}-day plans, {sum(len(plan) for plan in plans) // args.plans} characters each")
+
+    # Warm up imports and markdown extensions
+    run_single_parse(formatter, pdf, plans[:1])
+
+    results = [
+        ('parse only', run_parse_only(plans)),
+        ('one parse per output', run_separate(formatter, pdf, plans)),
+        ('one parse per plan', run_single_parse(formatter, pdf, plans))
+    ]
+    for name, elapsed in results:
+        print(f"{name:<22} {elapsed:7.3f}s total  {elapsed / args.plans * 1000:8.1f} ms/plan")
+
+if __name__ == '__main__':
+    main()
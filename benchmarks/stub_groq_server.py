@@ -0,0 +1,102 @@
+"""
+Minimal stand-in for the Groq chat completions API.
+
+Answers POST /openai/v1/chat/completions after a fixed latency, optionally
+failing a share of requests with 503, so the client's pooling, retries and
+circuit breaker can be exercised without a real API key:
+
+    python benchmarks/stub_groq_server.py --port 8099 --latency 0.5
+    GROQ_BASE_URL=http://127.0.0.1:8099 python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PLAN_TEXT = "Day 1: Arrival\n- Morning: check in\n- Evening: walk along the beach\n"
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        self.server.requests += 1
+        time.sleep(self.server.latency)
+
+        if random.random() < self.server.failure_rate:
+            self._send_json(503, {'error': {'message': 'stub overloaded', 'type': 'server_error'}})
+            return
+
+        if request.get('stream'):
+            self._send_stream(request)
+            return
+
+        self._send_json(200, {
+            'id': 'stub-completion',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': PLAN_TEXT}
+            }],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 25, 'total_tokens': 125}
+        })
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, request):
+        events = []
+        for line in PLAN_TEXT.splitlines(keepends=True):
+            events.append({'choices': [{'index': 0, 'delta': {'content': line}, 'finish_reason': None}]})
+        events.append({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+
+        body = ''.join(
+            f"data: {json.dumps(dict(event, id='stub-stream', object='chat.completion.chunk', created=0, model=request.get('model', 'stub')))}\n\n"
+            for event in events
+        ) + 'data: [DONE]\n\n'
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # accept bursts of concurrent connections
+
+def start_stub_server(port=0, latency=0.5, failure_rate=0.0):
+    """Start the stub server in a background thread and return it (server.server_port has the port)"""
+    server = StubServer(('127.0.0.1', port), StubHandler)
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub Groq chat completions server')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds before each response')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of requests answered with 503')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.latency, args.failure_rate)
+    print(f"Stub Groq server listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
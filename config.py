@@ -30,6 +30,110 @@ class Config:
     # Session settings
     PERMANENT_SESSION_LIFETIME = 3600  # 1 hour
 
+    # Background trip generation queue
+    JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join('instance', 'jobs.sqlite3'))
+    GENERATION_WORKERS = int(os.getenv('GENERATION_WORKERS', 2))  # worker threads per process
+    GENERATION_MAX_RUNNING = int(os.getenv('GENERATION_MAX_RUNNING', 4))  # across all processes
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 300))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+
+    # Trip plan cache (in-memory LRU + on-disk tier)
+    PLAN_CACHE_ENABLED = os.getenv('PLAN_CACHE_ENABLED', 'true').lower() == 'true'
+    PLAN_CACHE_TTL = int(os.getenv('PLAN_CACHE_TTL', 7 * 24 * 3600))  # 1 week
+    PLAN_CACHE_MAX_ENTRIES = int(os.getenv('PLAN_CACHE_MAX_ENTRIES', 256))
+    PLAN_CACHE_DIR = os.getenv('PLAN_CACHE_DIR', os.path.join('instance', 'plan_cache'))
+    PLAN_CACHE_MAX_DISK_ENTRIES = int(os.getenv('PLAN_CACHE_MAX_DISK_ENTRIES', 5000))
+
+    # Trip generation mode: 'single' (one completion), 'sections' (parallel per-section completions)
+    # or 'structured' (one JSON mode completion validated against plan_schema.TripPlanDocument)
+    GENERATION_MODE = os.getenv('GENERATION_MODE', 'single')
+    SECTION_PARALLELISM = int(os.getenv('SECTION_PARALLELISM', 5))
+    LONG_TRIP_DAYS = int(os.getenv('LONG_TRIP_DAYS', 7))  # longer itineraries are generated in chunks
+    ITINERARY_CHUNK_DAYS = int(os.getenv('ITINERARY_CHUNK_DAYS', 4))
+    MAX_CONTINUATIONS = int(os.getenv('MAX_CONTINUATIONS', 2))  # follow-up requests for truncated completions
+
+    # Destination knowledge cache: date-independent sections (overview, food, practical info,
+    # tips, packing) stored per destination and composed with freshly generated sections.
+    # Only used by the sectioned engine (GENERATION_MODE=sections and long trips)
+    DESTINATION_CACHE_ENABLED = os.getenv('DESTINATION_CACHE_ENABLED', 'true').lower() == 'true'
+    DESTINATION_CACHE_TTL = int(os.getenv('DESTINATION_CACHE_TTL', 30 * 24 * 3600))  # 30 days
+    DESTINATION_CACHE_MAX_ENTRIES = int(os.getenv('DESTINATION_CACHE_MAX_ENTRIES', 512))
+    DESTINATION_CACHE_DIR = os.getenv('DESTINATION_CACHE_DIR', os.path.join('instance', 'destination_cache'))
+
+    # Destination info / activities / budget optimization responses (stale-while-revalidate)
+    INSIGHTS_CACHE_FRESH_TTL = int(os.getenv('INSIGHTS_CACHE_FRESH_TTL', 24 * 3600))  # refreshed in the background after this
+    INSIGHTS_CACHE_MAX_AGE = int(os.getenv('INSIGHTS_CACHE_MAX_AGE', 30 * 24 * 3600))  # never served when older
+    INSIGHTS_CACHE_MAX_ENTRIES = int(os.getenv('INSIGHTS_CACHE_MAX_ENTRIES', 512))
+    INSIGHTS_CACHE_DIR = os.getenv('INSIGHTS_CACHE_DIR', os.path.join('instance', 'insights_cache'))
+
+    # Off-peak pre-warming of plans for featured and suggested destinations
+    PREWARM_ENABLED = os.getenv('PREWARM_ENABLED', 'false').lower() == 'true'
+    PREWARM_HOURS = tuple(int(hour) for hour in os.getenv('PREWARM_HOURS', '1-6').split('-'))  # local time, start-end
+    PREWARM_TOKEN_BUDGET = int(os.getenv('PREWARM_TOKEN_BUDGET', 500000))  # estimated output tokens per run
+    PREWARM_ORIGINS = [origin.strip() for origin in os.getenv('PREWARM_ORIGINS', 'Mumbai,Delhi,Bangalore').split(',') if origin.strip()]
+    PREWARM_DURATIONS = [int(days) for days in os.getenv('PREWARM_DURATIONS', '3,5,7').split(',')]  # for featured destinations
+    PREWARM_SEASONS_AHEAD = int(os.getenv('PREWARM_SEASONS_AHEAD', 2))
+    PREWARM_BUDGETS = [bucket.strip() for bucket in os.getenv('PREWARM_BUDGETS', 'any,budget,mid').split(',') if bucket.strip()]  # INR budget buckets
+    PREWARM_MARKER_DIR = os.getenv('PREWARM_MARKER_DIR', os.path.join('instance', 'prewarm'))
+
+    # Model routing: small completions go to the fast model, large ones to the big model
+    MODEL_ROUTES = os.getenv('MODEL_ROUTES')  # optional JSON list of {name, model, max_estimate, max_tokens}
+    FAST_MODEL = os.getenv('FAST_MODEL', 'llama-3.1-8b-instant')
+    LARGE_MODEL = os.getenv('LARGE_MODEL', 'llama-3.3-70b-versatile')
+    FAST_ROUTE_MAX_ESTIMATE = int(os.getenv('FAST_ROUTE_MAX_ESTIMATE', 3500))  # estimated output tokens
+    TOKEN_HEADROOM = float(os.getenv('TOKEN_HEADROOM', 1.3))  # max_tokens = estimate * headroom
+    MIN_COMPLETION_TOKENS = int(os.getenv('MIN_COMPLETION_TOKENS', 600))
+
+    # Groq client resilience
+    GROQ_BASE_URL = os.getenv('GROQ_BASE_URL')  # e.g. a local stub server for testing
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 60))  # total seconds per call, retries included
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 3))
+    LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 0.5))
+    LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', 8))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))  # consecutive failures
+    CIRCUIT_RESET_SECONDS = int(os.getenv('CIRCUIT_RESET_SECONDS', 30))
+    HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS', 'false').lower() == 'true'
+    HEDGE_PERCENTILE = int(os.getenv('HEDGE_PERCENTILE', 95))  # send a duplicate request after this latency
+
+    # End-to-end deadlines (generation, formatting and the Firestore write) and client liveness
+    REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', 150))
+    JOB_DEADLINE_SECONDS = float(os.getenv('JOB_DEADLINE_SECONDS', 240))  # keep below JOB_LEASE_SECONDS
+    CLIENT_LIVENESS_TIMEOUT = float(os.getenv('CLIENT_LIVENESS_TIMEOUT', 30))  # watched jobs not polled for this long are abandoned
+    LIVENESS_CHECK_INTERVAL = float(os.getenv('LIVENESS_CHECK_INTERVAL', 1.0))
+
+    # Shared HTTP connection pool for Groq calls
+    GROQ_HTTP2 = os.getenv('GROQ_HTTP2', 'true').lower() == 'true'  # used when the h2 package is installed
+    GROQ_MAX_CONNECTIONS = int(os.getenv('GROQ_MAX_CONNECTIONS', 100))
+    GROQ_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('GROQ_MAX_KEEPALIVE_CONNECTIONS', 20))
+    GROQ_KEEPALIVE_EXPIRY = float(os.getenv('GROQ_KEEPALIVE_EXPIRY', 30))
+    GROQ_CONNECT_TIMEOUT = float(os.getenv('GROQ_CONNECT_TIMEOUT', 5))
+    GROQ_READ_TIMEOUT = float(os.getenv('GROQ_READ_TIMEOUT', 60))
+
+    # Admission control for the Groq quota (token buckets shared by all workers). Request limits
+    # count Groq completions, so a sectioned or chunked plan takes several
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_PATH = os.getenv('RATE_LIMIT_PATH', os.path.join('instance', 'rate_limits.sqlite3'))
+    GLOBAL_REQUESTS_PER_MINUTE = int(os.getenv('GLOBAL_REQUESTS_PER_MINUTE', 60))
+    GLOBAL_TOKENS_PER_MINUTE = int(os.getenv('GLOBAL_TOKENS_PER_MINUTE', 200000))  # estimated output tokens
+    USER_REQUESTS_PER_MINUTE = int(os.getenv('USER_REQUESTS_PER_MINUTE', 5))
+    USER_TOKENS_PER_MINUTE = int(os.getenv('USER_TOKENS_PER_MINUTE', 40000))
+
+    # Speculative generation: start a plan in the background once the planner form has origin,
+    # destination and dates, and hand it to the submit that usually follows (opt-in)
+    SPECULATIVE_ENABLED = os.getenv('SPECULATIVE_ENABLED', 'false').lower() == 'true'
+    SPECULATIVE_TTL = int(os.getenv('SPECULATIVE_TTL', 600))  # unclaimed plans are dropped after this
+    SPECULATIVE_MAX_PER_USER = int(os.getenv('SPECULATIVE_MAX_PER_USER', 1))
+    SPECULATIVE_MAX_IN_FLIGHT = int(os.getenv('SPECULATIVE_MAX_IN_FLIGHT', 4))  # per worker
+    SPECULATIVE_REQUESTS_PER_MINUTE = int(os.getenv('SPECULATIVE_REQUESTS_PER_MINUTE', 10))  # all users together
+    SPECULATIVE_TOKENS_PER_MINUTE = int(os.getenv('SPECULATIVE_TOKENS_PER_MINUTE', 40000))
+    SPECULATIVE_CLAIM_TIMEOUT = float(os.getenv('SPECULATIVE_CLAIM_TIMEOUT', 120))  # wait for a running one at submit
+
+    # Idempotency-Key records for generation submits (shared by all workers)
+    IDEMPOTENCY_PATH = os.getenv('IDEMPOTENCY_PATH', os.path.join('instance', 'idempotency.sqlite3'))
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 3600))  # completed results are replayed this long
+    IDEMPOTENCY_LEASE_SECONDS = int(os.getenv('IDEMPOTENCY_LEASE_SECONDS', 300))  # keep above REQUEST_DEADLINE_SECONDS
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 5))  # a repeat waits this long for the first submit, then gets 409
+
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
@@ -1,6 +1,52 @@
-import re
+import threading
+from html import escape
 import markdown
-from bs4 import BeautifulSoup
+from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
+from markdown.postprocessors import Postprocessor
+from plan_schema import load_structured_plan, plan_outline, day_title, day_text, format_cost
+from trip_document import as_document, classify_line, is_section_title, lines_markdown, trim_blank_lines
+
+# Version of the display fields render_trip produces. Trips store them with
+# this stamp; bump it whenever the output for the same plan changes, and
+# saved trips are rendered again the next time they are viewed.
+FORMATTER_VERSION = 3
+
+DISPLAY_FIELDS = ('formatted_trip_plan', 'summary', 'highlights', 'day_wise_content')
+
+# CSS classes the trip templates style, by tag
+ELEMENT_CLASSES = {
+    'h2': 'day-header',
+    'h3': 'section-header',
+    'ul': 'trip-list',
+    'ol': 'numbered-list',
+    'em': 'time-cost-info',
+    'strong': 'important-note'
+}
+
+class TripHtmlTreeprocessor(Treeprocessor):
+    """
+    Add the CSS classes the trip pages style to markdown's element tree while it is being built
+    """
+
+    def run(self, root):
+        for element in root.iter():
+            if element.tag in ELEMENT_CLASSES:
+                element.set('class', ELEMENT_CLASSES[element.tag])
+
+class SelfClosingTagPostprocessor(Postprocessor):
+    """Write void tags as <br/> rather than markdown's <br />, as the pages have always had them"""
+
+    def run(self, text):
+        return text.replace(' />', '/>')
+
+class TripHtmlExtension(Extension):
+    """Markdown extension producing the trip page HTML of a block; IncrementalTripFormatter adds the day sections"""
+
+    def extendMarkdown(self, md):
+        # After inline patterns (20), so em/strong exist
+        md.treeprocessors.register(TripHtmlTreeprocessor(md), 'trip_html', 5)
+        md.postprocessors.register(SelfClosingTagPostprocessor(md), 'self_closing_tags', 10)
 
 class TripContentFormatter:
     """
@@ -8,126 +54,169 @@ class TripContentFormatter:
     """
     
     def __init__(self):
-        # Fixed: Removed invalid extension_configs for nl2br
-        self.markdown_processor = markdown.Markdown(
-            extensions=['tables', 'fenced_code', 'nl2br']
-        )
+        # Markdown instances hold per-document state, so every thread gets its own
+        self._local = threading.local()
     
+    @property
+    def markdown_processor(self):
+        """
+        This thread's Markdown instance, built with its extensions on first use
+        """
+        processor = getattr(self._local, 'markdown_processor', None)
+        if processor is None:
+            # Fixed: Removed invalid extension_configs for nl2br
+            processor = markdown.Markdown(
+                extensions=['tables', 'fenced_code', 'nl2br', TripHtmlExtension()]
+            )
+            self._local.markdown_processor = processor
+        return processor
+    
+    def render_trip(self, trip_plan, structured_plan=None):
+        """
+        Build the display fields of a trip: formatted_trip_plan, summary, highlights and day_wise_content.
+
+        Trips with a structured plan are rendered by walking the structure;
+        older trips (and plans that fell back to text) are parsed once into a
+        TripDocument and every field is rendered from it. `trip_plan` may be
+        the text or an already parsed TripDocument. The result also carries
+        formatter_version, so it can be stored on the trip as it is.
+        """
+        plan = load_structured_plan(structured_plan)
+        if plan is None:
+            document = as_document(trip_plan)
+            formatted_trip_plan, day_wise_content = self._format_with_days(document)
+            return {
+                'formatted_trip_plan': formatted_trip_plan,
+                'summary': self.extract_summary(document),
+                'highlights': self.get_highlights(document),
+                'day_wise_content': day_wise_content,
+                'formatter_version': FORMATTER_VERSION
+            }
+
+        summary = plan.summary
+        if len(summary) > 200:
+            summary = summary[:200] + "..."
+        return {
+            'formatted_trip_plan': self.format_structured_for_web(plan),
+            'summary': summary or self.extract_summary(trip_plan),
+            'highlights': plan.highlights[:5],
+            'day_wise_content': [
+                {
+                    'title': day_title(day),
+                    'content': day_text(day, plan.currency_symbol),
+                    'formatted_content': self._format_structured_day(day, plan.currency_symbol)
+                }
+                for day in plan.days
+            ],
+            'formatter_version': FORMATTER_VERSION
+        }
+
+    def stored_render(self, trip):
+        """
+        The display fields saved on a trip, or None if they are missing or from another formatter version
+        """
+        if trip.get('formatter_version') != FORMATTER_VERSION:
+            return None
+        if any(trip.get(field) is None for field in DISPLAY_FIELDS):
+            return None
+        return {field: trip[field] for field in DISPLAY_FIELDS + ('formatter_version',)}
+
+    def format_structured_for_web(self, plan):
+        """
+        Format a TripPlanDocument as HTML with the same classes format_for_web produces
+        """
+        sections = []
+        current_section = []
+        if plan.summary:
+            current_section.append(f"<p>{escape(plan.summary)}</p>")
+        if plan.highlights:
+            current_section.append(self._format_structured_list('Highlights:', plan.highlights))
+
+        for title, section in plan_outline(plan):
+            if section is not None:
+                if section.items:
+                    current_section.append(self._format_structured_list(f"{title}:", section.items))
+                continue
+
+            # The itinerary: every day gets its own section, like day headers in text plans
+            current_section.append(f'<h3 class="section-header">{escape(title)}:</h3>')
+            sections.append(current_section)
+            for day in plan.days:
+                sections.append([
+                    f'<h2 class="day-header">{escape(day_title(day))}</h2>',
+                    self._format_structured_day(day, plan.currency_symbol)
+                ])
+            current_section = []
+
+        sections.append(current_section)
+        return '\n'.join(
+            '<div class="day-section">' + '\n'.join(section) + '</div>'
+            for section in sections if section
+        )
+
+    def _format_structured_day(self, day, symbol=''):
+        """HTML for the slots, meals, cost and notes of one structured day"""
+        parts = []
+        for slot in day.slots:
+            items = []
+            for activity in slot.activities:
+                text = escape(f"{activity.time} {activity.title}".strip())
+                if activity.description:
+                    text += f" - {escape(activity.description)}"
+                if activity.location:
+                    text += f" ({escape(activity.location)})"
+                extras = [item for item in (format_cost(activity.cost, symbol), activity.duration) if item]
+                if extras:
+                    text += f' <em class="time-cost-info">{escape(", ".join(extras))}</em>'
+                items.append(f"<li>{text}</li>")
+            parts.append(f'<h3 class="section-header">{escape(slot.name)}:</h3>')
+            parts.append('<ul class="trip-list">' + ''.join(items) + '</ul>')
+
+        if day.meals:
+            parts.append(self._format_structured_list('Meals:', day.meals))
+        if day.estimated_cost is not None:
+            cost = escape(format_cost(day.estimated_cost, symbol))
+            parts.append(f'<p><em class="time-cost-info">Estimated cost for the day: {cost}</em></p>')
+        for note in day.notes:
+            parts.append(f'<p><strong class="important-note">Note: {escape(note)}</strong></p>')
+        return '\n'.join(parts)
+
+    def _format_structured_list(self, title, items):
+        """Section header followed by a bullet list"""
+        list_items = ''.join(f"<li>{escape(item)}</li>" for item in items)
+        return f'<h3 class="section-header">{escape(title)}</h3>\n<ul class="trip-list">{list_items}</ul>'
+
     def format_for_web(self, content):
         """
-        Format trip content for web display with proper HTML structure
+        Format trip content (text or a TripDocument) for web display with proper HTML structure
         """
         if not content:
             return ""
         
-        # Clean and preprocess the content
-        formatted_content = self._preprocess_content(content)
-        
-        # Apply markdown formatting
-        html_content = self.markdown_processor.convert(formatted_content)
-        
-        # Post-process HTML for better styling
-        html_content = self._post_process_html(html_content)
-        
-        return html_content
+        return self._format_lines(as_document(content).lines)
     
-    def _preprocess_content(self, content):
+    def _format_lines(self, lines):
         """
-        Preprocess content to ensure proper markdown formatting
+        Render classified lines block by block and group them into day sections
         """
-        lines = content.split('\n')
-        processed_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                processed_lines.append('')
-                continue
-            
-            # Format day headers
-            if re.match(r'^(Day \d+|DAY \d+)', line, re.IGNORECASE):
-                line = f"## {line}"
-            
-            # Format section headers (lines ending with colon)
-            elif line.endswith(':') and not any(char.isdigit() for char in line.split(':')[0]):
-                # Check if it's not a time format
-                if not re.match(r'^\d{1,2}:\d{2}', line):
-                    line = f"### {line}"
-            
-            # Format bullet points
-            elif line.startswith(('•', '-', '*', '+')):
-                line = re.sub(r'^[•\-\*\+]\s*', '- ', line)
-            
-            # Format numbered lists
-            elif re.match(r'^\d+[\.\)]\s', line):
-                line = re.sub(r'^(\d+)[\.\)]\s', r'\1. ', line)
-            
-            # Format important notes or tips
-            elif any(keyword in line.lower() for keyword in ['note:', 'tip:', 'important:', 'warning:']):
-                line = f"**{line}**"
-            
-            # Format time ranges and costs
-            elif re.search(r'\d{1,2}:\d{2}|\₹|\$|€|£', line):
-                line = f"*{line}*"
-            
-            processed_lines.append(line)
-        
-        return '\n'.join(processed_lines)
+        blocks = IncrementalTripFormatter(self, days=False)
+        blocks.add_lines(lines)
+        blocks.close()
+        return blocks.html()
     
-    def _post_process_html(self, html_content):
+    def _format_block(self, lines):
         """
-        Post-process HTML content for better styling and structure
+        Render the lines of one block with markdown (TripHtmlExtension adds the classes)
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Add CSS classes to elements
-        for h2 in soup.find_all('h2'):
-            h2['class'] = 'day-header'
-        
-        for h3 in soup.find_all('h3'):
-            h3['class'] = 'section-header'
-        
-        for ul in soup.find_all('ul'):
-            ul['class'] = 'trip-list'
-        
-        for ol in soup.find_all('ol'):
-            ol['class'] = 'numbered-list'
-        
-        for em in soup.find_all('em'):
-            em['class'] = 'time-cost-info'
-        
-        for strong in soup.find_all('strong'):
-            strong['class'] = 'important-note'
-        
-        # Add structure divs
-        content_sections = []
-        current_section = []
-        
-        for element in soup.children:
-            if element.name == 'h2':  # Day header
-                if current_section:
-                    section_div = soup.new_tag('div', **{'class': 'day-section'})
-                    for item in current_section:
-                        section_div.append(item)
-                    content_sections.append(section_div)
-                    current_section = []
-                current_section.append(element)
-            else:
-                current_section.append(element)
-        
-        # Add the last section
-        if current_section:
-            section_div = soup.new_tag('div', **{'class': 'day-section'})
-            for item in current_section:
-                section_div.append(item)
-            content_sections.append(section_div)
-        
-        # Rebuild the soup with sections
-        soup.clear()
-        for section in content_sections:
-            soup.append(section)
+        if not lines:
+            return ""
         
-        return str(soup)
+        processor = self.markdown_processor
+        try:
+            return processor.convert(lines_markdown(lines))
+        finally:
+            # Drop the stashed HTML and extension state of this document
+            processor.reset()
     
     def extract_summary(self, content, max_length=200):
         """
@@ -136,48 +225,57 @@ class TripContentFormatter:
         if not content:
             return ""
         
-        # Remove markdown and HTML tags
-        clean_content = re.sub(r'[#*_`]', '', content)
-        clean_content = BeautifulSoup(clean_content, 'html.parser').get_text()
-        
-        # Get first meaningful paragraph
-        paragraphs = [p.strip() for p in clean_content.split('\n') if p.strip() and len(p.strip()) > 50]
-        
-        if paragraphs:
-            summary = paragraphs[0]
-            if len(summary) > max_length:
-                summary = summary[:max_length] + "..."
-            return summary
-        
-        return "Trip plan generated successfully"
+        return as_document(content).summary(max_length)
     
-    def get_day_wise_content(self, content):
+    def get_day_wise_content(self, content, previous=None):
         """
         Split content into day-wise sections
+
+        Days whose title and text match a day in `previous` (an earlier result
+        for the same trip) reuse its formatted HTML instead of being re-formatted.
         """
         if not content:
             return []
         
-        # Split by day headers
-        days = re.split(r'(?=^(?:Day|DAY)\s+\d+)', content, flags=re.MULTILINE)
+        reusable = {(day['title'], day['content']): day.get('formatted_content') for day in previous or []}
         
-        day_contents = []
-        for day in days:
-            day = day.strip()
-            if day:
-                lines = day.split('\n')
-                if lines:
-                    title = lines[0].strip()
-                    content_lines = lines[1:] if len(lines) > 1 else []
-                    content_text = '\n'.join(content_lines).strip()
-                    
-                    day_contents.append({
-                        'title': title,
-                        'content': content_text,
-                        'formatted_content': self.format_for_web(content_text)
-                    })
+        return [self._day_entry(lines, reusable) for lines in as_document(content).day_chunks()]
+    
+    def _day_entry(self, lines, reusable=None):
+        """
+        Title, text and HTML of one day chunk; its first line is the title
+        """
+        title = lines[0].raw.strip()
+        content_lines = trim_blank_lines(lines[1:])
+        content_text = '\n'.join(line.raw for line in content_lines).strip()
         
-        return day_contents
+        formatted_content = (reusable or {}).get((title, content_text))
+        if formatted_content is None:
+            formatted_content = self._format_lines(content_lines)
+        
+        return {
+            'title': title,
+            'content': content_text,
+            'formatted_content': formatted_content
+        }
+    
+    def _format_with_days(self, document):
+        """
+        format_for_web and get_day_wise_content of a document, rendering its blocks once for both
+        """
+        blocks = IncrementalTripFormatter(self)
+        events = blocks.add_lines(document.lines) + blocks.close()
+        day_contents = [
+            {key: day[key] for key in ('title', 'content', 'formatted_content')}
+            for event, day in events if event == 'day'
+        ]
+        
+        # The text before the first day is listed like a day too
+        chunks = document.day_chunks()
+        if chunks and chunks[0][0].kind != 'day':
+            day_contents.insert(0, self._day_entry(chunks[0]))
+        
+        return blocks.html(), day_contents
     
     def format_for_pdf(self, content):
         """
@@ -190,24 +288,127 @@ class TripContentFormatter:
         """
         Extract key highlights from the trip content
         """
-        highlights = []
-        
         if not content:
-            return highlights
-        
-        lines = content.split('\n')
+            return []
         
+        # Top 5 highlights, collected while the document is parsed
+        return list(as_document(content).highlights)
+
+class IncrementalTripFormatter:
+    """
+    Format a plan while it streams in, rendering every block once.
+
+    A block runs from a heading line (a day or section header) to the next
+    one, except inside fenced code. Every block is rendered by markdown on
+    its own as soon as the next heading arrives, so the total work stays
+    linear in the plan size. format_for_web renders whole texts the same
+    way, which makes html() of a closed formatter exactly its output.
+
+    feed() takes text chunks and close() flushes the rest. Both return the
+    events completed so far: ('block', {'html', 'new_section'}) for every
+    rendered block, where new_section means it starts a day-section div,
+    and ('day', ...) with the get_day_wise_content entry of a finished day
+    (unless `days` is off).
+    """
+
+    def __init__(self, formatter, days=True):
+        self.formatter = formatter
+        self.days = days
+        self._partial = []  # pieces of the line still being received
+        self._block = []  # lines of the block in progress
+        self._in_fence = False
+        self._day = None  # header, lines and rendered blocks of the day in progress
+        self._sections = []  # rendered block HTML, grouped by day-section
+        self._days_sent = 0
+
+    def feed(self, text):
+        """Add a chunk of plan text; returns the events of the blocks it completed"""
+        if '\n' not in text:
+            self._partial.append(text)
+            return []
+
+        lines = text.split('\n')
+        self._partial.append(lines[0])
+        lines[0] = ''.join(self._partial)
+        self._partial = [lines.pop()]
+        return self.add_lines(classify_line(raw) for raw in lines)
+
+    def add_lines(self, lines):
+        """Add complete, classified lines; returns the events of the blocks they completed"""
+        events = []
         for line in lines:
-            line = line.strip()
-            
-            # Look for important attractions, activities, or recommendations
-            if any(keyword in line.lower() for keyword in [
-                'must visit', 'recommended', 'famous for', 'highlight', 
-                'don\'t miss', 'popular', 'attraction', 'landmark'
-            ]):
-                clean_line = re.sub(r'^[•\-\*\+]\s*', '', line)
-                clean_line = re.sub(r'[#*_`]', '', clean_line)
-                if len(clean_line) > 20:
-                    highlights.append(clean_line)
-        
-        return highlights[:5]  # Return top 5 highlights
\ No newline at end of file
+            self._add_line(line, events)
+        return events
+
+    def close(self):
+        """End of the plan: the last line, block and day; returns their events"""
+        events = []
+        if self._partial:
+            self._add_line(classify_line(''.join(self._partial)), events)
+            self._partial = []
+        self._finish_block(events)
+        self._finish_day(events)
+        return events
+
+    def html(self):
+        """The blocks rendered so far, in their day-section divs"""
+        sections = [section for section in self._sections if section]
+        return ''.join(
+            '<div class="day-section">' + '\n'.join(section) + ('' if i == len(sections) - 1 else '\n') + '</div>'
+            for i, section in enumerate(sections)
+        )
+
+    def _add_line(self, line, events):
+        # Fenced code is found in the whole text, so a fence is never split
+        if line.text.startswith(('```', '~~~')):
+            self._in_fence = not self._in_fence
+        elif self._block and not self._in_fence and (
+                line.kind == 'day' or (line.kind == 'heading' and is_section_title(line.text))):
+            self._finish_block(events)
+
+        if self.days and line.kind == 'day':
+            self._finish_day(events)
+            self._day = {'header': line, 'lines': [], 'blocks': [], 'aligned': not self._block}
+        elif self._day is not None:
+            self._day['lines'].append(line)
+        self._block.append(line)
+
+    def _finish_block(self, events):
+        lines = self._block
+        self._block = []
+        html = self.formatter._format_block(lines)
+        if self._day is not None:
+            self._day['blocks'].append(html)
+        if not html:
+            return
+
+        new_section = not self._sections or lines[0].kind == 'day'
+        if new_section:
+            self._sections.append([])
+        self._sections[-1].append(html)
+        events.append(('block', {'html': html, 'new_section': new_section}))
+
+    def _finish_day(self, events):
+        """A day ends at the next day header (or the end of the plan), as in get_day_wise_content"""
+        day = self._day
+        if day is None:
+            return
+        self._day = None
+
+        lines = trim_blank_lines(day['lines'])
+        if day['aligned'] and not self._block:
+            # The day's own HTML is its blocks without the header, in a section of their own
+            rest = day['blocks'][0].partition('\n')[2]
+            parts = [html for html in [rest] + day['blocks'][1:] if html]
+            formatted_content = '<div class="day-section">' + '\n'.join(parts) + '</div>' if parts else ''
+        else:
+            # A day header inside fenced code: the blocks don't line up with the day
+            formatted_content = self.formatter._format_lines(lines)
+
+        self._days_sent += 1
+        events.append(('day', {
+            'title': day['header'].raw.strip(),
+            'content': '\n'.join(line.raw for line in lines).strip(),
+            'formatted_content': formatted_content,
+            'day_number': self._days_sent
+        }))
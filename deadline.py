@@ -0,0 +1,55 @@
+import contextvars
+import time
+
+class DeadlineExceededError(Exception):
+    """Raised when a call or request runs out of time"""
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client that asked for the work is gone, so the work is abandoned"""
+
+class Deadline:
+    """
+    End-to-end time budget of one request, plus an optional client liveness check.
+
+    Created when the request arrives and handed down through generation,
+    formatting and the Firestore write. `at` is an absolute time.monotonic()
+    value, so it can be passed straight to the Groq client; `is_alive` is
+    polled while Groq calls run and between stages, and abandons the work
+    once the client is gone.
+    """
+
+    def __init__(self, seconds, is_alive=None):
+        self.at = time.monotonic() + seconds
+        self.is_alive = is_alive
+
+    def remaining(self):
+        """Seconds left (never negative)"""
+        return max(self.at - time.monotonic(), 0.0)
+
+    def alive(self):
+        """Whether the client is still waiting for the result"""
+        if self.is_alive is None:
+            return True
+        try:
+            return bool(self.is_alive())
+        except Exception as e:
+            # A broken liveness check must not abort generation
+            print(f"❌ Liveness check failed: {e}")
+            return True
+
+    def check(self, stage):
+        """Raise if the budget is spent or the client left before `stage`"""
+        if time.monotonic() >= self.at:
+            raise DeadlineExceededError(f"Request deadline exceeded before {stage}")
+        if not self.alive():
+            raise ClientDisconnectedError(f"Client disconnected before {stage}")
+
+    def also_alive_while(self, keep_alive):
+        """Same deadline, but the work also stays alive while keep_alive() is true"""
+        deadline = Deadline(0, lambda: self.alive() or keep_alive())
+        deadline.at = self.at
+        return deadline
+
+# Deadline of the generation running in the current asyncio task; concurrent
+# section and chunk tasks inherit it, so every Groq call they make is bounded
+current_deadline = contextvars.ContextVar('current_deadline', default=None)
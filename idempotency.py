@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import Config
+
+def get_idempotency_key(req, data=None):
+    """Idempotency key of a request: the Idempotency-Key header or an idempotency_key form/JSON field"""
+    key = req.headers.get('Idempotency-Key') or (data or {}).get('idempotency_key')
+    key = str(key or '').strip()
+    return key or None
+
+class IdempotencyStore:
+    """
+    Short-lived record of idempotency key -> in-progress or completed result.
+
+    The first request with a key claims it; repeats of the same request
+    (double clicks, mobile network retries) wait for it and get its result
+    instead of generating and saving the trip again. Records live in SQLite
+    so repeats are caught whichever worker they land on. A request that
+    fails releases its key so a retry can run, and a claim whose worker died
+    expires after `lease_seconds`.
+    """
+
+    def __init__(self, db_path, ttl=3600, lease_seconds=300, poll_interval=0.5):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._claim_count = 0
+        self._lock = threading.Lock()
+        self._stats = {'claimed': 0, 'replayed': 0, 'in_progress': 0, 'mismatched': 0}
+        self._init_db()
+
+    def _connect(self):
+        """Open a connection in autocommit mode (transactions are explicit)"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        """Create the keys table if needed"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    scope_key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+        finally:
+            conn.close()
+
+    def claim(self, user_id, key, request_data, wait=0):
+        """
+        Claim a key for a request, or get the record of the request that already claimed it.
+
+        Returns None when the caller now owns the key and must do the work,
+        otherwise {'status': 'completed', 'result': ...}, {'status':
+        'in_progress'} if the first request is still running after `wait`
+        seconds, or {'status': 'mismatch'} if the key was used for a
+        different request.
+        """
+        scope_key = self._scope_key(user_id, key)
+        fingerprint = hashlib.sha256(repr(request_data).encode('utf-8')).hexdigest()
+        give_up_at = time.monotonic() + wait
+
+        while True:
+            record = self._claim_once(scope_key, fingerprint)
+            if record is None:
+                self._count('claimed')
+                return None
+            if record['status'] == 'mismatch':
+                self._count('mismatched')
+                return record
+            if record['status'] == 'completed':
+                self._count('replayed')
+                return record
+            if time.monotonic() + self.poll_interval > give_up_at:
+                self._count('in_progress')
+                return record
+            time.sleep(self.poll_interval)
+
+    def _claim_once(self, scope_key, fingerprint):
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT * FROM idempotency_keys WHERE scope_key = ?', (scope_key,)).fetchone()
+            if row is not None and row['expires_at'] > now:
+                conn.execute('COMMIT')
+                if row['fingerprint'] != fingerprint:
+                    return {'status': 'mismatch'}
+                return {'status': row['status'], 'result': json.loads(row['result']) if row['result'] else None}
+
+            conn.execute(
+                'INSERT OR REPLACE INTO idempotency_keys (scope_key, fingerprint, status, created_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (scope_key, fingerprint, 'in_progress', now, now + self.lease_seconds)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        self._prune_expired()
+        return None
+
+    def complete(self, user_id, key, result):
+        """Record the result of a claimed key; repeats get it until the TTL runs out"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE idempotency_keys SET status = 'completed', result = ?, expires_at = ? WHERE scope_key = ?",
+                (json.dumps(result, default=str), time.time() + self.ttl, self._scope_key(user_id, key))
+            )
+        finally:
+            conn.close()
+
+    def release(self, user_id, key):
+        """Give up a claimed key without a result, so a retry runs the request again"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "DELETE FROM idempotency_keys WHERE scope_key = ? AND status = 'in_progress'",
+                (self._scope_key(user_id, key),)
+            )
+        finally:
+            conn.close()
+
+    def _scope_key(self, user_id, key):
+        """Keys are per user; they are hashed so arbitrary client strings stay short"""
+        return f"{user_id}:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+    def _prune_expired(self):
+        """Every so often drop records past their expiry"""
+        with self._lock:
+            self._claim_count += 1
+            if self._claim_count % 100:
+                return
+
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (time.time(),))
+        finally:
+            conn.close()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """Get claim and replay counters for this worker"""
+        with self._lock:
+            return dict(self._stats)
+
+# Global idempotency store for trip generation submits
+idempotency_store = IdempotencyStore(
+    Config.IDEMPOTENCY_PATH,
+    ttl=Config.IDEMPOTENCY_TTL,
+    lease_seconds=Config.IDEMPOTENCY_LEASE_SECONDS
+)
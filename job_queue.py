@@ -0,0 +1,285 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from config import Config
+from deadline import ClientDisconnectedError
+
+class JobQueue:
+    """
+    Durable SQLite-backed queue for background trip generation.
+
+    Jobs survive process restarts: a claimed job holds a lease, and jobs whose
+    lease expired while 'running' (worker crashed or was killed) are put back
+    in the queue until they run out of attempts. Status polls are recorded,
+    so a handler can tell when the client waiting on a job has gone away.
+    """
+
+    def __init__(self, db_path, max_workers=2, max_running=4, lease_seconds=300,
+                 max_attempts=3, poll_interval=1.0):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.max_running = max_running
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._handler = None
+        self._workers = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._init_db()
+
+    def _connect(self):
+        """Open a connection in autocommit mode (transactions are explicit)"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        """Create the jobs table if needed"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    lease_expires_at REAL,
+                    last_seen_at REAL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)')
+
+            # Queues created before client liveness tracking lack the column
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(jobs)')]
+            if 'last_seen_at' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN last_seen_at REAL')
+        finally:
+            conn.close()
+
+    def enqueue(self, user_id, payload):
+        """Add a job to the queue and return its id"""
+        job_id = str(uuid.uuid4())
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO jobs (job_id, user_id, status, payload, created_at, updated_at, last_seen_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, user_id, 'queued', json.dumps(payload), now, now, now)
+            )
+        finally:
+            conn.close()
+
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Get a job by ID"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+
+        return self._row_to_job(row) if row else None
+
+    def touch(self, job_id):
+        """Record that the client polled the job"""
+        conn = self._connect()
+        try:
+            conn.execute('UPDATE jobs SET last_seen_at = ? WHERE job_id = ?', (time.time(), job_id))
+        finally:
+            conn.close()
+
+    def client_alive(self, job_id, timeout):
+        """Whether the job was enqueued or polled within the last `timeout` seconds"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT last_seen_at, created_at FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+
+        return bool(row) and time.time() - (row['last_seen_at'] or row['created_at']) < timeout
+
+    def complete(self, job_id, result):
+        """Mark a job as completed with its result"""
+        self._finish(job_id, 'completed', result=json.dumps(result, default=str))
+
+    def fail(self, job_id, error):
+        """Mark a job as failed"""
+        self._finish(job_id, 'failed', error=str(error))
+
+    def cancel(self, job_id, reason):
+        """Mark a job as cancelled (its client went away)"""
+        self._finish(job_id, 'cancelled', error=str(reason))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, lease_expires_at = NULL '
+                'WHERE job_id = ?',
+                (status, result, error, time.time(), job_id)
+            )
+        finally:
+            conn.close()
+
+    def claim(self):
+        """Atomically claim the oldest queued job, respecting the global running limit"""
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            running = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'running' AND lease_expires_at > ?", (now,)
+            ).fetchone()[0]
+            if running >= self.max_running:
+                conn.execute('COMMIT')
+                return None
+
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if not row:
+                conn.execute('COMMIT')
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?, "
+                "lease_expires_at = ? WHERE job_id = ?",
+                (now, now + self.lease_seconds, row['job_id'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        job = self._row_to_job(row)
+        job['status'] = 'running'
+        job['attempts'] += 1
+        return job
+
+    def recover_stale_jobs(self):
+        """Requeue running jobs whose lease expired; fail those out of attempts"""
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            failed = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Generation was interrupted too many times', "
+                "updated_at = ?, lease_expires_at = NULL "
+                "WHERE status = 'running' AND lease_expires_at <= ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ?, lease_expires_at = NULL "
+                "WHERE status = 'running' AND lease_expires_at <= ?",
+                (now, now)
+            ).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        if requeued:
+            self._wakeup.set()
+        return {'requeued': requeued, 'failed': failed}
+
+    def start(self, handler):
+        """Start the worker pool (once per process) with the given job handler"""
+        with self._lock:
+            if self._workers:
+                return
+
+            self._handler = handler
+            self.recover_stale_jobs()
+
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f'generation-worker-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _worker_loop(self):
+        """Claim and run jobs until the process exits"""
+        last_recovery = time.time()
+
+        while True:
+            # Pick up jobs abandoned by crashed workers in any process
+            if time.time() - last_recovery > self.lease_seconds:
+                try:
+                    self.recover_stale_jobs()
+                except Exception as e:
+                    print(f"❌ Job recovery failed: {e}")
+                last_recovery = time.time()
+
+            try:
+                job = self.claim()
+            except Exception as e:
+                print(f"❌ Error claiming job: {e}")
+                job = None
+
+            if not job:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            try:
+                result = self._handler(job)
+                self.complete(job['job_id'], result)
+            except ClientDisconnectedError as e:
+                print(f"📋 Job {job['job_id']} abandoned: {e}")
+                self.cancel(job['job_id'], e)
+            except Exception as e:
+                print(f"❌ Job {job['job_id']} failed: {e}")
+                self.fail(job['job_id'], e)
+
+    def stats(self):
+        """Get job counts by status"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) AS count FROM jobs GROUP BY status').fetchall()
+        finally:
+            conn.close()
+
+        stats = {'queued': 0, 'running': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
+        stats.update({row['status']: row['count'] for row in rows})
+        stats['workers'] = len(self._workers)
+        return stats
+
+    def _row_to_job(self, row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+# Global job queue instance
+job_queue = JobQueue(
+    Config.JOB_QUEUE_PATH,
+    max_workers=Config.GENERATION_WORKERS,
+    max_running=Config.GENERATION_MAX_RUNNING,
+    lease_seconds=Config.JOB_LEASE_SECONDS,
+    max_attempts=Config.JOB_MAX_ATTEMPTS
+)
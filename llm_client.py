@@ -0,0 +1,463 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import groq
+import httpx
+from dotenv import load_dotenv
+from config import Config
+from deadline import DeadlineExceededError, current_deadline
+
+# Load environment variables
+load_dotenv()
+
+# HTTP/2 needs the optional h2 package; without it the pool uses HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class CircuitOpenError(Exception):
+    """Raised without calling Groq while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Trip generation is temporarily unavailable, please try again in {int(retry_after) + 1} seconds")
+        self.retry_after = retry_after
+
+def is_retryable(error):
+    """Whether an error is transient (connection problems, timeouts, rate limits, 5xx)"""
+    if isinstance(error, (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)):
+        return True
+    if isinstance(error, groq.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+def retry_after_seconds(error):
+    """Retry-After (seconds) sent with a rate limit or overload response, or None"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """
+    Stop calling an unhealthy upstream for a while.
+
+    After `failure_threshold` consecutive transient failures the circuit
+    opens and calls fail fast for `reset_timeout` seconds. Then a single
+    probe call is let through: success closes the circuit, failure opens it
+    again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.times_opened = 0
+
+    def allow(self):
+        """Whether a call may go upstream now"""
+        with self._lock:
+            if self._state == 'closed':
+                return True
+            if self._state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = 'half_open'
+                self._probe_in_flight = False
+            if self._state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Hand back a half-open probe that was cancelled before it got an answer"""
+        with self._lock:
+            if self._state == 'half_open':
+                self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = 'closed'
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                if self._state != 'open':
+                    self.times_opened += 1
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def retry_after(self):
+        """Seconds until the next probe is allowed"""
+        with self._lock:
+            if self._state != 'open':
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+class ResilientGroqClient:
+    """
+    Wrapper around the sync and async Groq clients for chat completions.
+
+    Transient errors are retried with jittered exponential backoff inside a
+    per-call deadline, a circuit breaker fails calls fast while Groq keeps
+    failing, and (optionally) a duplicate request is sent when the first one
+    is slower than the recent p95 latency, using whichever answers first.
+    The sync and async paths share the breaker, latencies and counters.
+    """
+
+    def __init__(self, client, async_client=None, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 timeout=60.0, breaker=None, hedge=False, hedge_percentile=95, hedge_min_samples=20,
+                 latency_window=200):
+        self.client = client
+        self.async_client = async_client
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency_window = latency_window
+        self._latencies = {}
+        self._lock = threading.Lock()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='groq-hedge') if hedge else None
+        self._stats = {
+            'calls': 0,
+            'attempts': 0,
+            'retries': 0,
+            'failures': 0,
+            'deadline_exceeded': 0,
+            'circuit_rejections': 0,
+            'hedges_sent': 0,
+            'hedges_won': 0,
+            'in_flight': 0,
+            'peak_in_flight': 0
+        }
+
+    def create(self, deadline=None, **kwargs):
+        """
+        Create a chat completion (same arguments as chat.completions.create).
+
+        `deadline` is an absolute time.monotonic() value; by default the call
+        gets `timeout` seconds in total, retries included.
+        """
+        hedge = self.hedge and not kwargs.get('stream')
+        return self._call(lambda timeout: self._attempt(kwargs, timeout, hedge), deadline)
+
+    def stream(self, deadline=None, **kwargs):
+        """Open a streaming chat completion; only opening the stream is retried"""
+        kwargs['stream'] = True
+        return self._call(lambda timeout: self.client.chat.completions.create(timeout=timeout, **kwargs), deadline)
+
+    async def create_async(self, deadline=None, **kwargs):
+        """Async version of create(), for many completions in flight on one event loop"""
+        deadline = self._start_call(deadline)
+
+        for attempt in range(self.max_retries + 1):
+            remaining = self._before_attempt(deadline)
+            try:
+                response = await self._attempt_async(kwargs, remaining)
+            except Exception as e:
+                await asyncio.sleep(self._after_failure(e, attempt, deadline))
+                continue
+            except BaseException:
+                # Cancelled (deadline, client gone): the probe, if this was one, tells us nothing
+                self.breaker.release_probe()
+                raise
+
+            self.breaker.record_success()
+            return response
+
+    def _call(self, attempt_fn, deadline=None):
+        """Run attempt_fn(timeout) with retries, backoff, circuit breaking and a deadline"""
+        deadline = self._start_call(deadline)
+
+        for attempt in range(self.max_retries + 1):
+            remaining = self._before_attempt(deadline)
+            try:
+                response = attempt_fn(remaining)
+            except Exception as e:
+                time.sleep(self._after_failure(e, attempt, deadline))
+                continue
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+
+            self.breaker.record_success()
+            return response
+
+    def _start_call(self, deadline):
+        self._count('calls')
+        return deadline if deadline is not None else time.monotonic() + self.timeout
+
+    def _before_attempt(self, deadline):
+        """Check the deadline and the circuit breaker; return the time left for the attempt"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._count('deadline_exceeded')
+            raise DeadlineExceededError('Timed out waiting for the trip plan')
+
+        if not self.breaker.allow():
+            self._count('circuit_rejections')
+            raise CircuitOpenError(self.breaker.retry_after())
+
+        self._count('attempts')
+        return remaining
+
+    def _after_failure(self, error, attempt, deadline):
+        """Return how long to back off before retrying, or re-raise when the error is final"""
+        if not is_retryable(error):
+            # The request itself was bad; Groq is healthy
+            self.breaker.record_success()
+            self._count('failures')
+            raise error
+
+        self.breaker.record_failure()
+        delay = self._backoff(attempt, error)
+        if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+            self._count('failures')
+            if isinstance(error, groq.APITimeoutError) and time.monotonic() >= deadline:
+                self._count('deadline_exceeded')
+                raise DeadlineExceededError('Timed out waiting for the trip plan') from error
+            raise error
+
+        print(f"❌ Groq call failed ({error.__class__.__name__}), retrying in {delay:.1f}s")
+        self._count('retries')
+        return delay
+
+    def _backoff(self, attempt, error):
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _attempt(self, kwargs, timeout, hedge):
+        """One upstream attempt, hedged with a duplicate request when the first one is slow"""
+        model = kwargs.get('model')
+        hedge_after = self.latency_percentile(model, self.hedge_percentile) if hedge else None
+        if hedge_after is None or hedge_after >= timeout:
+            return self._timed_request(kwargs, timeout)
+
+        started = time.monotonic()
+        primary = self._hedge_executor.submit(self._timed_request, kwargs, timeout)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        self._count('hedges_sent')
+        remaining = max(timeout - (time.monotonic() - started), 0.1)
+        backup = self._hedge_executor.submit(self._timed_request, kwargs, remaining)
+
+        # Use the first successful answer; the slower request finishes in the background
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count('hedges_won')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _attempt_async(self, kwargs, timeout):
+        """Async attempt; a hedged duplicate is cancelled as soon as either request answers"""
+        model = kwargs.get('model')
+        hedge_after = self.latency_percentile(model, self.hedge_percentile) if self.hedge else None
+        if hedge_after is None or hedge_after >= timeout:
+            return await self._timed_request_async(kwargs, timeout)
+
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self._timed_request_async(kwargs, timeout))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        self._count('hedges_sent')
+        remaining = max(timeout - (time.monotonic() - started), 0.1)
+        backup = asyncio.ensure_future(self._timed_request_async(kwargs, remaining))
+
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._count('hedges_won')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _timed_request(self, kwargs, timeout):
+        started = time.monotonic()
+        self._enter_request()
+        try:
+            response = self.client.chat.completions.create(timeout=timeout, **kwargs)
+        finally:
+            self._count('in_flight', -1)
+        self._record_latency(kwargs.get('model'), time.monotonic() - started)
+        return response
+
+    async def _timed_request_async(self, kwargs, timeout):
+        started = time.monotonic()
+        self._enter_request()
+        try:
+            response = await self.async_client.chat.completions.create(timeout=timeout, **kwargs)
+        finally:
+            self._count('in_flight', -1)
+        self._record_latency(kwargs.get('model'), time.monotonic() - started)
+        return response
+
+    def _record_latency(self, model, latency):
+        with self._lock:
+            latencies = self._latencies.setdefault(model, deque(maxlen=self.latency_window))
+            latencies.append(latency)
+
+    def latency_percentile(self, model, percentile):
+        """Recent latency at the given percentile for a model, or None until there are enough samples"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(model, ()))
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        return latencies[min(int(len(latencies) * percentile / 100), len(latencies) - 1)]
+
+    def _enter_request(self):
+        with self._lock:
+            self._stats['in_flight'] += 1
+            self._stats['peak_in_flight'] = max(self._stats['peak_in_flight'], self._stats['in_flight'])
+
+    def _count(self, name, count=1):
+        with self._lock:
+            self._stats[name] += count
+
+    def stats(self):
+        """Get call, retry, hedge and circuit breaker counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['circuit_state'] = self.breaker.state
+        stats['circuit_opened'] = self.breaker.times_opened
+        stats['http2'] = Config.GROQ_HTTP2 and HTTP2_AVAILABLE
+        return stats
+
+async def _with_deadline(coro, deadline):
+    """Make the deadline current for the task (and the tasks it starts) while coro runs"""
+    current_deadline.set(deadline)
+    return await coro
+
+class EventLoopThread:
+    """
+    A private asyncio event loop running in a daemon thread.
+
+    Sync code (Flask views, job workers) hands coroutines to it with run(),
+    so the completions of every request in the worker are multiplexed over
+    the one async connection pool instead of each holding a thread.
+    """
+
+    def __init__(self, name='groq-event-loop'):
+        self.name = name
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def run(self, coro, timeout=None, deadline=None):
+        """
+        Run a coroutine on the loop and block until it finishes.
+
+        With a Deadline, the coroutine's Groq calls are bounded by it and the
+        task is cancelled, aborting its requests, as soon as the deadline
+        passes or the client goes away.
+        """
+        if deadline is None:
+            return self.submit(coro).result(timeout)
+
+        future = self.submit(_with_deadline(coro, deadline))
+        try:
+            while not future.done():
+                wait([future], timeout=min(deadline.remaining(), Config.LIVENESS_CHECK_INTERVAL))
+                if not future.done():
+                    deadline.check('generation finished')
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop; cancelling the returned future cancels the task"""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+
+    def _get_loop(self):
+        # Started lazily so each forked gunicorn worker gets its own loop thread
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                thread.start()
+            return self._loop
+
+def http_limits():
+    """Connection pool limits shared by the sync and async clients"""
+    return httpx.Limits(
+        max_connections=Config.GROQ_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.GROQ_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=Config.GROQ_KEEPALIVE_EXPIRY
+    )
+
+def http_timeout():
+    """Explicit connect/read timeouts (the per-call deadline can only shorten them)"""
+    return httpx.Timeout(Config.GROQ_READ_TIMEOUT, connect=Config.GROQ_CONNECT_TIMEOUT)
+
+# Persistent connection pools, reused by every Groq call in the process
+http2 = Config.GROQ_HTTP2 and HTTP2_AVAILABLE
+http_client = httpx.Client(limits=http_limits(), timeout=http_timeout(), http2=http2)
+async_http_client = httpx.AsyncClient(limits=http_limits(), timeout=http_timeout(), http2=http2)
+
+# Shared Groq client used by every generation path. Retries are handled by the
+# wrapper, so the SDK's own retries are turned off; GROQ_BASE_URL can point the
+# client at a local stub server.
+llm_client = ResilientGroqClient(
+    groq.Groq(api_key=os.getenv('GROQ_API_KEY'), base_url=Config.GROQ_BASE_URL, max_retries=0,
+              http_client=http_client),
+    async_client=groq.AsyncGroq(api_key=os.getenv('GROQ_API_KEY'), base_url=Config.GROQ_BASE_URL,
+                                max_retries=0, http_client=async_http_client),
+    max_retries=Config.LLM_MAX_RETRIES,
+    backoff_base=Config.LLM_BACKOFF_BASE,
+    backoff_max=Config.LLM_BACKOFF_MAX,
+    timeout=Config.LLM_TIMEOUT,
+    breaker=CircuitBreaker(Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS),
+    hedge=Config.HEDGE_REQUESTS,
+    hedge_percentile=Config.HEDGE_PERCENTILE
+)
+
+# Event loop the async generation path runs on
+llm_loop = EventLoopThread()
+
+def run_async(coro, deadline=None):
+    """Run a coroutine on the shared Groq event loop from sync code"""
+    return llm_loop.run(coro, deadline=deadline)
@@ -1,21 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, send_file
-from datetime import datetime, timedelta
+from datetime import datetime
 from models import trip_model, user_model
 from auth import login_required, get_current_user
 from pdf_generator import generate_trip_pdf
-from prompt import get_trip_plan_prompt
 from content_formatter import TripContentFormatter  # Add this import
-import uuid
-import tempfile
-import os
-import groq
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Initialize Groq client
-groq_client = groq.Groq(api_key=os.getenv('GROQ_API_KEY'))
+from utils import FEATURED_DESTINATIONS
 
 # Create Blueprint
 main_bp = Blueprint('main', __name__)
@@ -83,36 +72,13 @@ def calculate_min_budget(start_location, destination, num_days):
     min_budget = daily_min * num_days + transport_cost
     return min_budget
 
-def get_trip_plan(start_location, destination, num_days, start_date, end_date, budget=None):
-    """Generate a trip plan using Llama model through Groq API"""
-    prompt = get_trip_plan_prompt(start_location, destination, num_days, start_date, end_date, budget)
-    
-    try:
-        chat_completion = groq_client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.3-70b-versatile",
-            temperature=0.7,
-            max_tokens=4000
-        )
-        return chat_completion.choices[0].message.content
-    except Exception as e:
-        return f"Error generating trip plan: {str(e)}"
-
 @main_bp.route('/')
 def index():
     """Home page"""
     # Get user data if logged in
     user = get_current_user() if 'user_id' in session else None
     
-    # Get some sample destinations or featured trips
-    featured_destinations = [
-        {'name': 'Goa', 'image': 'goa.jpg', 'description': 'Beautiful beaches and nightlife'},
-        {'name': 'Kerala', 'image': 'kerala.jpg', 'description': 'God\'s own country'},
-        {'name': 'Rajasthan', 'image': 'rajasthan.jpg', 'description': 'Royal heritage and culture'},
-        {'name': 'Himachal Pradesh', 'image': 'himachal.jpg', 'description': 'Mountains and adventure'}
-    ]
-    
-    return render_template('index.html', user=user, featured_destinations=featured_destinations)
+    return render_template('index.html', user=user, featured_destinations=FEATURED_DESTINATIONS)
 
 @main_bp.route('/dashboard')
 @login_required
@@ -169,155 +135,6 @@ def trip_planner():
     """Trip planning form"""
     return render_template('trip_planner.html')
 
-@main_bp.route('/generate-trip', methods=['POST'])
-@login_required
-def generate_trip():
-    """Generate trip plan"""
-    try:
-        # Handle both JSON and form data
-        if request.is_json:
-            data = request.json
-        else:
-            data = request.form.to_dict()
-        
-        # Validate input data
-        required_fields = ['start_location', 'destination', 'start_date', 'end_date']
-        for field in required_fields:
-            if not data.get(field):
-                if request.is_json:
-                    return jsonify({'error': f'{field} is required'}), 400
-                else:
-                    flash(f'{field} is required', 'error')
-                    return redirect(url_for('main.trip_planner'))
-        
-        start_location = data.get('start_location').strip()
-        destination = data.get('destination').strip()
-        start_date = datetime.strptime(data.get('start_date'), '%Y-%m-%d').date()
-        end_date = datetime.strptime(data.get('end_date'), '%Y-%m-%d').date()
-        budget_amount = float(data.get('budget_amount', 0))
-        currency = data.get('currency', 'INR')
-        
-        # Validate dates
-        if end_date <= start_date:
-            error_msg = 'End date must be after start date'
-            if request.is_json:
-                return jsonify({'error': error_msg}), 400
-            else:
-                flash(error_msg, 'error')
-                return redirect(url_for('main.trip_planner'))
-        
-        if start_date < datetime.now().date():
-            error_msg = 'Start date cannot be in the past'
-            if request.is_json:
-                return jsonify({'error': error_msg}), 400
-            else:
-                flash(error_msg, 'error')
-                return redirect(url_for('main.trip_planner'))
-        
-        num_days = (end_date - start_date).days + 1
-        
-        # Validate trip duration
-        if num_days > 30:
-            error_msg = 'Trip duration cannot exceed 30 days'
-            if request.is_json:
-                return jsonify({'error': error_msg}), 400
-            else:
-                flash(error_msg, 'error')
-                return redirect(url_for('main.trip_planner'))
-        
-        # Currency symbols
-        currency_symbols = {
-            "USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥",
-            "AUD": "A$", "CAD": "C$", "INR": "₹", "CNY": "¥"
-        }
-        
-        budget = {
-            "amount": budget_amount,
-            "currency": currency,
-            "symbol": currency_symbols.get(currency, "$")
-        }
-        
-        # Generate trip plan using AI
-        trip_plan = get_trip_plan(start_location, destination, num_days, start_date, end_date, budget)
-        
-        if trip_plan.startswith("Error"):
-            if request.is_json:
-                return jsonify({'error': trip_plan}), 500
-            else:
-                flash(trip_plan, 'error')
-                return redirect(url_for('main.trip_planner'))
-        
-        # Format the trip content
-        formatted_trip_plan = content_formatter.format_for_web(trip_plan)
-        trip_summary = content_formatter.extract_summary(trip_plan)
-        day_wise_content = content_formatter.get_day_wise_content(trip_plan)
-        highlights = content_formatter.get_highlights(trip_plan)
-        
-        # Create trip in database
-        title = f"{start_location} to {destination}"
-        trip_data = {
-            'trip_id': str(uuid.uuid4()),
-            'user_id': session['user_id'],
-            'title': title,
-            'start_location': start_location,
-            'destination': destination,
-            'start_date': start_date.isoformat(),
-            'end_date': end_date.isoformat(),
-            'duration': num_days,
-            'budget': budget,
-            'trip_plan': trip_plan,
-            'formatted_trip_plan': formatted_trip_plan,
-            'summary': trip_summary,
-            'highlights': highlights,
-            'created_at': datetime.now(),
-            'status': 'completed'
-        }
-        
-        # Save to database using trip_model
-        saved_trip = trip_model.create_trip(
-            user_id=session['user_id'],
-            title=title,
-            start_location=start_location,
-            destination=destination,
-            start_date=start_date,
-            end_date=end_date,
-            budget=budget,
-            trip_plan=trip_plan
-        )
-        
-        # Update the trip_data with the saved trip ID
-        trip_data['trip_id'] = saved_trip['trip_id']
-        
-        if request.is_json:
-            return jsonify({
-                'success': True,
-                'trip_id': trip_data['trip_id'],
-                'trip_plan': trip_plan
-            })
-        else:
-            # Return HTML template like in app.py
-            return render_template('trip_result.html',
-                                 trip_id=trip_data['trip_id'],
-                                 trip=trip_data,
-                                 formatted_content=formatted_trip_plan,
-                                 day_wise_content=day_wise_content,
-                                 highlights=highlights)
-        
-    except ValueError as e:
-        error_msg = 'Invalid date format'
-        if request.is_json:
-            return jsonify({'error': error_msg}), 400
-        else:
-            flash(error_msg, 'error')
-            return redirect(url_for('main.trip_planner'))
-    except Exception as e:
-        error_msg = f'Error generating trip plan: {str(e)}'
-        if request.is_json:
-            return jsonify({'error': error_msg}), 500
-        else:
-            flash(error_msg, 'error')
-            return redirect(url_for('main.trip_planner'))
-
 @main_bp.route('/trip/<trip_id>')
 @login_required
 def view_trip(trip_id):
@@ -340,6 +157,17 @@ def view_trip(trip_id):
         if trip.get('end_date'):
             trip['end_date_obj'] = datetime.fromisoformat(trip['end_date']).date()
         
+        # Display fields are stored with the trip; only trips saved before that
+        # (or by an older formatter version) are rendered, once
+        rendered = content_formatter.stored_render(trip)
+        if rendered is None:
+            rendered = content_formatter.render_trip(trip.get('trip_plan', ''), trip.get('structured_plan'))
+            try:
+                trip_model.save_rendered(trip_id, rendered)
+            except Exception as e:
+                print(f"❌ {e}")
+        trip.update(rendered)
+        
         return render_template('trip_result.html', trip=trip)
         
     except Exception as e:
@@ -439,7 +267,8 @@ def download_pdf(trip_id):
             trip['start_location'],
             trip['destination'],
             start_date,
-            end_date
+            end_date,
+            structured_plan=trip.get('structured_plan')
         )
         
         filename = f"trip_plan_{trip['start_location']}_to_{trip['destination']}_{start_date}.pdf"
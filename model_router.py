@@ -0,0 +1,184 @@
+import json
+import threading
+from collections import deque
+from config import Config
+from prompt import TRIP_PLAN_SECTIONS
+
+SECTION_KEYS = [section['key'] for section in TRIP_PLAN_SECTIONS]
+
+def default_routes():
+    """Routes used when MODEL_ROUTES is not set: a fast tier for small requests, the big model for the rest"""
+    return [
+        {
+            'name': 'fast',
+            'model': Config.FAST_MODEL,
+            'max_estimate': Config.FAST_ROUTE_MAX_ESTIMATE,
+            'max_tokens': 8000
+        },
+        {
+            'name': 'large',
+            'model': Config.LARGE_MODEL,
+            'max_estimate': None,
+            'max_tokens': 16000
+        }
+    ]
+
+def load_routes(routes_json=None):
+    """
+    Load routing rules from JSON, falling back to the defaults.
+
+    Routes are checked in order; the first one whose max_estimate is at least
+    the estimated output size (or has no max_estimate) handles the request.
+    """
+    if not routes_json:
+        return default_routes()
+
+    try:
+        routes = json.loads(routes_json)
+        for route in routes:
+            route.setdefault('max_estimate', None)
+            route.setdefault('max_tokens', 8000)
+            if not route.get('name') or not route.get('model'):
+                raise ValueError('every route needs a name and a model')
+        if not routes:
+            raise ValueError('no routes defined')
+        return routes
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"❌ Invalid MODEL_ROUTES, using default routes: {e}")
+        return default_routes()
+
+class ModelRouter:
+    """
+    Pick the model and max_tokens for a completion from its expected output size.
+
+    The estimate comes from the per-section sizes in TRIP_PLAN_SECTIONS (the
+    itinerary scales with the number of days), so a weekend trip gets a small
+    token budget on the fast model while a month-long plan gets the big model
+    with room to finish. Latency and token usage are tracked per route.
+    """
+
+    def __init__(self, routes, headroom=1.3, min_tokens=600, latency_window=200):
+        self.routes = routes
+        self.headroom = headroom
+        self.min_tokens = min_tokens
+        self.latency_window = latency_window
+        self._lock = threading.Lock()
+        self._metrics = {route['name']: self._empty_metrics() for route in routes}
+        self._latencies = {route['name']: deque(maxlen=latency_window) for route in routes}
+
+    def estimate_tokens(self, num_days, sections=None):
+        """Estimate the output tokens for the given sections of a num_days trip"""
+        keys = set(sections) if sections is not None else set(SECTION_KEYS)
+        estimate = 0
+        for section in TRIP_PLAN_SECTIONS:
+            if section['key'] not in keys:
+                continue
+            if section['key'] == 'itinerary':
+                estimate += section['estimated_tokens'] * max(num_days, 1)
+            else:
+                estimate += section['estimated_tokens']
+        return estimate
+
+    def estimate_completions(self, num_days, sections=None, stream=False):
+        """
+        Estimate the Groq completions generating a num_days trip makes with the configured engine.
+
+        Streams and scoped edits (`sections` given) are one completion; the
+        sectioned engine makes one per section, and long trips swap the
+        itinerary call for an outline plus one call per day range. Cached
+        destination sections and continuations are not counted.
+        """
+        if stream or sections is not None:
+            return 1
+        long_trip = num_days > Config.LONG_TRIP_DAYS
+        if not long_trip and Config.GENERATION_MODE != 'sections':
+            return 1
+
+        completions = len(SECTION_KEYS)
+        if long_trip:
+            completions += -(-num_days // Config.ITINERARY_CHUNK_DAYS)
+        return completions
+
+    def route_plan(self, num_days, sections=None):
+        """Route a completion producing the given sections (all sections by default)"""
+        return self.route(self.estimate_tokens(num_days, sections))
+
+    def route(self, estimated_tokens):
+        """Return {'name', 'model', 'max_tokens', 'estimated_tokens'} for an estimated output size"""
+        route = self.routes[-1]
+        for candidate in self.routes:
+            if candidate['max_estimate'] is None or estimated_tokens <= candidate['max_estimate']:
+                route = candidate
+                break
+
+        max_tokens = max(int(estimated_tokens * self.headroom), self.min_tokens)
+        return {
+            'name': route['name'],
+            'model': route['model'],
+            'max_tokens': min(max_tokens, route['max_tokens']),
+            'estimated_tokens': estimated_tokens
+        }
+
+    def record(self, route, latency, completion_tokens=0, prompt_tokens=0, finish_reason=None, error=False):
+        """Record the outcome of one completion made on a route"""
+        with self._lock:
+            metrics = self._metrics.setdefault(route['name'], self._empty_metrics())
+            latencies = self._latencies.setdefault(route['name'], deque(maxlen=self.latency_window))
+
+            metrics['requests'] += 1
+            if error:
+                metrics['errors'] += 1
+                return
+
+            latencies.append(latency)
+            metrics['total_latency'] += latency
+            metrics['completion_tokens'] += completion_tokens or 0
+            metrics['prompt_tokens'] += prompt_tokens or 0
+            metrics['estimated_tokens'] += route.get('estimated_tokens', 0)
+            if finish_reason == 'length':
+                metrics['truncated'] += 1
+
+    def latency_percentile(self, route_name, percentile):
+        """Latency (seconds) at the given percentile for recent calls on a route, or None"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(route_name, ()))
+        if not latencies:
+            return None
+        index = min(int(len(latencies) * percentile / 100), len(latencies) - 1)
+        return latencies[index]
+
+    def stats(self):
+        """Get per-route request, latency and token metrics"""
+        stats = {}
+        for name in list(self._metrics):
+            with self._lock:
+                metrics = dict(self._metrics[name])
+            completed = metrics['requests'] - metrics['errors']
+            metrics['avg_latency'] = round(metrics['total_latency'] / completed, 3) if completed else 0.0
+            metrics['p95_latency'] = self.latency_percentile(name, 95)
+            metrics['total_latency'] = round(metrics['total_latency'], 3)
+            # How the real output size compares to the estimate, for tuning the section sizes
+            metrics['estimate_ratio'] = (
+                round(metrics['completion_tokens'] / metrics['estimated_tokens'], 3)
+                if metrics['estimated_tokens'] else None
+            )
+            stats[name] = metrics
+        return stats
+
+    def _empty_metrics(self):
+        return {
+            'requests': 0,
+            'errors': 0,
+            'truncated': 0,
+            'total_latency': 0.0,
+            'completion_tokens': 0,
+            'prompt_tokens': 0,
+            'estimated_tokens': 0
+        }
+
+# Global model router
+model_router = ModelRouter(
+    load_routes(Config.MODEL_ROUTES),
+    headroom=Config.TOKEN_HEADROOM,
+    min_tokens=Config.MIN_COMPLETION_TOKENS
+)
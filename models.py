@@ -115,9 +115,37 @@ class Trip(BaseModel):
     def __init__(self):
         super().__init__('trips')
     
-    def create_trip(self, user_id, title, start_location, destination, 
-                   start_date, end_date, budget, trip_plan=''):
-        """Create a new trip"""
+    def create_trip(self, user_id, title, start_location, destination,
+                   start_date, end_date, budget, trip_plan='', timeout=None, **extra_fields):
+        """Create a new trip (extra_fields are stored on the trip document as-is; timeout bounds the write)"""
+        trip_data = self.build_trip_data(user_id, title, start_location, destination,
+                                         start_date, end_date, budget, trip_plan, **extra_fields)
+
+        try:
+            self.collection.document(trip_data['trip_id']).set(trip_data, timeout=timeout)
+            return trip_data
+        except Exception as e:
+            raise Exception(f"Error creating trip: {e}")
+    
+    def bulk_create_trips(self, trips, batch_size=500):
+        """Create many trips with batched writes (each item holds create_trip's arguments)"""
+        created = []
+        try:
+            # Firestore allows at most 500 writes per batch
+            for start in range(0, len(trips), batch_size):
+                batch = self.db.batch()
+                batch_trips = [self.build_trip_data(**trip) for trip in trips[start:start + batch_size]]
+                for trip_data in batch_trips:
+                    batch.set(self.collection.document(trip_data['trip_id']), trip_data)
+                batch.commit()
+                created.extend(batch_trips)
+            return created
+        except Exception as e:
+            raise Exception(f"Error bulk creating trips ({len(created)} created): {e}")
+    
+    def build_trip_data(self, user_id, title, start_location, destination,
+                        start_date, end_date, budget, trip_plan='', **extra_fields):
+        """Build a new trip document without saving it"""
         trip_id = str(uuid.uuid4())
         duration = (end_date - start_date).days + 1
         
@@ -139,12 +167,8 @@ class Trip(BaseModel):
             'tags': [],
             'notes': ''
         }
-        
-        try:
-            self.collection.document(trip_id).set(trip_data)
-            return trip_data
-        except Exception as e:
-            raise Exception(f"Error creating trip: {e}")
+        trip_data.update(extra_fields)
+        return trip_data
     
     def get_trip_by_id(self, trip_id):
         """Get trip by ID"""
@@ -174,11 +198,11 @@ class Trip(BaseModel):
         except Exception as e:
             raise Exception(f"Error getting user trips: {e}")
     
-    def update_trip(self, trip_id, data):
+    def update_trip(self, trip_id, data, timeout=None):
         """Update trip data"""
         try:
             data['updated_at'] = datetime.now()
-            self.collection.document(trip_id).update(data)
+            self.collection.document(trip_id).update(data, timeout=timeout)
             return True
         except Exception as e:
             raise Exception(f"Error updating trip: {e}")
@@ -187,9 +211,18 @@ class Trip(BaseModel):
         """Update trip plan"""
         return self.update_trip(trip_id, {
             'trip_plan': trip_plan,
-            'status': 'completed'
+            'status': 'completed',
+            'formatter_version': None  # the stored display fields no longer match the plan
         })
     
+    def save_rendered(self, trip_id, rendered):
+        """Store re-rendered display fields of a trip (not a user edit, so updated_at is kept)"""
+        try:
+            self.collection.document(trip_id).update(rendered)
+            return True
+        except Exception as e:
+            raise Exception(f"Error saving rendered trip: {e}")
+    
     def mark_favorite(self, trip_id, is_favorite=True):
         """Mark trip as favorite"""
         return self.update_trip(trip_id, {'is_favorite': is_favorite})
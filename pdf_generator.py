@@ -12,6 +12,8 @@ import tempfile
 import os
 from datetime import datetime
 import re
+from plan_schema import load_structured_plan, plan_outline, day_title, activity_line, format_cost
+from trip_document import Line, as_document
 
 class NumberedCanvas(canvas.Canvas):
     """Custom canvas class to add page numbers and headers/footers"""
@@ -156,86 +158,89 @@ class TripPDFGenerator:
             fontName='Helvetica-Bold'
         )
     
-    def _parse_content(self, content):
-        """Parse trip content and structure it"""
+    def document_sections(self, content):
+        """
+        Sections of a plan (text or a TripDocument) as {'title', 'lines'}, in reading order.
+
+        Top-level sections and days come from the parsed document, so the
+        PDF splits the plan with the same rules as the web view.
+        """
         sections = []
-        current_section = {'title': '', 'content': '', 'type': 'normal'}
-        
-        lines = content.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
+        for section in as_document(content).sections:
+            lines = [line for line in section.lines if line.kind != 'blank']
+            if section.title or lines:
+                sections.append({'title': self._heading_title(section.title), 'lines': lines})
+            for day in section.days:
+                sections.append({
+                    'title': self._heading_title(day.title),
+                    'lines': [line for line in day.lines if line.kind != 'blank']
+                })
+        return sections
+
+    def structured_sections(self, plan):
+        """
+        Sections of a TripPlanDocument as {'title', 'lines'}, built by walking the structure.
+
+        The lines get the kinds the text parser would give them, so both
+        kinds of trip are laid out by _format_section_lines.
+        """
+        symbol = plan.currency_symbol
+        sections = []
+        if plan.summary or plan.highlights:
+            lines = [plan_line('text', plan.summary)] if plan.summary else []
+            lines += [plan_line('bullet', highlight) for highlight in plan.highlights]
+            sections.append({'title': 'Highlights', 'lines': lines})
+
+        for title, section in plan_outline(plan):
+            if section is not None:
+                if section.items:
+                    sections.append({
+                        'title': self._heading_title(title),
+                        'lines': [plan_line('bullet', item) for item in section.items]
+                    })
                 continue
-            
-            # Check for various heading patterns
-            is_heading = False
-            
-            # Pattern 1: All caps or with special chars
-            if (re.match(r'^[A-Z\s&\-:]+:?\s*$', line) and len(line) > 3) or \
-               re.match(r'^\*\*.*\*\*$', line) or \
-               re.match(r'^#+\s', line) or \
-               re.match(r'^DAY\s+\d+', line, re.IGNORECASE) or \
-               re.match(r'^OVERVIEW|^ITINERARY|^BUDGET|^RECOMMENDATIONS|^TIPS|^TRANSPORTATION|^ACCOMMODATION', line, re.IGNORECASE):
-                is_heading = True
-            
-            if is_heading:
-                # Save previous section
-                if current_section['content'] or current_section['title']:
-                    sections.append(current_section)
-                
-                # Start new section
-                title = line.replace('*', '').replace('#', '').strip(':').title()
-                current_section = {
-                    'title': title,
-                    'content': '',
-                    'type': 'section'
-                }
-            else:
-                current_section['content'] += line + '\n'
-        
-        # Add last section
-        if current_section['content'] or current_section['title']:
-            sections.append(current_section)
-        
+
+            sections.append({'title': self._heading_title(title), 'lines': []})
+            for day in plan.days:
+                lines = []
+                for slot in day.slots:
+                    lines.append(plan_line('heading', slot.name))
+                    lines += [plan_line('bullet', activity_line(activity, symbol)) for activity in slot.activities]
+                if day.meals:
+                    lines.append(plan_line('heading', 'Meals'))
+                    lines += [plan_line('bullet', meal) for meal in day.meals]
+                if day.estimated_cost is not None:
+                    lines.append(plan_line('cost', f"Estimated cost for the day: {format_cost(day.estimated_cost, symbol)}"))
+                lines += [plan_line('note', f"Note: {note}") for note in day.notes]
+                sections.append({'title': self._heading_title(day_title(day)), 'lines': lines})
         return sections
-    
-    def _format_section_content(self, content):
-        """Format section content into flowables"""
+
+    def _heading_title(self, text):
+        return text.replace('*', '').replace('#', '').strip(':').title()
+
+    def _format_section_lines(self, lines):
+        """Format the typed lines of a section into flowables"""
         flowables = []
-        lines = content.split('\n')
         
         for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Check for different content types
-            if re.match(r'^\d+\.', line):
-                # Numbered list item
-                text = re.sub(r'^\d+\.\s*', '• ', line)
-                text = self._format_text(text)
+            if line.kind in ('bullet', 'numbered'):
+                # List item
+                text = self._format_text('• ' + line.text)
                 flowables.append(Paragraph(text, self.bullet_style))
                 
-            elif line.startswith('- ') or line.startswith('• '):
-                # Bullet point
-                text = re.sub(r'^[-•]\s*', '• ', line)
-                text = self._format_text(text)
-                flowables.append(Paragraph(text, self.bullet_style))
-                
-            elif re.match(r'^[A-Z\s]+:', line) or line.startswith('##'):
+            elif line.kind == 'heading':
                 # Subheading
-                text = line.replace('#', '').strip(':')
+                text = line.text.replace('#', '').strip(':')
                 flowables.append(Paragraph(text, self.subheading_style))
                 
-            elif 'important' in line.lower() or 'note:' in line.lower() or 'warning:' in line.lower():
+            elif line.kind == 'note':
                 # Important note
-                text = self._format_text(line)
+                text = self._format_text(line.text)
                 flowables.append(Paragraph(text, self.important_style))
                 
             else:
-                # Regular paragraph
-                text = self._format_text(line)
+                # Regular paragraph (day text, times and costs)
+                text = self._format_text(line.text)
                 if text:
                     flowables.append(Paragraph(text, self.body_style))
         
@@ -295,8 +300,8 @@ class TripPDFGenerator:
         
         return table
     
-    def generate_pdf(self, trip_plan, start_location, destination, start_date, end_date, budget=None):
-        """Generate PDF for trip plan"""
+    def generate_pdf(self, trip_plan, start_location, destination, start_date, end_date, budget=None, structured_plan=None):
+        """Generate PDF for trip plan (from its structured plan when the trip has one)"""
         
         # Create temporary file
         temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
@@ -330,7 +335,8 @@ class TripPDFGenerator:
         story.append(Spacer(1, 30))
         
         # Parse and add trip content
-        sections = self._parse_content(trip_plan)
+        plan = load_structured_plan(structured_plan)
+        sections = self.structured_sections(plan) if plan else self.document_sections(trip_plan)
         
         for i, section in enumerate(sections):
             if section['title']:
@@ -338,9 +344,8 @@ class TripPDFGenerator:
                 story.append(Spacer(1, 10))
             
             # Format section content
-            if section['content']:
-                content_flowables = self._format_section_content(section['content'])
-                story.extend(content_flowables)
+            if section['lines']:
+                story.extend(self._format_section_lines(section['lines']))
             
             # Add spacing between sections
             if i < len(sections) - 1:
@@ -360,7 +365,11 @@ class TripPDFGenerator:
         
         return temp_path
 
-def generate_trip_pdf(trip_plan, start_location, destination, start_date, end_date, budget=None):
+def plan_line(kind, text):
+    """A typed line for text taken straight from a structured plan"""
+    return Line(kind, text, text, text)
+
+def generate_trip_pdf(trip_plan, start_location, destination, start_date, end_date, budget=None, structured_plan=None):
     """Convenience function to generate trip PDF"""
     generator = TripPDFGenerator()
-    return generator.generate_pdf(trip_plan, start_location, destination, start_date, end_date, budget)
\ No newline at end of file
+    return generator.generate_pdf(trip_plan, start_location, destination, start_date, end_date, budget, structured_plan)
\ No newline at end of file
@@ -0,0 +1,352 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils import get_season_from_date, get_currency_info
+from single_flight import SingleFlight
+
+class TieredCache:
+    """
+    Two-tier cache: an in-memory LRU in front of an on-disk JSON store.
+
+    Both tiers expire entries after `ttl` seconds. The memory tier is per
+    process; the disk tier is shared by every worker on the host, so a plan
+    generated by one gunicorn worker is a hit for the others.
+    """
+
+    def __init__(self, name, ttl, max_entries, disk_dir=None, max_disk_entries=1000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'evictions': 0,
+            'expired': 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """Get a cached value, or None on a miss"""
+        entry = self.get_entry(key)
+        return entry['value'] if entry else None
+
+    def get_entry(self, key):
+        """Get the cached entry ({'value', 'stored_at'}) for a key, or None"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry['stored_at'] < self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return entry
+                del self._memory[key]
+                self._stats['expired'] += 1
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+            self._stats['disk_hits'] += 1
+            self._remember(key, entry)
+        return entry
+
+    def set(self, key, value):
+        """Store a value in both tiers"""
+        entry = {'value': value, 'stored_at': time.time()}
+
+        with self._lock:
+            self._remember(key, entry)
+            self._stats['sets'] += 1
+
+        self._write_disk(key, entry)
+
+    def delete(self, key):
+        """Remove a key from both tiers"""
+        with self._lock:
+            self._memory.pop(key, None)
+
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """Get hit/miss counters and tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats['hit_rate'] = round(hits / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _remember(self, key, entry):
+        """Insert into the memory tier, evicting least recently used entries (lock held)"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _disk_path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def _read_disk(self, key, now):
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # Guard against hash collisions and expired entries
+        if entry.get('key') != key:
+            return None
+        if now - entry['stored_at'] >= self.ttl:
+            with self._lock:
+                self._stats['expired'] += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+
+        return {'value': entry['value'], 'stored_at': entry['stored_at']}
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'value': entry['value'], 'stored_at': entry['stored_at']}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"❌ Error writing {self.name} cache entry: {e}")
+            return
+
+        self._prune_disk()
+
+    def _prune_disk(self):
+        """Drop the oldest files once the disk tier grows past its limit"""
+        try:
+            files = [entry for entry in os.scandir(self.disk_dir) if entry.name.endswith('.json')]
+        except OSError:
+            return
+
+        excess = len(files) - self.max_disk_entries
+        if excess <= 0:
+            return
+
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:excess]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._stats['evictions'] += excess
+
+class StaleWhileRevalidateCache:
+    """
+    Serve cached values immediately, refreshing them in the background once stale.
+
+    Entries younger than `fresh_ttl` are served as is. Older entries (up to
+    the underlying cache's TTL) are still served, and a single background
+    refresh per key replaces them. Only a key that was never cached, or has
+    aged out completely, makes the caller wait for compute().
+    """
+
+    def __init__(self, cache, fresh_ttl, refresh_workers=2):
+        self.cache = cache
+        self.fresh_ttl = fresh_ttl
+        self._flight = SingleFlight()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix=f'{cache.name}-refresh')
+        self._stats = {'fresh_hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'refresh_failures': 0}
+
+    def get_or_compute(self, key, compute):
+        """Return (value, 'fresh' | 'stale' | 'miss'), calling compute() only on a miss"""
+        entry = self.cache.get_entry(key)
+        if entry is not None:
+            if time.time() - entry['stored_at'] < self.fresh_ttl:
+                self._count('fresh_hits')
+                return entry['value'], 'fresh'
+
+            self._count('stale_hits')
+            self._refresh_in_background(key, compute)
+            return entry['value'], 'stale'
+
+        self._count('misses')
+        value = self._flight.do(key, lambda: self._compute_and_store(key, compute))
+        return value, 'miss'
+
+    def _compute_and_store(self, key, compute):
+        value = compute()
+        self.cache.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key, compute):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._compute_and_store(key, compute)
+                self._count('refreshes')
+            except Exception as e:
+                # Keep serving the stale value; the next stale hit tries again
+                print(f"❌ Background refresh of {self.cache.name} entry failed: {e}")
+                self._count('refresh_failures')
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """Get fresh/stale/miss counters plus the underlying cache stats"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['refreshing'] = len(self._refreshing)
+        stats['cache'] = self.cache.stats()
+        return stats
+
+def normalize_place(name):
+    """Normalize a location name for cache keys ('  New  Delhi, ' -> 'new delhi')"""
+    name = re.sub(r'[^\w\s]', ' ', (name or '').lower())
+    return ' '.join(name.split())
+
+# Per-day INR range (low inclusive, high exclusive) of each budget bucket
+BUDGET_BUCKETS = {'budget': (0, 3000), 'mid': (3000, 8000), 'premium': (8000, 20000), 'luxury': (20000, None)}
+
+def budget_bucket(budget, num_days):
+    """Bucket a budget by its per-day amount in INR so similar budgets share plans"""
+    if not budget or not budget.get('amount'):
+        return 'any'
+
+    rate = get_currency_info(budget_currency(budget))['rate']
+    per_day = budget['amount'] * rate / max(num_days, 1)
+
+    for bucket, (low, high) in BUDGET_BUCKETS.items():
+        if high is None or per_day < high:
+            return bucket
+
+def budget_bucket_range(budget, num_days):
+    """Per-day (low, high) range of the budget's bucket in its own currency (high is None for the top bucket)"""
+    bucket = budget_bucket(budget, num_days)
+    if bucket == 'any':
+        return None
+
+    rate = get_currency_info(budget_currency(budget))['rate']
+    low, high = BUDGET_BUCKETS[bucket]
+    return (low / rate, high / rate if high is not None else None)
+
+def budget_currency(budget):
+    """Currency the plan's prices are given in ('' without a budget, when the model picks)"""
+    if not budget:
+        return ''
+    return str(budget.get('currency') or 'INR').strip().upper()
+
+def plan_cache_key(start_location, destination, num_days, start_date, budget=None):
+    """Build the cache key for a trip plan request"""
+    return '|'.join([
+        normalize_place(start_location),
+        normalize_place(destination),
+        str(num_days),
+        get_season_from_date(start_date),
+        budget_bucket(budget, num_days),
+        budget_currency(budget)
+    ])
+
+def normalize_list(values):
+    """Normalize a list (or comma-separated string) of interests for cache keys: lowercase, unique, sorted"""
+    if isinstance(values, str):
+        values = values.split(',')
+    return sorted({' '.join(str(value).lower().split()) for value in values or [] if str(value).strip()})
+
+def duration_bucket(num_days):
+    """Bucket a trip length into a day range ('1-3', '4-7', '8-14', '15-30')"""
+    for low, high in ((1, 3), (4, 7), (8, 14)):
+        if num_days <= high:
+            return f"{low}-{high}"
+    return '15-30'
+
+def insight_cache_key(kind, destination, interests=None, duration=None, budget=None):
+    """Build the cache key for a destination info, activities or budget optimization response"""
+    parts = [kind, normalize_place(destination)]
+    if interests is not None:
+        parts.append(','.join(normalize_list(interests)))
+    if duration is not None:
+        parts.append(duration_bucket(duration))
+    if budget is not None:
+        parts.append(budget_bucket(budget, duration or 1))
+        parts.append(budget_currency(budget))
+    return '|'.join(parts)
+
+def destination_cache_key(destination, section_key):
+    """Build the cache key for one destination-only section"""
+    return f"{normalize_place(destination)}|{section_key}"
+
+# Global trip plan cache
+plan_cache = TieredCache(
+    'trip_plans',
+    ttl=Config.PLAN_CACHE_TTL,
+    max_entries=Config.PLAN_CACHE_MAX_ENTRIES,
+    disk_dir=Config.PLAN_CACHE_DIR,
+    max_disk_entries=Config.PLAN_CACHE_MAX_DISK_ENTRIES
+)
+
+# Global destination knowledge cache (sections reused by every trip to a destination)
+destination_cache = TieredCache(
+    'destination_knowledge',
+    ttl=Config.DESTINATION_CACHE_TTL,
+    max_entries=Config.DESTINATION_CACHE_MAX_ENTRIES,
+    disk_dir=Config.DESTINATION_CACHE_DIR,
+    max_disk_entries=Config.DESTINATION_CACHE_MAX_ENTRIES * 10
+)
+
+# Global cache for the destination info, activities and budget optimization endpoints
+insights_cache = StaleWhileRevalidateCache(
+    TieredCache(
+        'insights',
+        ttl=Config.INSIGHTS_CACHE_MAX_AGE,
+        max_entries=Config.INSIGHTS_CACHE_MAX_ENTRIES,
+        disk_dir=Config.INSIGHTS_CACHE_DIR,
+        max_disk_entries=Config.INSIGHTS_CACHE_MAX_ENTRIES * 10
+    ),
+    fresh_ttl=Config.INSIGHTS_CACHE_FRESH_TTL
+)
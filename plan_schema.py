@@ -0,0 +1,158 @@
+import json
+import re
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from prompt import TRIP_PLAN_SECTIONS
+
+# Models sometimes wrap JSON mode output in a markdown code fence anyway
+CODE_FENCE_PATTERN = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+
+class Activity(BaseModel):
+    """One thing to do in a time slot"""
+    title: str
+    time: str = ''
+    description: str = ''
+    location: str = ''
+    cost: Optional[float] = None
+    duration: str = ''
+
+class TimeSlot(BaseModel):
+    """Part of a day (Morning, Afternoon, Evening) and its activities"""
+    name: str
+    activities: List[Activity] = Field(default_factory=list)
+
+class DayPlan(BaseModel):
+    """A single day of the itinerary"""
+    day_number: int
+    title: str = ''
+    date: str = ''
+    slots: List[TimeSlot] = Field(default_factory=list)
+    meals: List[str] = Field(default_factory=list)
+    estimated_cost: Optional[float] = None
+    notes: List[str] = Field(default_factory=list)
+
+class PlanSection(BaseModel):
+    """A non-itinerary section of the plan (transportation, food, tips, ...)"""
+    key: str
+    title: str
+    items: List[str] = Field(default_factory=list)
+
+class TripPlanDocument(BaseModel):
+    """A whole trip plan as structured data"""
+    summary: str = ''
+    highlights: List[str] = Field(default_factory=list)
+    currency_symbol: str = ''
+    days: List[DayPlan]
+    sections: List[PlanSection] = Field(default_factory=list)
+
+class PlanPatch(BaseModel):
+    """Replacement days and sections for a partial modification of a plan"""
+    days: List[DayPlan] = Field(default_factory=list)
+    sections: List[PlanSection] = Field(default_factory=list)
+
+def parse_structured_plan(text):
+    """Validate a JSON mode reply into a TripPlanDocument (raises ValueError when it doesn't fit the schema)"""
+    text = CODE_FENCE_PATTERN.sub('', text or '')
+    plan = TripPlanDocument.model_validate_json(text)
+    if not plan.days:
+        raise ValueError('structured plan has no days')
+    plan.days.sort(key=lambda day: day.day_number)
+    return plan
+
+def load_structured_plan(data):
+    """TripPlanDocument for a stored structured_plan dict, or None if it is missing or invalid"""
+    if not data:
+        return None
+    try:
+        return TripPlanDocument.model_validate(data)
+    except ValueError as e:
+        print(f"❌ Ignoring invalid structured plan: {e}")
+        return None
+
+def parse_plan_patch(text):
+    """Validate a JSON mode reply into a PlanPatch (raises ValueError when it doesn't fit the schema)"""
+    return PlanPatch.model_validate_json(CODE_FENCE_PATTERN.sub('', text or ''))
+
+def plan_json_schema(model=TripPlanDocument):
+    """JSON schema of a plan model, embedded in structured prompts"""
+    return json.dumps(model.model_json_schema(), separators=(',', ':'))
+
+def format_cost(amount, symbol=''):
+    """'₹1,500' style cost text, or '' when there is no cost"""
+    if amount is None:
+        return ''
+    if amount == 0:
+        return 'Free'
+    return f"{symbol}{amount:,.0f}"
+
+def activity_line(activity, symbol=''):
+    """One-line text for an activity: '09:00 Title - description (location) - ₹500, 2 hours'"""
+    line = f"{activity.time} {activity.title}".strip()
+    if activity.description:
+        line += f" - {activity.description}"
+    if activity.location:
+        line += f" ({activity.location})"
+    extras = [text for text in (format_cost(activity.cost, symbol), activity.duration) if text]
+    if extras:
+        line += f" - {', '.join(extras)}"
+    return line
+
+def day_title(day):
+    """'Day 3: Old Town and markets' style header for a day"""
+    title = f"Day {day.day_number}"
+    if day.title:
+        title += f": {day.title}"
+    if day.date:
+        title += f" ({day.date})"
+    return title
+
+def day_text(day, symbol=''):
+    """Body of a day (without its header) in the usual text shape"""
+    lines = []
+    for slot in day.slots:
+        lines.append(f"{slot.name}:")
+        lines.extend(f"- {activity_line(activity, symbol)}" for activity in slot.activities)
+        lines.append('')
+    if day.meals:
+        lines.append('Meals:')
+        lines.extend(f"- {meal}" for meal in day.meals)
+        lines.append('')
+    if day.estimated_cost is not None:
+        lines.append(f"Estimated cost for the day: {format_cost(day.estimated_cost, symbol)}")
+    lines.extend(f"Note: {note}" for note in day.notes)
+    return '\n'.join(lines).strip()
+
+def plan_outline(plan):
+    """(title, section) pairs in canonical order; the itinerary comes through as (title, None)"""
+    by_key = {section.key: section for section in plan.sections}
+    outline = []
+    for section in TRIP_PLAN_SECTIONS:
+        if section['key'] == 'itinerary':
+            outline.append((section['title'], None))
+        elif section['key'] in by_key:
+            outline.append((section['title'], by_key.pop(section['key'])))
+    # Anything the model added under a key of its own goes last
+    outline.extend((section.title.upper(), section) for section in plan.sections if section.key in by_key)
+    return outline
+
+def render_plan_text(plan):
+    """
+    Render a structured plan as plain text in the usual "TITLE:" / "Day N:" shape.
+
+    The text is stored as trip_plan, so everything that still reads the text
+    (cache replay, batch output, trips opened by older code) keeps working.
+    """
+    symbol = plan.currency_symbol
+    blocks = []
+    if plan.summary:
+        blocks.append(plan.summary)
+    if plan.highlights:
+        blocks.append('HIGHLIGHTS:\n\n' + '\n'.join(f"- {highlight}" for highlight in plan.highlights))
+
+    for title, section in plan_outline(plan):
+        if section is None:
+            days = '\n\n'.join(f"{day_title(day)}\n{day_text(day, symbol)}".strip() for day in plan.days)
+            blocks.append(f"{title}:\n\n{days}")
+        elif section.items:
+            blocks.append(f"{title}:\n\n" + '\n'.join(f"- {item}" for item in section.items))
+    return '\n\n'.join(blocks)
@@ -0,0 +1,205 @@
+"""
+Pre-generate plans for the featured and suggested destinations.
+
+Peak-hour traffic is dominated by the destinations the home page and the
+suggestions push (Goa, Kerala, Rajasthan, ...). During off-peak hours the
+scheduler generates their plans for common durations, origins, INR budget
+buckets (PREWARM_BUDGETS) and the upcoming seasons, within a token budget,
+so those requests are cache hits. Requests in other currencies or budget
+buckets are not warmed.
+
+    python prewarm.py --dry-run     # list what would be generated
+    python prewarm.py --now         # run once, ignoring the off-peak window
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from config import Config
+from plan_cache import plan_cache, plan_cache_key
+from model_router import model_router
+from rate_limiter import rate_limiter
+from trip_generator import get_trip_plan, CURRENCY_SYMBOLS
+from utils import (FEATURED_DESTINATIONS, DEFAULT_TRIP_SUGGESTIONS, SHORT_TRIP_SUGGESTIONS,
+                   MEDIUM_TRIP_SUGGESTIONS, LONG_TRIP_SUGGESTIONS, get_season_from_date)
+
+PREWARM_USER_ID = 'prewarm'
+
+# Per-day INR amount inside each plan_cache.budget_bucket, used to warm that bucket
+BUCKET_PER_DAY_AMOUNTS = {'any': 0, 'budget': 2000, 'mid': 5000, 'premium': 12000, 'luxury': 30000}
+
+def parse_duration_range(duration):
+    """Trip lengths covered by a suggestion duration such as '4-5 days'"""
+    numbers = [int(number) for number in re.findall(r'\d+', duration or '')]
+    if not numbers:
+        return []
+    low, high = min(numbers), max(numbers)
+    # Long ranges ('10-14 days') are warmed at their ends only
+    return sorted({low, high}) if high - low > 2 else list(range(low, high + 1))
+
+def popular_destinations():
+    """(destination, durations) for featured and suggested destinations, most popular first"""
+    durations = {}
+    for destination in FEATURED_DESTINATIONS:
+        durations.setdefault(destination['name'], set()).update(Config.PREWARM_DURATIONS)
+
+    suggestion_lists = [DEFAULT_TRIP_SUGGESTIONS, SHORT_TRIP_SUGGESTIONS, MEDIUM_TRIP_SUGGESTIONS, LONG_TRIP_SUGGESTIONS]
+    for suggestions in suggestion_lists:
+        for suggestion in suggestions:
+            durations.setdefault(suggestion['destination'], set()).update(parse_duration_range(suggestion['duration']))
+
+    return [(destination, sorted(days)) for destination, days in durations.items()]
+
+def upcoming_season_dates(today, count):
+    """A start date in each of the next `count` seasons, beginning with the current one"""
+    candidates = [today + timedelta(days=7)]
+    month_start = today.replace(day=1)
+    for _ in range(12):
+        month_start = (month_start + timedelta(days=32)).replace(day=1)
+        candidates.append(month_start)
+
+    dates = []
+    seasons = []
+    for candidate in candidates:
+        season = get_season_from_date(candidate)
+        if season not in seasons:
+            seasons.append(season)
+            dates.append(candidate)
+    return dates[:count]
+
+def prewarm_targets(today=None):
+    """Plan requests to pre-generate, in priority order (soonest season, shortest trips first)"""
+    today = today or date.today()
+    targets = []
+    for start_date in upcoming_season_dates(today, Config.PREWARM_SEASONS_AHEAD):
+        for destination, durations in popular_destinations():
+            for num_days in durations:
+                for origin in Config.PREWARM_ORIGINS:
+                    for bucket in Config.PREWARM_BUDGETS:
+                        targets.append({
+                            'start_location': origin,
+                            'destination': destination,
+                            'num_days': num_days,
+                            'start_date': start_date,
+                            'end_date': start_date + timedelta(days=num_days - 1),
+                            # Budget-less requests share the 'any' budget bucket
+                            'budget': {"amount": float(BUCKET_PER_DAY_AMOUNTS[bucket] * num_days), "currency": "INR",
+                                       "symbol": CURRENCY_SYMBOLS["INR"]}
+                        })
+    # Stable, so within a trip length the buckets keep their PREWARM_BUDGETS order
+    targets.sort(key=lambda target: (target['start_date'], target['num_days']))
+    return targets
+
+def run_prewarm(token_budget=None, dry_run=False):
+    """Generate uncached targets until the estimated token budget is spent"""
+    token_budget = token_budget if token_budget is not None else Config.PREWARM_TOKEN_BUDGET
+    stats = {'targets': 0, 'cached': 0, 'generated': 0, 'failed': 0, 'tokens_used': 0, 'budget_exhausted': False}
+
+    for target in prewarm_targets():
+        stats['targets'] += 1
+        cache_key = plan_cache_key(target['start_location'], target['destination'], target['num_days'],
+                                   target['start_date'], target['budget'])
+        if plan_cache.get(cache_key) is not None:
+            stats['cached'] += 1
+            continue
+
+        estimated_tokens = model_router.estimate_tokens(target['num_days'])
+        if stats['tokens_used'] + estimated_tokens > token_budget:
+            # Smaller plans further down the list may still fit
+            stats['budget_exhausted'] = True
+            continue
+
+        stats['tokens_used'] += estimated_tokens
+        if dry_run:
+            print(f"🔥 {target['start_location']} -> {target['destination']}, {target['num_days']} days from {target['start_date']}, "
+                  f"budget ₹{target['budget']['amount']:,.0f}")
+            continue
+
+        _wait_for_capacity(estimated_tokens, model_router.estimate_completions(target['num_days']))
+        trip_plan = get_trip_plan(**target)
+        if trip_plan.startswith("Error"):
+            stats['failed'] += 1
+            print(f"❌ Pre-warming {target['destination']} failed: {trip_plan}")
+        else:
+            stats['generated'] += 1
+
+    return stats
+
+def _wait_for_capacity(estimated_tokens, completions):
+    """Pre-warming takes its share of the quota like any other user"""
+    if not Config.RATE_LIMIT_ENABLED:
+        return
+    while True:
+        decision = rate_limiter.acquire(PREWARM_USER_ID, estimated_tokens, completions)
+        if decision['allowed']:
+            return
+        time.sleep(decision['retry_after'])
+
+def in_off_peak_window(hour):
+    """Whether an hour (0-23) falls in PREWARM_HOURS, which may wrap past midnight"""
+    start, end = Config.PREWARM_HOURS
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+class PrewarmScheduler:
+    """
+    Daemon thread that runs the pre-warm once per day inside the off-peak window.
+
+    Every gunicorn worker starts a scheduler, but a marker file created with
+    O_EXCL lets only one of them run each day.
+    """
+
+    def __init__(self, marker_dir, check_interval=900):
+        self.marker_dir = marker_dir
+        self.check_interval = check_interval
+        self._thread = None
+        self._lock = threading.Lock()
+        self.last_stats = None
+
+    def start(self):
+        """Start the scheduler thread (once per process)"""
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._loop, name='prewarm-scheduler', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            now = datetime.now()
+            if in_off_peak_window(now.hour) and self._claim_day(now.date()):
+                try:
+                    self.last_stats = run_prewarm()
+                    print(f"✅ Pre-warm finished: {self.last_stats}")
+                except Exception as e:
+                    print(f"❌ Pre-warm failed: {e}")
+            time.sleep(self.check_interval)
+
+    def _claim_day(self, day):
+        """Create today's marker file; False if another process already did"""
+        os.makedirs(self.marker_dir, exist_ok=True)
+        try:
+            fd = os.open(os.path.join(self.marker_dir, f"prewarm-{day.isoformat()}"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        return True
+
+# Global pre-warm scheduler
+prewarm_scheduler = PrewarmScheduler(Config.PREWARM_MARKER_DIR)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-generate plans for featured and suggested destinations')
+    parser.add_argument('--now', action='store_true', help='run immediately instead of waiting for off-peak hours')
+    parser.add_argument('--dry-run', action='store_true', help='only list the plans that would be generated')
+    parser.add_argument('--token-budget', type=int, help='estimated output tokens to spend (default: PREWARM_TOKEN_BUDGET)')
+    args = parser.parse_args()
+
+    if args.now or args.dry_run:
+        print(run_prewarm(args.token_budget, dry_run=args.dry_run))
+    else:
+        prewarm_scheduler.start()
+        threading.Event().wait()
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 def get_trip_plan_prompt(start_location, destination, num_days, start_date, end_date, budget=None):
     """Generate a detailed prompt for trip planning AI"""
     
@@ -196,13 +198,23 @@ Focus on creating memorable experiences that align with the traveler's interests
     
     return prompt
 
-def get_budget_optimization_prompt(destination, budget, duration, priorities):
-    """Generate prompt for budget optimization advice"""
+def get_budget_optimization_prompt(destination, budget, daily_range, duration, priorities):
+    """Generate prompt for budget optimization advice (daily_range is the per-day (low, high) budget range)"""
+    
+    symbol = budget.get('symbol', '$')
+    if daily_range is None:
+        budget_text = 'Flexible'
+    elif daily_range[1] is None:
+        budget_text = f"{symbol}{daily_range[0]:,.0f}+ per day"
+    elif not daily_range[0]:
+        budget_text = f"Up to {symbol}{daily_range[1]:,.0f} per day"
+    else:
+        budget_text = f"{symbol}{daily_range[0]:,.0f}-{symbol}{daily_range[1]:,.0f} per day"
     
     prompt = f"""
 Help optimize a travel budget for {destination}:
 
-BUDGET: {budget.get('symbol', '$')}{budget.get('amount', 0):,.0f} {budget.get('currency', 'USD')}
+BUDGET: {budget_text} {budget.get('currency', 'USD')}
 DURATION: {duration} days
 PRIORITIES: {priorities}
 
@@ -240,6 +252,308 @@ Provide detailed budget optimization advice:
    - Negotiation and bargaining strategies
 
 Make the advice practical and actionable, helping the traveler maximize their experience within budget constraints.
+"""
+    
+    return prompt
+
+# Sections of the full trip plan, in the order they appear in the plan.
+# Each one can be generated on its own with get_trip_section_prompt;
+# estimated_tokens is its typical output size, used for model routing.
+# destination_only sections do not depend on dates, origin or budget and are
+# generated once per destination with get_destination_section_prompt.
+TRIP_PLAN_SECTIONS = [
+    {
+        'key': 'overview',
+        'title': 'OVERVIEW & HIGHLIGHTS',
+        'estimated_tokens': 350,
+        'destination_only': True,
+        'instructions': """   - Brief destination overview
+   - Best time to visit and weather expectations for travel dates
+   - Top 3-5 must-see attractions/experiences
+   - Cultural insights and local customs to be aware of"""
+    },
+    {
+        'key': 'transportation',
+        'title': 'TRANSPORTATION',
+        'estimated_tokens': 350,
+        'instructions': """   - Best ways to reach {destination} from {start_location}
+   - Recommended flight routes or transportation modes
+   - Local transportation options (metro, buses, taxis, car rentals)
+   - Estimated transportation costs"""
+    },
+    {
+        'key': 'accommodation',
+        'title': 'ACCOMMODATION RECOMMENDATIONS',
+        'estimated_tokens': 350,
+        'instructions': """   - 3-4 accommodation options with different price ranges
+   - Best areas to stay based on itinerary
+   - Booking tips and estimated costs per night"""
+    },
+    {
+        'key': 'itinerary',
+        'title': 'DETAILED DAY-BY-DAY ITINERARY',
+        'estimated_tokens': 250,  # per day of the trip
+        'instructions': """   Create a day-by-day plan for all {num_days} days with:
+   - Morning, afternoon, and evening activities
+   - Specific attractions with brief descriptions
+   - Recommended restaurants for meals
+   - Travel time between locations
+   - Estimated costs for activities and meals
+   - Alternative options in case of bad weather
+   Start every day on its own line as "Day N: <theme of the day>"."""
+    },
+    {
+        'key': 'food',
+        'title': 'FOOD & DINING',
+        'estimated_tokens': 350,
+        'destination_only': True,
+        'instructions': """   - Must-try local dishes and specialties
+   - Recommended restaurants (budget, mid-range, fine dining)
+   - Street food recommendations and safety tips
+   - Dietary restrictions accommodations"""
+    },
+    {
+        'key': 'practical',
+        'title': 'PRACTICAL INFORMATION',
+        'estimated_tokens': 450,
+        'destination_only': True,
+        'instructions': """   - Visa requirements (if applicable)
+   - Currency and payment methods
+   - Language basics and useful phrases
+   - Emergency contacts and important numbers
+   - Health and safety tips
+   - What to pack (considering weather and activities)"""
+    },
+    {
+        'key': 'budget',
+        'title': 'BUDGET BREAKDOWN',
+        'estimated_tokens': 350,
+        'instructions': """   - Accommodation: estimated cost
+   - Transportation: local and international
+   - Food and dining: daily estimates
+   - Activities and attractions: entry fees
+   - Shopping and souvenirs: suggested amount
+   - Emergency fund: recommended amount"""
+    },
+    {
+        'key': 'tips',
+        'title': 'INSIDER TIPS & HIDDEN GEMS',
+        'estimated_tokens': 350,
+        'destination_only': True,
+        'instructions': """   - Lesser-known attractions worth visiting
+   - Local experiences and cultural activities
+   - Best times to visit popular attractions (avoid crowds)
+   - Money-saving tips and free activities
+   - Local etiquette and customs"""
+    },
+    {
+        'key': 'packing',
+        'title': 'PACKING CHECKLIST',
+        'estimated_tokens': 250,
+        'destination_only': True,
+        'instructions': """   - Essential items based on destination and season
+   - Electronics and adapters needed
+   - Clothing recommendations
+   - Health and safety items"""
+    },
+    {
+        'key': 'alternatives',
+        'title': 'ALTERNATIVE PLANS',
+        'estimated_tokens': 200,
+        'instructions': """   - Backup indoor activities for bad weather
+   - Flexible options that can be swapped
+   - Extended stay recommendations (if staying longer)"""
+    }
+]
+
+def get_trip_section_prompt(section, start_location, destination, num_days, start_date, end_date, budget=None):
+    """Generate a prompt for a single section of the trip plan"""
+    
+    budget_info = ""
+    if budget and budget.get('amount', 0) > 0:
+        budget_info = f"""
+BUDGET CONSTRAINTS:
+- Total Budget: {budget['symbol']}{budget['amount']:,.0f} {budget['currency']}
+- Please ensure all recommendations fit within this budget
+- Provide cost breakdowns for major expenses
+"""
+    
+    instructions = section['instructions'].format(
+        start_location=start_location,
+        destination=destination,
+        num_days=num_days
+    )
+    
+    prompt = f"""
+You are an expert travel planner with extensive knowledge of destinations worldwide. You are writing one section of a comprehensive travel plan for the following trip:
+
+TRIP DETAILS:
+- From: {start_location}
+- To: {destination}
+- Duration: {num_days} days ({start_date} to {end_date})
+- Travel Dates: {start_date.strftime('%B %d, %Y')} to {end_date.strftime('%B %d, %Y')}
+{budget_info}
+
+Write ONLY the "{section['title']}" section, covering:
+{instructions}
+
+Start directly with the content: do not repeat the section title, do not add an introduction or closing remarks, and do not cover topics that belong to other sections of the plan. Use short sub-headings and bullet points for easy reading, and keep the advice practical and realistic.
+"""
+    
+    return prompt
+
+def get_structured_trip_plan_prompt(start_location, destination, num_days, start_date, end_date, schema, budget=None):
+    """Generate a prompt asking for the whole trip plan as JSON matching the plan schema"""
+    
+    budget_info = ""
+    if budget and budget.get('amount', 0) > 0:
+        budget_info = f"""
+BUDGET CONSTRAINTS:
+- Total Budget: {budget['symbol']}{budget['amount']:,.0f} {budget['currency']}
+- Please ensure all recommendations fit within this budget
+"""
+    
+    currency = budget['currency'] if budget else 'the local currency of the destination'
+    currency_line = f"- Give every cost as a plain number in {currency} (no currency symbols)\n"
+    
+    sections = "\n".join(
+        f"- \"{section['key']}\" ({section['title']}):\n{section['instructions'].format(start_location=start_location, destination=destination, num_days=num_days)}"
+        for section in TRIP_PLAN_SECTIONS if section['key'] != 'itinerary'
+    )
+    
+    prompt = f"""
+You are an expert travel planner with extensive knowledge of destinations worldwide. Create a comprehensive, detailed travel plan for the following trip:
+
+TRIP DETAILS:
+- From: {start_location}
+- To: {destination}
+- Duration: {num_days} days ({start_date} to {end_date})
+- Travel Dates: {start_date.strftime('%B %d, %Y')} to {end_date.strftime('%B %d, %Y')}
+{budget_info}
+Reply with a single JSON object that matches this JSON schema, and nothing else:
+{schema}
+
+RULES:
+- "summary": two or three sentences introducing the trip
+- "highlights": the 3-5 experiences not to miss
+- "days": exactly {num_days} entries with day_number 1 to {num_days} and the date (YYYY-MM-DD); split each day into "Morning", "Afternoon" and "Evening" slots with specific attractions, short descriptions, locations, start times, durations and costs; list recommended restaurants in "meals"; put travel times and bad-weather alternatives in "notes"
+{currency_line}- "sections": one entry for each of these keys, with the title given and the content as short, practical bullet items (plain text, no markdown):
+{sections}
+"""
+    
+    return prompt
+
+def get_plan_modification_prompt(start_location, destination, num_days, start_date, end_date,
+                                 outline, current_parts, change_request, budget=None, schema=None):
+    """Generate a prompt that rewrites only some days or sections of an existing trip plan"""
+    
+    budget_line = ""
+    if budget and budget.get('amount', 0) > 0:
+        budget_line = f"- Total Budget: {budget['symbol']}{budget['amount']:,.0f} {budget['currency']}\n"
+    
+    if schema:
+        reply_format = f"""Reply with a single JSON object that matches this JSON schema, and nothing else:
+{schema}
+Include only the days and sections being rewritten, keeping their day_number and key; give costs as plain numbers."""
+    else:
+        reply_format = """Reply with the rewritten parts only, in the same format as above: start every day on its own line as "Day N: <theme of the day>" and every section with its title in capitals followed by a colon. Do not add an introduction or repeat unchanged parts."""
+    
+    prompt = f"""
+You are an expert travel planner updating part of an existing travel plan.
+
+TRIP DETAILS:
+- From: {start_location}
+- To: {destination}
+- Duration: {num_days} days ({start_date} to {end_date})
+{budget_line}
+CURRENT PLAN OUTLINE (for context; these parts stay as they are unless listed below):
+{outline}
+
+PARTS TO REWRITE:
+{current_parts}
+
+REQUESTED CHANGE:
+{change_request or 'Improve these parts of the plan.'}
+
+Rewrite only the parts listed above so they reflect the requested change, stay consistent with the rest of the plan and keep the same level of detail. {reply_format}
+"""
+    
+    return prompt
+
+def get_destination_section_prompt(section, destination):
+    """Generate a prompt for a section that only depends on the destination (reused across trips)"""
+    
+    instructions = section['instructions'].format(destination=destination)
+    
+    prompt = f"""
+You are an expert travel planner with extensive knowledge of destinations worldwide. You are writing one section of a travel guide for {destination}. The same text will be included in travel plans for trips to {destination} from anywhere, for any dates and any budget.
+
+Write ONLY the "{section['title']}" section, covering:
+{instructions}
+
+Where advice depends on the season (weather, clothing, crowds), briefly cover the main seasons instead of particular dates. Do not mention the traveler's origin, travel dates, trip length or budget.
+
+Start directly with the content: do not repeat the section title, do not add an introduction or closing remarks, and do not cover topics that belong to other sections of the plan. Use short sub-headings and bullet points for easy reading, and keep the advice practical and realistic.
+"""
+    
+    return prompt
+
+def get_itinerary_outline_prompt(start_location, destination, num_days, start_date, end_date, day_ranges, budget=None):
+    """Generate prompt for a short route outline used to plan long itineraries in parts"""
+    
+    budget_line = ""
+    if budget and budget.get('amount', 0) > 0:
+        budget_line = f"- Total Budget: {budget['symbol']}{budget['amount']:,.0f} {budget['currency']}\n"
+    
+    ranges_str = "\n".join(f"Days {first}-{last}:" for first, last in day_ranges)
+    
+    prompt = f"""
+You are an expert travel planner. Outline the route for this trip before it is planned in detail:
+
+- From: {start_location}
+- To: {destination}
+- Duration: {num_days} days ({start_date} to {end_date})
+{budget_line}
+For each day range below, give the town or area to stay in (the accommodation base) and the focus of those days, so that the ranges together cover {destination} without repeating attractions. Reply with exactly one line per range, in this format and nothing else:
+Days A-B: <accommodation base> - <focus of these days>
+
+{ranges_str}
+"""
+    
+    return prompt
+
+def get_itinerary_chunk_prompt(start_location, destination, num_days, start_date, end_date,
+                               first_day, last_day, route_outline, budget=None):
+    """Generate prompt for one day range of a long trip itinerary"""
+    
+    budget_line = ""
+    if budget and budget.get('amount', 0) > 0:
+        per_day = budget['amount'] / num_days
+        budget_line = f"- Budget: {budget['symbol']}{budget['amount']:,.0f} {budget['currency']} in total (about {budget['symbol']}{per_day:,.0f} per day)\n"
+    
+    chunk_start = start_date + timedelta(days=first_day - 1)
+    chunk_end = start_date + timedelta(days=last_day - 1)
+    
+    prompt = f"""
+You are an expert travel planner writing part of a detailed day-by-day itinerary. Other parts of the itinerary are being written separately from the same context.
+
+TRIP CONTEXT:
+- From: {start_location}
+- To: {destination}
+- Duration: {num_days} days ({start_date} to {end_date})
+{budget_line}
+ROUTE OUTLINE (accommodation base and focus for each part of the trip):
+{route_outline}
+
+Write the itinerary for Day {first_day} to Day {last_day} only ({chunk_start.strftime('%B %d, %Y')} to {chunk_end.strftime('%B %d, %Y')}), following the route outline. For each day include:
+   - Morning, afternoon, and evening activities
+   - Specific attractions with brief descriptions
+   - Recommended restaurants for meals
+   - Travel time between locations
+   - Estimated costs for activities and meals
+   - Alternative options in case of bad weather
+
+Start every day on its own line as "Day N: <theme of the day>" using the real day numbers ({first_day} to {last_day}). Do not add an introduction, a summary or any other section.
 """
     
     return prompt
\ No newline at end of file
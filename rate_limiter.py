@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import threading
+import time
+from config import Config
+from model_router import model_router
+
+class RateLimiter:
+    """
+    Token-bucket admission control for trip generation, shared across workers.
+
+    Every generation takes its estimated Groq completions and output tokens
+    from four buckets: global requests, global tokens, and the same two for
+    the user. Bucket levels live in SQLite, so the limits hold across gunicorn
+    workers; a request is only admitted if every bucket can pay for it.
+    A limiter with a `global_reserve` fraction only draws on the global
+    buckets while that share of them is left over for everyone else.
+    """
+
+    def __init__(self, db_path, global_requests_per_minute=60, global_tokens_per_minute=200000,
+                 user_requests_per_minute=5, user_tokens_per_minute=40000, global_reserve=0.0):
+        self.db_path = db_path
+        self.global_reserve = global_reserve
+        self.limits = {
+            'global_requests': global_requests_per_minute,
+            'global_tokens': global_tokens_per_minute,
+            'user_requests': user_requests_per_minute,
+            'user_tokens': user_tokens_per_minute
+        }
+        self._acquire_count = 0
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        """Open a connection in autocommit mode (transactions are explicit)"""
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _init_db(self):
+        """Create the bucket and counter tables if needed"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    bucket_key TEXT PRIMARY KEY,
+                    level REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        finally:
+            conn.close()
+
+    def _buckets(self, user_id, tokens, requests):
+        """(bucket_key, limit name, cost) for every bucket a request draws from"""
+        return [
+            ('global:requests', 'global_requests', requests),
+            ('global:tokens', 'global_tokens', tokens),
+            (f'user:{user_id}:requests', 'user_requests', requests),
+            (f'user:{user_id}:tokens', 'user_tokens', tokens)
+        ]
+
+    def acquire(self, user_id, tokens, requests=1):
+        """
+        Try to admit a generation of about `tokens` output tokens in `requests` Groq completions for a user.
+
+        Returns {'allowed': bool, 'retry_after': seconds, 'limited_by': name or None}.
+        Nothing is taken from any bucket when the request is rejected.
+        """
+        now = time.time()
+        decision = {'allowed': True, 'retry_after': 0, 'limited_by': None}
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            levels = []
+            for bucket_key, limit_name, cost in self._buckets(user_id, tokens, requests):
+                capacity = self.limits[limit_name]
+                refill_rate = capacity / 60.0
+                reserve = capacity * self.global_reserve if limit_name.startswith('global') else 0
+                # A request bigger than the bucket is admitted when the bucket is full
+                cost = min(cost, capacity - reserve)
+
+                row = conn.execute('SELECT level, updated_at FROM buckets WHERE bucket_key = ?', (bucket_key,)).fetchone()
+                level = capacity if row is None else min(capacity, row[0] + (now - row[1]) * refill_rate)
+                levels.append((bucket_key, level - cost))
+
+                if level - reserve < cost:
+                    wait = (cost + reserve - level) / refill_rate
+                    if wait > decision['retry_after']:
+                        decision = {'allowed': False, 'retry_after': int(wait) + 1, 'limited_by': limit_name}
+
+            if decision['allowed']:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO buckets (bucket_key, level, updated_at) VALUES (?, ?, ?)',
+                    [(bucket_key, level, now) for bucket_key, level in levels]
+                )
+                self._increment(conn, 'admitted')
+            else:
+                self._increment(conn, 'rejected')
+                self._increment(conn, f"rejected_{decision['limited_by']}")
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        self._prune_idle_buckets()
+        return decision
+
+    def _increment(self, conn, name):
+        conn.execute(
+            'INSERT INTO counters (name, value) VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + 1',
+            (name,)
+        )
+
+    def _prune_idle_buckets(self):
+        """Every so often drop per-user buckets idle long enough to be full again"""
+        with self._lock:
+            self._acquire_count += 1
+            if self._acquire_count % 100:
+                return
+
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM buckets WHERE bucket_key LIKE 'user:%' AND updated_at < ?", (time.time() - 120,))
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Get admission/rejection counters (across all workers) and global bucket levels"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            counters = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+            rows = conn.execute(
+                "SELECT bucket_key, level, updated_at FROM buckets WHERE bucket_key LIKE 'global:%'"
+            ).fetchall()
+            active_users = conn.execute(
+                "SELECT COUNT(*) FROM buckets WHERE bucket_key LIKE 'user:%:requests' AND updated_at > ?",
+                (now - 60,)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+        stats = {'admitted': 0, 'rejected': 0}
+        stats.update(counters)
+        for bucket_key, level, updated_at in rows:
+            capacity = self.limits[bucket_key.replace(':', '_')]
+            stats[f"{bucket_key.replace(':', '_')}_available"] = int(min(capacity, level + (now - updated_at) * capacity / 60.0))
+        stats['active_users'] = active_users
+        stats['limits_per_minute'] = dict(self.limits)
+        return stats
+
+# Global rate limiter for trip generation
+rate_limiter = RateLimiter(
+    Config.RATE_LIMIT_PATH,
+    global_requests_per_minute=Config.GLOBAL_REQUESTS_PER_MINUTE,
+    global_tokens_per_minute=Config.GLOBAL_TOKENS_PER_MINUTE,
+    user_requests_per_minute=Config.USER_REQUESTS_PER_MINUTE,
+    user_tokens_per_minute=Config.USER_TOKENS_PER_MINUTE
+)
+
+def admit_generation(user_id, num_days, sections=None, stream=False):
+    """Admission decision for generating the given sections (default: all) of a num_days trip plan for a user"""
+    if not Config.RATE_LIMIT_ENABLED:
+        return {'allowed': True, 'retry_after': 0, 'limited_by': None}
+    return rate_limiter.acquire(user_id, model_router.estimate_tokens(num_days, sections),
+                                model_router.estimate_completions(num_days, sections, stream))
@@ -0,0 +1,85 @@
+import threading
+from deadline import DeadlineExceededError
+
+class _Call:
+    """An in-flight call shared by every caller with the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one execution.
+
+    The first caller for a key runs the function; callers that arrive while
+    it is still running wait for it and receive the same result (or the same
+    exception). Once the call finishes the key is released, so later calls
+    run again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'executions': 0, 'saved_calls': 0}
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() for key, or wait (at most `timeout` seconds) for the identical call already in flight"""
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executions'] += 1
+                is_leader = True
+            else:
+                self._stats['saved_calls'] += 1
+                call.waiters += 1
+                is_leader = False
+
+        if not is_leader:
+            finished = call.done.wait(timeout)
+            with self._lock:
+                call.waiters -= 1
+            if not finished:
+                raise DeadlineExceededError('Timed out waiting for the identical request in flight')
+            if isinstance(call.error, Exception):
+                raise call.error
+            if call.error is not None:
+                # The leader was interrupted (e.g. its thread is shutting down); that isn't the waiter's to re-raise
+                raise Exception(f"The identical request in flight was interrupted: {call.error!r}")
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            # Waiters must never mistake an interrupted leader for a None result
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def waiting(self, key):
+        """Number of callers waiting on the in-flight call for key"""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call else 0
+
+    def in_flight(self):
+        """Number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        """Get call counters, including how many upstream calls were saved"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
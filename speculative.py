@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError
+from config import Config
+from plan_cache import plan_cache, plan_cache_key
+from model_router import model_router
+from rate_limiter import RateLimiter
+from llm_client import llm_client, llm_loop
+from trip_generator import generate_trip_plan_result_async, store_plan_result
+
+SPECULATIVE_USER_ID = 'speculative'
+
+class SpeculativeGenerator:
+    """
+    Generate plans before they are asked for, from planner form signals.
+
+    Once a user has entered origin, destination and dates the submit is
+    likely to follow, so a background generation is started for those
+    parameters and parked for `ttl` seconds. The submit claims it, waiting
+    for it if it is still running, instead of starting from scratch.
+
+    Speculation is low priority: it is skipped when the plan is already
+    cached, when Groq is failing, when `max_in_flight` speculations are
+    running, or when its own slice of the shared quota is spent. Each user
+    has at most `max_per_user` speculations; newer form inputs cancel the
+    oldest, which also aborts its in-flight Groq requests.
+    """
+
+    def __init__(self, ttl=600, max_per_user=1, max_in_flight=4, limiter=None, claim_timeout=120):
+        self.ttl = ttl
+        self.max_per_user = max_per_user
+        self.max_in_flight = max_in_flight
+        self.limiter = limiter
+        self.claim_timeout = claim_timeout
+        self._entries = {}  # user_id -> OrderedDict of cache_key -> entry
+        self._lock = threading.Lock()
+        self._stats = {
+            'started': 0,
+            'completed': 0,
+            'failed': 0,
+            'claimed': 0,
+            'claimed_in_flight': 0,
+            'cancelled': 0,
+            'expired': 0,
+            'skipped_cached': 0,
+            'skipped_busy': 0,
+            'skipped_rate_limited': 0,
+            'skipped_circuit_open': 0,
+            'estimated_tokens': 0,
+            'wasted_tokens': 0
+        }
+
+    def speculate(self, user_id, trip_request):
+        """Start a background generation for a likely request; returns a short status"""
+        cache_key = self._cache_key(trip_request)
+        if Config.PLAN_CACHE_ENABLED and plan_cache.get(cache_key) is not None:
+            self._count('skipped_cached')
+            return 'cached'
+        if llm_client.breaker.state != 'closed':
+            self._count('skipped_circuit_open')
+            return 'circuit_open'
+
+        with self._lock:
+            self._expire()
+            if cache_key in self._entries.get(user_id, {}):
+                return 'running'
+            if self._in_flight() >= self.max_in_flight:
+                self._stats['skipped_busy'] += 1
+                return 'busy'
+
+        estimated_tokens = model_router.estimate_tokens(trip_request['num_days'])
+        completions = model_router.estimate_completions(trip_request['num_days'])
+        if self.limiter and not self.limiter.acquire(SPECULATIVE_USER_ID, estimated_tokens, completions)['allowed']:
+            self._count('skipped_rate_limited')
+            return 'rate_limited'
+
+        future = llm_loop.submit(generate_trip_plan_result_async(**trip_request))
+        entry = {'future': future, 'started_at': time.time(), 'estimated_tokens': estimated_tokens}
+        with self._lock:
+            entries = self._entries.setdefault(user_id, OrderedDict())
+            if cache_key in entries:
+                # Another request for the same inputs got here first
+                future.cancel()
+                return 'running'
+            # The newest form inputs win over older guesses
+            while len(entries) >= self.max_per_user:
+                _, oldest = entries.popitem(last=False)
+                self._discard(oldest, 'cancelled')
+            entries[cache_key] = entry
+            self._stats['started'] += 1
+            self._stats['estimated_tokens'] += estimated_tokens
+
+        future.add_done_callback(self._on_done)
+        return 'started'
+
+    def claim(self, user_id, trip_request, deadline=None):
+        """The speculative result for this request ({'trip_plan', 'structured_plan'}), or None"""
+        cache_key = self._cache_key(trip_request)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(user_id, {}).pop(cache_key, None)
+        if entry is None:
+            return None
+
+        future = entry['future']
+        in_flight = not future.done()
+        try:
+            timeout = min(self.claim_timeout, deadline.remaining()) if deadline else self.claim_timeout
+            result = future.result(timeout=timeout)
+        except (Exception, CancelledError) as e:
+            future.cancel()
+            print(f"❌ Speculative plan unusable, generating normally: {e}")
+            return None
+        if result['trip_plan'].startswith("Error"):
+            return None
+
+        with self._lock:
+            self._stats['claimed'] += 1
+            if in_flight:
+                self._stats['claimed_in_flight'] += 1
+        store_plan_result(cache_key, result)
+        return result
+
+    def cancel(self, user_id):
+        """Cancel all of a user's speculations (e.g. they left the planner); returns how many"""
+        with self._lock:
+            entries = self._entries.pop(user_id, {})
+            for entry in entries.values():
+                self._discard(entry, 'cancelled')
+        return len(entries)
+
+    def stats(self):
+        """Get speculation counters, kept apart from the regular generation metrics"""
+        with self._lock:
+            self._expire()
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight()
+            stats['parked'] = sum(len(entries) for entries in self._entries.values())
+        stats['claim_rate'] = round(stats['claimed'] / stats['started'], 3) if stats['started'] else 0.0
+        return stats
+
+    def _cache_key(self, trip_request):
+        return plan_cache_key(trip_request['start_location'], trip_request['destination'], trip_request['num_days'],
+                              trip_request['start_date'], trip_request['budget'])
+
+    def _discard(self, entry, reason):
+        """Drop an unclaimed speculation, cancelling it if it is still running (lock held)"""
+        entry['future'].cancel()
+        self._stats[reason] += 1
+        self._stats['wasted_tokens'] += entry['estimated_tokens']
+
+    def _expire(self):
+        """Drop speculations nobody claimed within the TTL (lock held)"""
+        cutoff = time.time() - self.ttl
+        for user_id in list(self._entries):
+            entries = self._entries[user_id]
+            for cache_key in [key for key, entry in entries.items() if entry['started_at'] < cutoff]:
+                self._discard(entries.pop(cache_key), 'expired')
+            if not entries:
+                del self._entries[user_id]
+
+    def _in_flight(self):
+        return sum(
+            1 for entries in self._entries.values() for entry in entries.values() if not entry['future'].done()
+        )
+
+    def _on_done(self, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        failed = error is not None or future.result()['trip_plan'].startswith("Error")
+        self._count('failed' if failed else 'completed')
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+# Global speculative generator. Its quota is a separate 'user' in the shared
+# rate limiter, so speculation draws on the global buckets but can never use
+# more than its own per-minute slice.
+speculative_generator = SpeculativeGenerator(
+    ttl=Config.SPECULATIVE_TTL,
+    max_per_user=Config.SPECULATIVE_MAX_PER_USER,
+    max_in_flight=Config.SPECULATIVE_MAX_IN_FLIGHT,
+    limiter=RateLimiter(
+        Config.RATE_LIMIT_PATH,
+        global_requests_per_minute=Config.GLOBAL_REQUESTS_PER_MINUTE,
+        global_tokens_per_minute=Config.GLOBAL_TOKENS_PER_MINUTE,
+        user_requests_per_minute=Config.SPECULATIVE_REQUESTS_PER_MINUTE,
+        user_tokens_per_minute=Config.SPECULATIVE_TOKENS_PER_MINUTE
+    ),
+    claim_timeout=Config.SPECULATIVE_CLAIM_TIMEOUT
+)
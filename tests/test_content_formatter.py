@@ -0,0 +1,117 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_formatter import IncrementalTripFormatter, TripContentFormatter
+from trip_document import classify_line
+
+SAMPLE_PLAN = """Here is your plan for Goa!
+
+1. **OVERVIEW & HIGHLIGHTS**
+Goa is a coastal state famous for beaches. Must visit Fort Aguada.
+- Best time: Nov-Feb
+
+TRANSPORTATION:
+- Flight from Mumbai: ₹4,000
+* Local taxis
+
+DETAILED DAY-BY-DAY ITINERARY:
+
+Day 1: Arrival in North Goa
+Morning:
+- 09:00 Land at GOI
+- Check in at **Taj Holiday Village** (₹3,000/night)
+Afternoon:
+1. Baga beach
+2) Calangute
+Note: carry sunscreen
+
+Day 2: South Goa
+**Morning**
+- Palolem beach
+Evening: dinner at Martin's Corner, ₹1,500
+
+Day 3: Old Goa
+- Basilica of Bom Jesus, a famous UNESCO landmark
+| Item | Cost |
+|------|------|
+| Entry | Free |
+
+FOOD & DINING:
+- Fish curry rice
+- Bebinca dessert is recommended for everyone
+
+BUDGET BREAKDOWN:
+- Total: ₹20,000
+"""
+
+PLANS = [
+    SAMPLE_PLAN,
+    SAMPLE_PLAN.rstrip('\n'),
+    SAMPLE_PLAN.replace('\n', '\r\n'),
+    "DAY 1 - Arrival\n**Check-in:** hotel\n\nDAY 2 - Beach\n**Morning**\n- swim\n\nTIPS:\n- Tip: book early",
+    "| A | B |\n|---|---|\n| 1 | 2 |\nMorning:\n- x\nDay 1\n| A | B |\n|---|---|\n| 1 | 2 |\nDay 2: y\ntext",
+    "Intro\n```\nDay 1 in code\nMorning:\n```\nDay 2\n- a\n```\nx\n```\nDay 3\n| a |\n|---|\nDay 4\nEvening:\n\nDay 5",
+    "~~~\nDay 1\n",
+    "Day 1",
+    "Day 1\n\n\n",
+    "no day headers at all, and no newline at the end",
+    "\n",
+    ""
+]
+
+def chunkings(text, rng):
+    """Ways to cut a plan into streamed pieces: single characters, random sizes and cuts inside '**'"""
+    yield list(text)
+    for _ in range(5):
+        pieces = []
+        position = 0
+        while position < len(text):
+            size = rng.randint(1, 40)
+            pieces.append(text[position:position + size])
+            position += size
+        yield pieces
+    cuts = sorted({index + 1 for index in range(len(text)) if text.startswith('**', index)} | {len(text)})
+    yield [text[start:end] for start, end in zip([0] + cuts, cuts)]
+
+class IncrementalTripFormatterTest(unittest.TestCase):
+    def setUp(self):
+        self.formatter = TripContentFormatter()
+        self.rng = random.Random(0)
+
+    def stream(self, pieces):
+        incremental = IncrementalTripFormatter(self.formatter)
+        events = []
+        for piece in pieces:
+            events += incremental.feed(piece)
+        events += incremental.close()
+        return incremental, events
+
+    def test_matches_render_trip_for_any_chunking(self):
+        for plan in PLANS:
+            rendered = self.formatter.render_trip(plan)
+            expected_days = [
+                day for day in rendered['day_wise_content'] if classify_line(day['title']).kind == 'day'
+            ]
+            for pieces in chunkings(plan, self.rng):
+                with self.subTest(plan=plan[:30], pieces=len(pieces)):
+                    incremental, events = self.stream(pieces)
+                    self.assertEqual(incremental.html(), rendered['formatted_trip_plan'])
+
+                    days = [day for event, day in events if event == 'day']
+                    self.assertEqual([day.pop('day_number') for day in days], list(range(1, len(days) + 1)))
+                    self.assertEqual(days, expected_days)
+
+    def test_matches_format_for_web(self):
+        for plan in PLANS:
+            with self.subTest(plan=plan[:30]):
+                incremental = IncrementalTripFormatter(self.formatter, days=False)
+                events = incremental.feed(plan) + incremental.close()
+                self.assertEqual([event for event, _ in events if event == 'day'], [])
+                self.assertEqual(incremental.html(), self.formatter.format_for_web(plan))
+
+if __name__ == '__main__':
+    unittest.main()
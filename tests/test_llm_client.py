@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GROQ_API_KEY', 'test')
+
+from llm_client import CircuitBreaker, ResilientGroqClient
+
+class HangingCompletions:
+    """Async chat.completions stand-in whose calls never answer"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(3600)
+
+class HangingAsyncClient:
+    def __init__(self):
+        self.chat = type('Chat', (), {})()
+        self.chat.completions = HangingCompletions()
+
+def half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    return breaker
+
+class CancelledProbeTest(unittest.TestCase):
+    def test_cancelled_async_probe_is_released(self):
+        breaker = half_open_breaker()
+        client = ResilientGroqClient(None, async_client=HangingAsyncClient(), breaker=breaker)
+
+        async def cancel_probe():
+            task = asyncio.ensure_future(client.create_async(model='test', messages=[]))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_probe())
+        self.assertEqual(client.async_client.chat.completions.calls, 1)
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertTrue(breaker.allow())
+
+    def test_interrupted_sync_probe_is_released(self):
+        breaker = half_open_breaker()
+        client = ResilientGroqClient(None, breaker=breaker)
+
+        def interrupted(timeout):
+            raise KeyboardInterrupt()
+
+        with self.assertRaises(KeyboardInterrupt):
+            client._call(interrupted)
+        self.assertTrue(breaker.allow())
+
+    def test_probe_still_exclusive_while_running(self):
+        breaker = half_open_breaker()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+if __name__ == '__main__':
+    unittest.main()
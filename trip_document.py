@@ -0,0 +1,198 @@
+import re
+from bs4 import BeautifulSoup
+
+# Day headers as models write them ("Day 3: Old Goa", "**Day 3 -", "### DAY 3"), the one
+# rule the formatter, the PDF, the streaming day events, chunk stitching and plan edits use
+DAY_HEADER_PATTERN = re.compile(r'^(?P<marker>[ \t]*(?:#+[ \t]*)?(?:\*\*)?(?:Day|DAY)[ \t]+)(?P<number>\d+)\b',
+                                re.MULTILINE)
+BULLET_PATTERN = re.compile(r'^[•\-\*\+]\s*')
+NUMBERED_PATTERN = re.compile(r'^(\d+)[\.\)]\s')
+TIME_PATTERN = re.compile(r'^\d{1,2}:\d{2}')
+TIME_OR_COST_PATTERN = re.compile(r'\d{1,2}:\d{2}|₹|\$|€|£')
+BOLD_LINE_PATTERN = re.compile(r'^\*\*[^*]+\*\*:?$')
+MARKDOWN_CHARS_PATTERN = re.compile(r'[#*_`]')
+
+NOTE_KEYWORDS = ('note:', 'tip:', 'important:', 'warning:')
+HIGHLIGHT_KEYWORDS = ('must visit', 'recommended', 'famous for', 'highlight',
+                      'don\'t miss', 'popular', 'attraction', 'landmark')
+
+class Line:
+    """
+    One classified line of a plan.
+
+    `kind` is one of blank, day, heading, bullet, numbered, note, cost or
+    text; `text` is the stripped line (without the marker for bullets and
+    numbered items), `raw` the line as the model wrote it and `markdown` the
+    markdown the web formatter renders for it.
+    """
+
+    __slots__ = ('kind', 'text', 'raw', 'markdown', 'number')
+
+    def __init__(self, kind, text, raw, markdown, number=None):
+        self.kind = kind
+        self.text = text
+        self.raw = raw
+        self.markdown = markdown
+        self.number = number
+
+class Day:
+    """A day of the itinerary: its header line and the lines under it"""
+
+    def __init__(self, number, header):
+        self.number = number
+        self.header = header
+        self.lines = []
+
+    @property
+    def title(self):
+        return self.header.text
+
+class Section:
+    """A top-level section (the untitled preamble first), its own lines and its days"""
+
+    def __init__(self, header=None):
+        self.header = header
+        self.lines = []
+        self.days = []
+
+    @property
+    def title(self):
+        return self.header.text if self.header else ''
+
+class TripDocument:
+    """
+    A plan parsed into sections, days and typed lines.
+
+    `lines` keeps every line in order for renderers that need the flat text
+    (markdown, the day-by-day view); `sections` is the tree.
+    """
+
+    def __init__(self, text, lines, sections, highlights):
+        self.text = text
+        self.lines = lines
+        self.sections = sections
+        self.highlights = highlights
+
+    def days(self):
+        """Every day, in plan order"""
+        return [day for section in self.sections for day in section.days]
+
+    def day_chunks(self):
+        """
+        The lines split at day headers, as the day-by-day view shows them.
+
+        Each chunk runs to the next day header (so the last day carries the
+        sections after it) and the text before the first day is a chunk of
+        its own. Blank lines at either end are dropped; blank chunks are skipped.
+        """
+        chunks = []
+        current = []
+        for line in self.lines:
+            if line.kind == 'day' and current:
+                chunks.append(current)
+                current = []
+            current.append(line)
+        chunks.append(current)
+        return [trimmed for trimmed in (trim_blank_lines(chunk) for chunk in chunks) if trimmed]
+
+    def summary(self, max_length=200):
+        """First line longer than 50 characters once markdown and HTML are removed"""
+        for line in self.lines:
+            text = MARKDOWN_CHARS_PATTERN.sub('', line.raw)
+            if '<' in text or '&' in text:
+                text = BeautifulSoup(text, 'html.parser').get_text()
+            text = text.strip()
+            if len(text) > 50:
+                return text[:max_length] + "..." if len(text) > max_length else text
+        return "Trip plan generated successfully"
+
+def classify_line(raw):
+    """Classify one raw line of plan text into a Line"""
+    line = raw.strip()
+    if not line:
+        return Line('blank', '', raw, '')
+
+    day = DAY_HEADER_PATTERN.match(line)
+    if day:
+        line = line.lstrip('#').strip()
+        return Line('day', line, raw, f"## {line}", int(day.group('number')))
+
+    # Lines ending with a colon are headings, unless the part before it has digits (times, "Step 1:")
+    if line.endswith(':') and not any(char.isdigit() for char in line.split(':')[0]):
+        if not TIME_PATTERN.match(line):
+            return Line('heading', line, raw, f"### {line}")
+
+    # A line that is bold as a whole ("**Morning**") is a heading too, not a '*' bullet
+    if BOLD_LINE_PATTERN.match(line):
+        return Line('heading', line.strip('*: '), raw, f"### {line}")
+
+    if line.startswith(('•', '-', '*', '+')):
+        text = BULLET_PATTERN.sub('', line)
+        return Line('bullet', text, raw, f"- {text}")
+
+    numbered = NUMBERED_PATTERN.match(line)
+    if numbered:
+        return Line('numbered', line[numbered.end():], raw, f"{numbered.group(1)}. {line[numbered.end():]}",
+                    int(numbered.group(1)))
+
+    lowered = line.lower()
+    if any(keyword in lowered for keyword in NOTE_KEYWORDS):
+        return Line('note', line, raw, f"**{line}**")
+
+    if TIME_OR_COST_PATTERN.search(line):
+        return Line('cost', line, raw, f"*{line}*")
+
+    return Line('text', line, raw, line)
+
+def is_section_title(text):
+    """Top-level section headings are written in capitals ("FOOD & DINING:")"""
+    label = text.rstrip(':').strip('*# ')
+    return any(char.isalpha() for char in label) and label == label.upper()
+
+def parse_trip_document(text):
+    """Parse plan text into a TripDocument in a single pass over its lines"""
+    lines = []
+    highlights = []
+    section = Section()
+    sections = [section]
+    day = None
+
+    for raw in (text or '').split('\n'):
+        line = classify_line(raw)
+        lines.append(line)
+
+        if len(highlights) < 5 and line.kind != 'blank' and any(keyword in line.text.lower() for keyword in HIGHLIGHT_KEYWORDS):
+            highlight = MARKDOWN_CHARS_PATTERN.sub('', BULLET_PATTERN.sub('', line.raw.strip()))
+            if len(highlight) > 20:
+                highlights.append(highlight)
+
+        if line.kind == 'day':
+            day = Day(line.number, line)
+            section.days.append(day)
+            continue
+        if line.kind == 'heading' and (day is None or is_section_title(line.text)):
+            section = Section(line)
+            sections.append(section)
+            day = None
+            continue
+        (day.lines if day is not None else section.lines).append(line)
+
+    return TripDocument(text or '', lines, sections, highlights)
+
+def as_document(content):
+    """A TripDocument for plan text, or the document itself when already parsed"""
+    return content if isinstance(content, TripDocument) else parse_trip_document(content)
+
+def trim_blank_lines(lines):
+    """Lines without the blank lines at either end"""
+    start = 0
+    end = len(lines)
+    while start < end and lines[start].kind == 'blank':
+        start += 1
+    while end > start and lines[end - 1].kind == 'blank':
+        end -= 1
+    return lines[start:end]
+
+def lines_markdown(lines):
+    """Markdown source the web formatter renders for a run of lines"""
+    return '\n'.join(line.markdown for line in lines)
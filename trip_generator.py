@@ -0,0 +1,621 @@
+import asyncio
+import re
+import threading
+import time
+from datetime import datetime
+from groq import BadRequestError
+from config import Config
+from prompt import (get_trip_plan_prompt, get_trip_section_prompt, get_destination_section_prompt,
+                    get_itinerary_outline_prompt, get_itinerary_chunk_prompt, get_destination_info_prompt,
+                    get_activity_recommendations_prompt, get_budget_optimization_prompt,
+                    get_structured_trip_plan_prompt, TRIP_PLAN_SECTIONS)
+from plan_schema import parse_structured_plan, render_plan_text, plan_json_schema
+from plan_cache import (plan_cache, plan_cache_key, normalize_place, destination_cache, destination_cache_key,
+                        insights_cache, insight_cache_key, normalize_list, duration_bucket, budget_bucket_range)
+from single_flight import SingleFlight
+from model_router import model_router
+from llm_client import llm_client, run_async, CircuitOpenError
+from deadline import DeadlineExceededError, ClientDisconnectedError, current_deadline
+from content_formatter import IncrementalTripFormatter
+from trip_document import DAY_HEADER_PATTERN
+
+# Counters for how often completions hit max_tokens and how they were recovered
+generation_stats = {
+    'completions': 0,
+    'truncated': 0,
+    'continuations': 0,
+    'continuation_cap_reached': 0,
+    'continuation_failures': 0,
+    'full_retries': 0,
+    'structured_plans': 0,
+    'structured_invalid': 0,
+    'structured_fallbacks': 0,
+    'client_disconnects': 0,
+    'deadlines_exceeded': 0,
+    'streams_cut_off': 0
+}
+_stats_lock = threading.Lock()
+
+CONTINUATION_PROMPT = (
+    "Your previous answer was cut off. Continue the travel plan from exactly where it stops{resume_hint}. "
+    "Do not repeat anything already written and do not add an introduction; keep the same format."
+)
+
+# JSON keys and quoting make a structured plan this much longer than the same plan as text
+STRUCTURED_OUTPUT_OVERHEAD = 1.4
+
+# Typical output size of the destination info, activities and budget optimization answers
+INSIGHT_ESTIMATED_TOKENS = 1500
+
+# Identical generations already in flight are shared instead of repeated
+plan_flight = SingleFlight()
+
+# Currency symbols
+CURRENCY_SYMBOLS = {
+    "USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥",
+    "AUD": "A$", "CAD": "C$", "INR": "₹", "CNY": "¥"
+}
+
+OUTLINE_LINE_PATTERN = re.compile(r'Days?\s+(\d+)\s*(?:-|–|to)\s*(\d+)\s*:\s*(.+)', re.IGNORECASE)
+
+def parse_trip_request(data, allow_past=False):
+    """Validate submitted trip form data and return generation arguments
+
+    Raises ValueError with a user-facing message when the data is invalid.
+    Past start dates are only accepted with `allow_past` (batch runs).
+    """
+    required_fields = ['start_location', 'destination', 'start_date', 'end_date']
+    for field in required_fields:
+        if not data.get(field):
+            raise ValueError(f'{field} is required')
+
+    try:
+        start_date = datetime.strptime(data.get('start_date'), '%Y-%m-%d').date()
+        end_date = datetime.strptime(data.get('end_date'), '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        raise ValueError('Invalid date format')
+
+    if end_date <= start_date:
+        raise ValueError('End date must be after start date')
+
+    if start_date < datetime.now().date() and not allow_past:
+        raise ValueError('Start date cannot be in the past')
+
+    num_days = (end_date - start_date).days + 1
+    if num_days > 30:
+        raise ValueError('Trip duration cannot exceed 30 days')
+
+    # Handle empty budget_amount safely
+    try:
+        budget_amount = float(data.get('budget_amount') or 0)
+    except (ValueError, TypeError):
+        budget_amount = 0.0
+
+    currency = data.get('currency') or 'INR'
+
+    return {
+        'start_location': data.get('start_location').strip(),
+        'destination': data.get('destination').strip(),
+        'num_days': num_days,
+        'start_date': start_date,
+        'end_date': end_date,
+        'budget': {
+            "amount": budget_amount,
+            "currency": currency,
+            "symbol": CURRENCY_SYMBOLS.get(currency, "$")
+        }
+    }
+
+def get_trip_plan(start_location, destination, num_days, start_date, end_date, budget=None, deadline=None):
+    """Get a trip plan's text from the plan cache, generating it on a miss"""
+    return get_trip_plan_result(start_location, destination, num_days, start_date, end_date, budget, deadline)['trip_plan']
+
+def get_trip_plan_result(start_location, destination, num_days, start_date, end_date, budget=None, deadline=None):
+    """
+    Get {'trip_plan': text, 'structured_plan': dict or None} from the plan cache, generating it on a miss.
+
+    A Deadline bounds the generation and abandons it when the client leaves,
+    unless other callers are waiting on the same in-flight generation.
+    """
+    cache_key = plan_cache_key(start_location, destination, num_days, start_date, budget)
+    if Config.PLAN_CACHE_ENABLED:
+        cached_plan = plan_cache.get(cache_key)
+        if cached_plan is not None:
+            return plan_result(cached_plan)
+
+    flight_key = plan_request_key(start_location, destination, num_days, start_date, end_date, budget)
+
+    def generate():
+        shared_deadline = deadline.also_alive_while(lambda: plan_flight.waiting(flight_key) > 0) if deadline else None
+        result = generate_trip_plan_result(start_location, destination, num_days, start_date, end_date, budget,
+                                           shared_deadline)
+        store_plan_result(cache_key, result)
+        return result
+
+    return plan_flight.do(flight_key, generate, deadline.remaining() if deadline else None)
+
+def store_plan_result(cache_key, result):
+    """Put a generated plan in the plan cache (text-only plans as plain strings); errors are not cached"""
+    if Config.PLAN_CACHE_ENABLED and not result['trip_plan'].startswith("Error"):
+        plan_cache.set(cache_key, result if result['structured_plan'] else result['trip_plan'])
+
+def plan_result(cached_plan):
+    """Normalize a plan cache value: text-only plans are cached as plain strings"""
+    if isinstance(cached_plan, str):
+        return {'trip_plan': cached_plan, 'structured_plan': None}
+    return cached_plan
+
+def plan_request_key(start_location, destination, num_days, start_date, end_date, budget=None):
+    """Key identifying requests that produce the exact same prompt"""
+    budget = budget or {}
+    return (
+        normalize_place(start_location),
+        normalize_place(destination),
+        num_days,
+        str(start_date),
+        str(end_date),
+        float(budget.get('amount') or 0),
+        budget.get('currency', '')
+    )
+
+def get_destination_info(destination):
+    """Destination guide text as (text, cache_status), served stale-while-revalidate"""
+    cache_key = insight_cache_key('destination_info', destination)
+    prompt = get_destination_info_prompt(destination)
+    return insights_cache.get_or_compute(
+        cache_key, lambda: create_completion(prompt, model_router.route(INSIGHT_ESTIMATED_TOKENS))
+    )
+
+def get_activity_recommendations(destination, interests, duration):
+    """Activity recommendations as (text, cache_status), shared by trips in the same duration bucket"""
+    interests = normalize_list(interests)
+    cache_key = insight_cache_key('activities', destination, interests, duration)
+    # One answer serves the whole bucket, so ask for the bucket's day range
+    prompt = get_activity_recommendations_prompt(destination, interests, duration_bucket(duration))
+    return insights_cache.get_or_compute(
+        cache_key, lambda: create_completion(prompt, model_router.route(INSIGHT_ESTIMATED_TOKENS))
+    )
+
+def get_budget_optimization(destination, budget, duration, priorities):
+    """Budget optimization advice as (text, cache_status), shared by similar budgets and durations"""
+    priorities = normalize_list(priorities)
+    cache_key = insight_cache_key('budget_optimization', destination, priorities, duration, budget)
+    # One answer serves the whole bucket, so ask for the bucket's per-day range rather than this budget
+    daily_range = budget_bucket_range(budget, duration)
+    prompt = get_budget_optimization_prompt(destination, budget, daily_range, duration_bucket(duration), ', '.join(priorities) or 'balanced')
+    return insights_cache.get_or_compute(
+        cache_key, lambda: create_completion(prompt, model_router.route(INSIGHT_ESTIMATED_TOKENS))
+    )
+
+def generate_trip_plan_result(start_location, destination, num_days, start_date, end_date, budget=None, deadline=None):
+    """Generate a plan as {'trip_plan': text, 'structured_plan': dict or None} (blocking)"""
+    return _run_generation(
+        generate_trip_plan_result_async(start_location, destination, num_days, start_date, end_date, budget), deadline
+    )
+
+async def generate_trip_plan_result_async(start_location, destination, num_days, start_date, end_date, budget=None):
+    """
+    Generate a plan as {'trip_plan': text, 'structured_plan': dict or None}.
+
+    In 'structured' mode the plan is generated as schema-checked JSON and the
+    text is rendered from it. Long trips, whose JSON can't be resumed after a
+    max_tokens cut-off the way chunked text can, and replies that fail
+    validation twice fall back to the text engines.
+    """
+    if Config.GENERATION_MODE == 'structured' and num_days <= Config.LONG_TRIP_DAYS:
+        try:
+            structured_plan = await generate_structured_trip_plan_async(start_location, destination, num_days, start_date, end_date, budget)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            print(f"❌ Structured generation failed, falling back to text: {e}")
+            structured_plan = None
+
+        if structured_plan is not None:
+            return {'trip_plan': render_plan_text(structured_plan), 'structured_plan': structured_plan.model_dump()}
+        _record('structured_fallbacks')
+
+    trip_plan = await generate_trip_plan_async(start_location, destination, num_days, start_date, end_date, budget)
+    return {'trip_plan': trip_plan, 'structured_plan': None}
+
+async def generate_structured_trip_plan_async(start_location, destination, num_days, start_date, end_date, budget=None):
+    """Generate the plan in JSON mode as a TripPlanDocument; None if two replies fail validation"""
+    prompt = get_structured_trip_plan_prompt(start_location, destination, num_days, start_date, end_date,
+                                             plan_json_schema(), budget)
+    route = model_router.route(int(model_router.estimate_tokens(num_days) * STRUCTURED_OUTPUT_OVERHEAD))
+
+    for attempt in range(2):
+        try:
+            plan = parse_structured_plan(await create_json_completion_async(prompt, route))
+        except (ValueError, BadRequestError) as e:
+            # Groq rejects JSON mode output that isn't valid JSON with a 400
+            _record('structured_invalid')
+            print(f"❌ Structured plan rejected (attempt {attempt + 1}): {e}")
+            continue
+
+        plan.currency_symbol = (budget or {}).get('symbol', '')
+        _record('structured_plans')
+        return plan
+    return None
+
+def generate_trip_plan(start_location, destination, num_days, start_date, end_date, budget=None, deadline=None):
+    """Generate a trip plan using Llama model through Groq API"""
+    return _run_generation(
+        generate_trip_plan_async(start_location, destination, num_days, start_date, end_date, budget), deadline
+    )
+
+async def generate_trip_plan_async(start_location, destination, num_days, start_date, end_date, budget=None):
+    """Generate a trip plan's text on the event loop (errors come back as an "Error ..." string)"""
+    # Long trips always go through the sectioned engine so the itinerary can be chunked; the
+    # destination cache only applies there and never switches single mode plans to it
+    if Config.GENERATION_MODE == 'sections' or num_days > Config.LONG_TRIP_DAYS:
+        return await generate_sectioned_trip_plan_async(start_location, destination, num_days, start_date, end_date, budget)
+
+    prompt = get_trip_plan_prompt(start_location, destination, num_days, start_date, end_date, budget)
+
+    try:
+        return await create_completion_async(prompt, model_router.route_plan(num_days))
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        return f"Error generating trip plan: {str(e)}"
+
+async def generate_sectioned_trip_plan_async(start_location, destination, num_days, start_date, end_date, budget=None):
+    """
+    Generate the plan section by section, running the section prompts concurrently.
+
+    Each section is routed on its own size, so latency is bound by the slowest
+    section instead of the whole plan. Destination-only sections come from the
+    destination cache when possible, so repeat destinations only generate the
+    date- and origin-specific parts. The sections are merged in canonical
+    order under "TITLE:" headings, which both TripContentFormatter and the PDF
+    generator already treat as section headers.
+    """
+    try:
+        section_texts = await generate_sections_async(
+            start_location, destination, num_days, start_date, end_date, budget
+        )
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        return f"Error generating trip plan: {str(e)}"
+
+    return merge_sections(zip(TRIP_PLAN_SECTIONS, section_texts))
+
+async def generate_sections_async(start_location, destination, num_days, start_date, end_date, budget=None):
+    """Generate the text of every section in TRIP_PLAN_SECTIONS order, at most SECTION_PARALLELISM at a time"""
+    semaphore = asyncio.Semaphore(Config.SECTION_PARALLELISM)
+
+    async def generate_section(section):
+        if section.get('destination_only') and Config.DESTINATION_CACHE_ENABLED:
+            async with semaphore:
+                return await destination_section_async(section, destination)
+        if section['key'] == 'itinerary' and num_days > Config.LONG_TRIP_DAYS:
+            return await generate_chunked_itinerary_async(start_location, destination, num_days, start_date, end_date, budget)
+        prompt = get_trip_section_prompt(section, start_location, destination, num_days, start_date, end_date, budget)
+        async with semaphore:
+            return await create_completion_async(prompt, model_router.route_plan(num_days, [section['key']]))
+
+    return await asyncio.gather(*(generate_section(section) for section in TRIP_PLAN_SECTIONS))
+
+async def destination_section_async(section, destination):
+    """Text of a destination-only section, from the destination cache or freshly generated"""
+    cache_key = destination_cache_key(destination, section['key'])
+    cached_text = destination_cache.get(cache_key)
+    if cached_text is not None:
+        return cached_text
+
+    prompt = get_destination_section_prompt(section, destination)
+    text = await create_completion_async(prompt, model_router.route_plan(0, [section['key']]))
+    if text and text.strip():
+        destination_cache.set(cache_key, text)
+    return text
+
+async def generate_chunked_itinerary_async(start_location, destination, num_days, start_date, end_date, budget=None):
+    """
+    Generate a long itinerary as concurrent day-range chunks.
+
+    A short outline call first fixes the accommodation base and focus of each
+    range; every chunk then gets the same context header plus the outline, so
+    the ranges can be written independently. Wall-clock time is roughly the
+    outline plus one chunk, whatever the trip length.
+    """
+    ranges = day_ranges(num_days, Config.ITINERARY_CHUNK_DAYS)
+
+    outline_prompt = get_itinerary_outline_prompt(start_location, destination, num_days, start_date, end_date, ranges, budget)
+    outline = await create_completion_async(outline_prompt, model_router.route(60 * len(ranges) + 100))
+    route_outline = parse_route_outline(outline, ranges)
+    semaphore = asyncio.Semaphore(Config.SECTION_PARALLELISM)
+
+    async def generate_chunk(day_range):
+        first_day, last_day = day_range
+        prompt = get_itinerary_chunk_prompt(start_location, destination, num_days, start_date, end_date,
+                                            first_day, last_day, route_outline, budget)
+        async with semaphore:
+            return await create_completion_async(prompt, model_router.route_plan(last_day - first_day + 1, ['itinerary']))
+
+    chunks = await asyncio.gather(*(generate_chunk(day_range) for day_range in ranges))
+    return stitch_itinerary(chunks)
+
+def day_ranges(num_days, chunk_days):
+    """Split 1..num_days into consecutive (first, last) ranges of at most chunk_days"""
+    return [(first, min(first + chunk_days - 1, num_days)) for first in range(1, num_days + 1, chunk_days)]
+
+def parse_route_outline(text, ranges):
+    """Normalize the outline reply to one 'Days A-B: ...' line per range"""
+    parsed = {}
+    for match in OUTLINE_LINE_PATTERN.finditer(text or ''):
+        parsed[(int(match.group(1)), int(match.group(2)))] = match.group(3).strip()
+
+    return '\n'.join(
+        f"Days {first}-{last}: {parsed.get((first, last), 'continue exploring the destination')}"
+        for first, last in ranges
+    )
+
+def stitch_itinerary(chunks):
+    """Join itinerary chunks, renumbering day headers so numbering is continuous"""
+    day_number = 0
+
+    def renumber(match):
+        nonlocal day_number
+        day_number += 1
+        return f"{match.group('marker')}{day_number}"
+
+    return '\n\n'.join(DAY_HEADER_PATTERN.sub(renumber, chunk.strip()) for chunk in chunks if chunk)
+
+def merge_sections(sections):
+    """Join (section, text) pairs into a single plan in the usual text shape"""
+    blocks = []
+    for section, text in sections:
+        text = (text or '').strip()
+        if text:
+            blocks.append(f"{section['title']}:\n\n{text}")
+    return '\n\n'.join(blocks)
+
+def create_completion(prompt, route, deadline=None):
+    """Run a chat completion on a model route and return its text (blocking)"""
+    return _run_generation(create_completion_async(prompt, route), deadline)
+
+def create_json_completion(prompt, route, deadline=None):
+    """Run a JSON mode chat completion on a model route and return the JSON text (blocking)"""
+    return _run_generation(create_json_completion_async(prompt, route), deadline)
+
+async def create_json_completion_async(prompt, route):
+    """Run a JSON mode chat completion on a model route and return the JSON text"""
+    messages = [{"role": "user", "content": prompt}]
+    response = await _create_chat_completion(messages, route, response_format={"type": "json_object"})
+    return response.choices[0].message.content
+
+async def create_completion_async(prompt, route):
+    """
+    Run a chat completion on a model route and return its text.
+
+    Completions cut off by max_tokens (finish_reason 'length') are resumed
+    from the last complete block with up to MAX_CONTINUATIONS follow-up
+    requests. The whole completion is retried only if a continuation fails.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    choice = (await _create_chat_completion(messages, route)).choices[0]
+    text = choice.message.content or ''
+    if choice.finish_reason != 'length':
+        return text
+
+    _record('truncated')
+    try:
+        return await continue_completion(prompt, text, route)
+    except Exception as e:
+        print(f"❌ Continuation failed, retrying full completion: {e}")
+        _record('continuation_failures')
+        _record('full_retries')
+        return (await _create_chat_completion(messages, route)).choices[0].message.content
+
+async def continue_completion(prompt, text, route):
+    """Extend a length-truncated completion until it finishes or the continuation cap is hit"""
+    for _ in range(Config.MAX_CONTINUATIONS):
+        text = trim_to_complete_block(text)
+        _record('continuations')
+
+        choice = (await _create_chat_completion(continuation_messages(prompt, text), route)).choices[0]
+        text = f"{text}\n\n{(choice.message.content or '').lstrip()}"
+        if choice.finish_reason != 'length':
+            return text
+
+    _record('continuation_cap_reached')
+    return text
+
+def continuation_messages(prompt, text, resume_exactly=False):
+    """Messages asking the model to carry on from the end of a partial answer"""
+    if resume_exactly:
+        resume_hint = ", mid-sentence if necessary"
+    else:
+        last_line = text.strip().splitlines()[-1] if text.strip() else ''
+        resume_hint = f', starting with the line after "{last_line[:120]}"' if last_line else ''
+
+    return [
+        {"role": "user", "content": prompt},
+        {"role": "assistant", "content": text},
+        {"role": "user", "content": CONTINUATION_PROMPT.format(resume_hint=resume_hint)}
+    ]
+
+def trim_to_complete_block(text):
+    """Drop the unfinished tail of a truncated answer (back to the last blank line or full line)"""
+    text = text.rstrip()
+    cut = text.rfind('\n\n')
+    if cut < len(text) // 2:
+        # No paragraph break in the second half: only drop the partial last line
+        cut = text.rfind('\n')
+    return text[:cut].rstrip() if cut > 0 else text
+
+def get_generation_stats():
+    """Get completion and truncation counters"""
+    with _stats_lock:
+        return dict(generation_stats)
+
+def _record(name, count=1):
+    with _stats_lock:
+        generation_stats[name] += count
+
+def _run_generation(coro, deadline):
+    """run_async, counting requests abandoned by their client or cut off by their deadline"""
+    try:
+        return run_async(coro, deadline)
+    except ClientDisconnectedError:
+        _record('client_disconnects')
+        raise
+    except DeadlineExceededError:
+        _record('deadlines_exceeded')
+        raise
+
+def _deadline_at(deadline):
+    """Absolute monotonic deadline for a Groq call, or None for the client's default timeout"""
+    return deadline.at if deadline is not None else None
+
+async def _create_chat_completion(messages, route, **options):
+    _record('completions')
+    started = time.monotonic()
+    try:
+        response = await llm_client.create_async(
+            deadline=_deadline_at(current_deadline.get()),
+            messages=messages,
+            model=route['model'],
+            temperature=0.7,
+            max_tokens=route['max_tokens'],
+            **options
+        )
+    except Exception:
+        model_router.record(route, time.monotonic() - started, error=True)
+        raise
+
+    usage = getattr(response, 'usage', None)
+    model_router.record(
+        route,
+        time.monotonic() - started,
+        completion_tokens=getattr(usage, 'completion_tokens', 0),
+        prompt_tokens=getattr(usage, 'prompt_tokens', 0),
+        finish_reason=response.choices[0].finish_reason
+    )
+    return response
+
+def _stream_chat_completion(messages, route, result, deadline=None):
+    """Yield text deltas from a streaming completion; result['finish_reason'] is set at the end"""
+    _record('completions')
+    started = time.monotonic()
+    try:
+        stream = llm_client.stream(
+            deadline=_deadline_at(deadline),
+            messages=messages,
+            model=route['model'],
+            temperature=0.7,
+            max_tokens=route['max_tokens']
+        )
+    except Exception:
+        model_router.record(route, time.monotonic() - started, error=True)
+        raise
+
+    chars = 0
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.delta.content:
+                chars += len(choice.delta.content)
+                yield choice.delta.content
+            if choice.finish_reason:
+                result['finish_reason'] = choice.finish_reason
+            if deadline is not None:
+                deadline.check('the plan finished streaming')
+    finally:
+        # Closing the stream also aborts the upstream request if the consumer stops early
+        stream.close()
+        # Streamed chunks carry no usage, so approximate tokens as ~4 characters each
+        model_router.record(route, time.monotonic() - started, completion_tokens=chars // 4,
+                            finish_reason=result.get('finish_reason'))
+
+def stream_trip_plan(start_location, destination, num_days, start_date, end_date, budget=None, deadline=None):
+    """Yield trip plan text as it arrives from the Groq streaming API"""
+    cache_key = plan_cache_key(start_location, destination, num_days, start_date, budget)
+    if Config.PLAN_CACHE_ENABLED:
+        cached_plan = plan_cache.get(cache_key)
+        if cached_plan is not None:
+            # Replay line by line so day events still fire for cached plans
+            yield from plan_result(cached_plan)['trip_plan'].splitlines(keepends=True)
+            return
+
+    prompt = get_trip_plan_prompt(start_location, destination, num_days, start_date, end_date, budget)
+    messages = [{"role": "user", "content": prompt}]
+    route = model_router.route_plan(num_days)
+
+    parts = []
+    finished = False
+    for attempt in range(Config.MAX_CONTINUATIONS + 1):
+        result = {}
+        for text in _stream_chat_completion(messages, route, result, deadline):
+            parts.append(text)
+            yield text
+
+        if result.get('finish_reason') is None:
+            # A stream that ended without a finish reason was cut off, not finished
+            _record('streams_cut_off')
+            raise Exception("The plan stream closed before the plan was finished")
+
+        if result.get('finish_reason') != 'length':
+            finished = True
+            break
+
+        if attempt == 0:
+            _record('truncated')
+        if attempt == Config.MAX_CONTINUATIONS:
+            _record('continuation_cap_reached')
+            break
+
+        # Text already sent can't be trimmed, so resume from the exact cut-off point
+        _record('continuations')
+        messages = continuation_messages(prompt, ''.join(parts), resume_exactly=True)
+
+    # Only plans that streamed to the end are cached, never ones cut off at the continuation cap
+    if finished and Config.PLAN_CACHE_ENABLED:
+        plan_cache.set(cache_key, ''.join(parts))
+
+def stream_trip_events(formatter, start_location, destination, num_days, start_date, end_date, budget=None,
+                       prefetched=None, deadline=None):
+    """
+    Stream a trip plan as (event, data) pairs.
+
+    Emits a 'token' event for every text delta, a 'block' event with the
+    HTML of every block of the plan as soon as it is complete (the next day
+    or section header has arrived), a 'day' event with the formatted day
+    once a day is complete, and a final 'complete' event with the full plan
+    text. A Groq stream that closes before the plan is finished raises
+    instead of completing. A `prefetched` plan ({'trip_plan', 'structured_plan'}) is replayed
+    instead of calling Groq.
+
+    Closing the generator (the server does when the client disconnects)
+    closes the Groq stream, which aborts the upstream request.
+    """
+    parts = []
+    # Formats each block once as it completes, never the whole buffer again
+    incremental = IncrementalTripFormatter(formatter)
+
+    if prefetched is not None:
+        chunks = prefetched['trip_plan'].splitlines(keepends=True)
+    else:
+        chunks = stream_trip_plan(start_location, destination, num_days, start_date, end_date, budget, deadline)
+
+    try:
+        for text in chunks:
+            parts.append(text)
+            yield 'token', {'text': text}
+            yield from incremental.feed(text)
+    except GeneratorExit:
+        _record('client_disconnects')
+        raise
+    except DeadlineExceededError:
+        _record('deadlines_exceeded')
+        raise
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+    yield from incremental.close()
+    yield 'complete', {'trip_plan': ''.join(parts), 'structured_plan': (prefetched or {}).get('structured_plan')}
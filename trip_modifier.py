@@ -0,0 +1,256 @@
+import re
+from prompt import get_plan_modification_prompt, TRIP_PLAN_SECTIONS
+from plan_schema import load_structured_plan, parse_plan_patch, plan_json_schema, render_plan_text, day_title, PlanPatch
+from model_router import model_router
+from trip_generator import create_completion, create_json_completion, STRUCTURED_OUTPUT_OVERHEAD
+from trip_document import DAY_HEADER_PATTERN
+
+DAY_SCOPE_PATTERN = re.compile(r'\bdays?\s+\d+(?:\s*(?:-|–|to|and|&)\s*\d+)?', re.IGNORECASE)
+DAY_RANGE_PATTERN = re.compile(r'(\d+)(?:\s*(?:-|–|to)\s*(\d+))?')
+HEADING_CLEAN_PATTERN = re.compile(r'[^a-z&]+')
+
+EDITABLE_SECTION_KEYS = [section['key'] for section in TRIP_PLAN_SECTIONS if section['key'] != 'itinerary']
+
+# Words in a change request that point at a section
+SECTION_KEYWORDS = {
+    'overview': ['overview', 'highlights'],
+    'transportation': ['transport', 'flight', 'train', 'bus', 'taxi', 'car rental'],
+    'accommodation': ['accommodation', 'hotel', 'hostel', 'resort', 'homestay'],
+    'food': ['food', 'restaurant', 'dining', 'cuisine', 'vegetarian', 'vegan'],
+    'practical': ['visa', 'currency', 'safety', 'emergency', 'practical'],
+    'budget': ['budget', 'cheaper', 'expensive'],
+    'tips': ['tips', 'hidden gems', 'insider'],
+    'packing': ['packing', 'pack ', 'luggage', 'clothes'],
+    'alternatives': ['alternative', 'rain', 'bad weather', 'backup']
+}
+
+def normalize_heading(line):
+    """'## 1. **Food & Dining:**' -> 'food & dining'"""
+    return HEADING_CLEAN_PATTERN.sub(' ', line.lower()).strip()
+
+SECTION_HEADINGS = {normalize_heading(section['title']): section['key'] for section in TRIP_PLAN_SECTIONS}
+
+def parse_day_scope(value, num_days):
+    """Day numbers from '2, 4-5' style input (or a list), limited to 1..num_days"""
+    if isinstance(value, (list, tuple)):
+        value = ','.join(str(item) for item in value)
+
+    days = set()
+    for match in DAY_RANGE_PATTERN.finditer(value or ''):
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        days.update(range(min(first, last), max(first, last) + 1))
+    return sorted(day for day in days if 1 <= day <= num_days)
+
+def parse_section_scope(value):
+    """Editable section keys from a list or comma-separated string"""
+    if isinstance(value, str):
+        value = value.split(',')
+    keys = {str(key).strip().lower() for key in value or []}
+    return [key for key in EDITABLE_SECTION_KEYS if key in keys]
+
+def infer_scope(change_request, num_days):
+    """(days, sections) a free-text change request mentions ("make day 3 cheaper", "vegetarian food")"""
+    text = (change_request or '').lower()
+    days = parse_day_scope(' '.join(DAY_SCOPE_PATTERN.findall(text)), num_days)
+    sections = [
+        key for key in EDITABLE_SECTION_KEYS
+        if any(re.search(r'\b' + re.escape(keyword), text) for keyword in SECTION_KEYWORDS[key])
+    ]
+    return days, sections
+
+def resolve_scope(days, sections, change_request, num_days):
+    """Explicit days/sections from the form, else whatever the change request mentions"""
+    days = parse_day_scope(days, num_days)
+    sections = parse_section_scope(sections)
+    if days or sections:
+        return days, sections
+    return infer_scope(change_request, num_days)
+
+def modification_tokens(days, sections):
+    """Estimated output tokens for rewriting the given days and sections"""
+    return model_router.estimate_tokens(len(days), (['itinerary'] if days else []) + list(sections))
+
+def locate_plan_parts(text):
+    """
+    Find the day and section blocks of a text plan.
+
+    Returns {'days': {day_number: (start, end)}, 'sections': {key: (start, end)}}
+    as character offsets. A section runs to the next section heading; a day
+    runs to the next day header or section heading. Only day headers inside
+    the itinerary count when the plan has an itinerary heading.
+    """
+    headings = []
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        key = SECTION_HEADINGS.get(normalize_heading(line))
+        day = DAY_HEADER_PATTERN.match(line)
+        if key:
+            headings.append((offset, 'sections', key))
+        elif day:
+            headings.append((offset, 'days', int(day.group('number'))))
+        offset += len(line)
+
+    parts = {'days': {}, 'sections': {}}
+    section_starts = [start for start, kind, _ in headings if kind == 'sections']
+    for index, (start, kind, ident) in enumerate(headings):
+        if kind == 'sections':
+            end = next((later for later in section_starts if later > start), len(text))
+        else:
+            end = headings[index + 1][0] if index + 1 < len(headings) else len(text)
+        parts[kind].setdefault(ident, (start, end))
+
+    itinerary = parts['sections'].get('itinerary')
+    if itinerary:
+        parts['days'] = {
+            day: span for day, span in parts['days'].items()
+            if itinerary[0] <= span[0] < itinerary[1]
+        }
+    return parts
+
+def splice_blocks(text, replacements):
+    """Replace (start, end, new_text) spans of text; spans must not overlap, and a start == end span inserts there"""
+    for start, end, new_text in sorted(replacements, reverse=True):
+        head = text[:start]
+        if start == end and head.strip():
+            head = head.rstrip('\n') + '\n\n'
+        tail = text[end:]
+        separator = '\n\n' if tail.strip() else '\n'
+        text = head + new_text.strip() + separator + tail.lstrip('\n')
+    return text
+
+def day_insert_offset(parts, day, text_length):
+    """Where a day the plan is missing goes: before the next day, after the last day, or at the end of the itinerary"""
+    later = [span[0] for number, span in parts['days'].items() if number > day]
+    if later:
+        return min(later)
+    if parts['days']:
+        return max(span[1] for span in parts['days'].values())
+    itinerary = parts['sections'].get('itinerary')
+    return itinerary[1] if itinerary else text_length
+
+def modify_trip_plan(trip, change_request, days, sections, deadline=None):
+    """
+    Rewrite only the given days and sections of a stored trip.
+
+    The model gets the parts being rewritten plus a one-line-per-day outline
+    of the rest, not the whole plan, so an edit costs a fraction of a full
+    generation. Returns {'trip_plan', 'structured_plan', 'changed_days',
+    'changed_sections'}; a Deadline bounds the model call.
+    """
+    estimated_tokens = modification_tokens(days, sections)
+    prompt_args = {
+        'start_location': trip['start_location'],
+        'destination': trip['destination'],
+        'num_days': trip['duration'],
+        'start_date': trip['start_date'],
+        'end_date': trip['end_date'],
+        'change_request': change_request,
+        'budget': trip.get('budget')
+    }
+
+    plan = load_structured_plan(trip.get('structured_plan'))
+    if plan is not None:
+        return _modify_structured_plan(plan, prompt_args, days, sections, estimated_tokens, deadline)
+    return _modify_text_plan(trip['trip_plan'], prompt_args, days, sections, estimated_tokens, deadline)
+
+def _modify_text_plan(text, prompt_args, days, sections, estimated_tokens, deadline):
+    parts = locate_plan_parts(text)
+
+    current_parts = []
+    for day in days:
+        span = parts['days'].get(day)
+        current_parts.append(text[span[0]:span[1]].strip() if span else f"Day {day}: (missing from the plan, write it)")
+    for key in sections:
+        span = parts['sections'].get(key)
+        title = _section_title(key)
+        current_parts.append(text[span[0]:span[1]].strip() if span else f"{title}: (missing from the plan, write it)")
+
+    outline = [_first_line(text, parts['days'][day]) for day in sorted(parts['days'])]
+    outline.append('Sections: ' + ', '.join(_section_title(key) for key in parts['sections']))
+
+    prompt = get_plan_modification_prompt(outline='\n'.join(outline), current_parts='\n\n'.join(current_parts), **prompt_args)
+    reply = create_completion(prompt, model_router.route(estimated_tokens), deadline)
+    new_parts = locate_plan_parts(reply)
+
+    replacements = []
+    appended = []
+    changed_days = []
+    inserted_days = {}
+    for day in days:
+        if day not in new_parts['days']:
+            continue
+        start, end = new_parts['days'][day]
+        if day in parts['days']:
+            replacements.append(parts['days'][day] + (reply[start:end],))
+        else:
+            # Days the plan was missing are written into the itinerary in day order
+            offset = day_insert_offset(parts, day, len(text))
+            inserted_days.setdefault(offset, []).append(reply[start:end].strip())
+        changed_days.append(day)
+    for offset, blocks in inserted_days.items():
+        replacements.append((offset, offset, '\n\n'.join(blocks)))
+
+    changed_sections = []
+    for key in sections:
+        if key not in new_parts['sections']:
+            continue
+        start, end = new_parts['sections'][key]
+        if key in parts['sections']:
+            replacements.append(parts['sections'][key] + (reply[start:end],))
+        else:
+            appended.append(reply[start:end].strip())
+        changed_sections.append(key)
+
+    new_text = splice_blocks(text, replacements)
+    if appended:
+        new_text = '\n\n'.join([new_text.rstrip()] + appended)
+
+    return {
+        'trip_plan': new_text,
+        'structured_plan': None,
+        'changed_days': changed_days,
+        'changed_sections': changed_sections
+    }
+
+def _modify_structured_plan(plan, prompt_args, days, sections, estimated_tokens, deadline):
+    current = PlanPatch(
+        days=[day for day in plan.days if day.day_number in days],
+        sections=[section for section in plan.sections if section.key in sections]
+    )
+    missing = [key for key in sections if key not in {section.key for section in current.sections}]
+    current_parts = current.model_dump_json()
+    if missing:
+        current_parts += '\nAlso write these missing sections: ' + ', '.join(missing)
+
+    outline = [day_title(day) for day in plan.days]
+    outline.append('Sections: ' + ', '.join(section.title for section in plan.sections))
+
+    prompt = get_plan_modification_prompt(outline='\n'.join(outline), current_parts=current_parts,
+                                          schema=plan_json_schema(PlanPatch), **prompt_args)
+    route = model_router.route(int(estimated_tokens * STRUCTURED_OUTPUT_OVERHEAD))
+    try:
+        patch = parse_plan_patch(create_json_completion(prompt, route, deadline))
+    except ValueError as e:
+        raise Exception(f"The model returned an invalid plan update: {e}")
+
+    new_days = {day.day_number: day for day in patch.days if day.day_number in days}
+    new_sections = {section.key: section for section in patch.sections if section.key in sections}
+    changed_sections = sorted(new_sections, key=EDITABLE_SECTION_KEYS.index)
+
+    plan.days = [new_days.get(day.day_number, day) for day in plan.days]
+    plan.sections = [new_sections.pop(section.key, section) for section in plan.sections] + list(new_sections.values())
+
+    return {
+        'trip_plan': render_plan_text(plan),
+        'structured_plan': plan.model_dump(),
+        'changed_days': sorted(new_days),
+        'changed_sections': changed_sections
+    }
+
+def _section_title(key):
+    return next(section['title'] for section in TRIP_PLAN_SECTIONS if section['key'] == key)
+
+def _first_line(text, span):
+    """Header line of a day block, without markdown, for the outline"""
+    return text[span[0]:span[1]].strip().splitlines()[0].strip('#* ')[:120]
@@ -331,9 +331,13 @@ def create_success_response(data=None, message="Success"):
     
     if data:
         response['data'] = data
-    
+
     return response
 
+def format_sse(event, data):
+    """Format a Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 def truncate_text(text, max_length=100, suffix="..."):
     """Truncate text to specified length"""
     if not text or len(text) <= max_length:
@@ -554,17 +558,41 @@ def get_trip_statistics(trips):
         'total_budget': total_budget
     }
 
+# Destinations featured on the home page
+FEATURED_DESTINATIONS = [
+    {'name': 'Goa', 'image': 'goa.jpg', 'description': 'Beautiful beaches and nightlife'},
+    {'name': 'Kerala', 'image': 'kerala.jpg', 'description': 'God\'s own country'},
+    {'name': 'Rajasthan', 'image': 'rajasthan.jpg', 'description': 'Royal heritage and culture'},
+    {'name': 'Himachal Pradesh', 'image': 'himachal.jpg', 'description': 'Mountains and adventure'}
+]
+
+# Default suggestions for new users
+DEFAULT_TRIP_SUGGESTIONS = [
+    {'destination': 'Goa', 'type': 'Beach', 'duration': '4-5 days'},
+    {'destination': 'Kerala', 'type': 'Backwaters', 'duration': '6-7 days'},
+    {'destination': 'Rajasthan', 'type': 'Heritage', 'duration': '8-10 days'},
+    {'destination': 'Himachal Pradesh', 'type': 'Mountains', 'duration': '5-6 days'},
+    {'destination': 'Thailand', 'type': 'International', 'duration': '7-8 days'}
+]
+
+# Suggestions by the user's usual trip length
+SHORT_TRIP_SUGGESTIONS = [
+    {'destination': 'Pondicherry', 'type': 'Weekend Getaway', 'duration': '2-3 days'},
+    {'destination': 'Lonavala', 'type': 'Hill Station', 'duration': '2-3 days'}
+]
+MEDIUM_TRIP_SUGGESTIONS = [
+    {'destination': 'Kashmir', 'type': 'Mountains', 'duration': '6-7 days'},
+    {'destination': 'Andaman', 'type': 'Islands', 'duration': '5-6 days'}
+]
+LONG_TRIP_SUGGESTIONS = [
+    {'destination': 'Europe', 'type': 'Multi-country', 'duration': '10-14 days'},
+    {'destination': 'Japan', 'type': 'Cultural', 'duration': '8-10 days'}
+]
+
 def generate_trip_suggestions(user_trips, preferences=None):
     """Generate trip suggestions based on user history"""
     if not user_trips:
-        # Default suggestions for new users
-        return [
-            {'destination': 'Goa', 'type': 'Beach', 'duration': '4-5 days'},
-            {'destination': 'Kerala', 'type': 'Backwaters', 'duration': '6-7 days'},
-            {'destination': 'Rajasthan', 'type': 'Heritage', 'duration': '8-10 days'},
-            {'destination': 'Himachal Pradesh', 'type': 'Mountains', 'duration': '5-6 days'},
-            {'destination': 'Thailand', 'type': 'International', 'duration': '7-8 days'}
-        ]
+        return list(DEFAULT_TRIP_SUGGESTIONS)
     
     # Analyze user's trip patterns
     visited_destinations = [trip.get('destination', '').lower() for trip in user_trips]
@@ -575,20 +603,11 @@ def generate_trip_suggestions(user_trips, preferences=None):
     
     # Suggest similar duration trips
     if avg_duration <= 3:
-        suggestions.extend([
-            {'destination': 'Pondicherry', 'type': 'Weekend Getaway', 'duration': '2-3 days'},
-            {'destination': 'Lonavala', 'type': 'Hill Station', 'duration': '2-3 days'}
-        ])
+        suggestions.extend(SHORT_TRIP_SUGGESTIONS)
     elif avg_duration <= 7:
-        suggestions.extend([
-            {'destination': 'Kashmir', 'type': 'Mountains', 'duration': '6-7 days'},
-            {'destination': 'Andaman', 'type': 'Islands', 'duration': '5-6 days'}
-        ])
+        suggestions.extend(MEDIUM_TRIP_SUGGESTIONS)
     else:
-        suggestions.extend([
-            {'destination': 'Europe', 'type': 'Multi-country', 'duration': '10-14 days'},
-            {'destination': 'Japan', 'type': 'Cultural', 'duration': '8-10 days'}
-        ])
+        suggestions.extend(LONG_TRIP_SUGGESTIONS)
     
     return suggestions[:5]
 